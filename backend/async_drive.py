@@ -0,0 +1,273 @@
+"""
+Async Google Drive client used by the ASGI views.
+
+Calls the Drive v3 REST API directly with an httpx AsyncClient, so one
+event loop can keep hundreds of Drive requests in flight over a pool of
+keep-alive connections instead of blocking a worker thread per request.
+Credentials are shared with the process-wide GoogleDriveService.
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import httpx
+from django.conf import settings
+from backend.google_drive import (
+    FILE_FIELDS, IMAGE_MIME_TYPES, DOWNLOAD_CHUNK_SIZE, METADATA_FIELDS, GoogleDriveService,
+    build_folder_query, cache_file_metadata, format_image_file, get_cached_file_metadata,
+    get_google_drive_service, sized_thumbnail_link,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+DRIVE_FILES_URL = 'https://www.googleapis.com/drive/v3/files'
+
+# Async services keyed by the sync service whose credentials they share
+_async_services = weakref.WeakKeyDictionary()
+_async_services_lock = threading.Lock()
+
+
+class AsyncGoogleDriveService:
+    """
+    Async counterpart of GoogleDriveService for the Drive calls on the request path.
+
+    Every event loop gets its own connection pool, since httpx clients
+    cannot be shared between loops; it is closed when the loop shuts down.
+    """
+
+    def __init__(self, drive_service: GoogleDriveService, transport: Optional[httpx.AsyncBaseTransport] = None):
+        """
+        Initialize the async service.
+
+        Args:
+            drive_service: Sync service providing the API key or service account credentials
+            transport: httpx transport to use instead of the network (for tests)
+        """
+        self.drive_service = drive_service
+        self.transport = transport
+        self._clients = weakref.WeakKeyDictionary()
+
+    async def get_client(self) -> httpx.AsyncClient:
+        """
+        Pooled HTTP client of the running event loop.
+
+        The client is closed when its loop shuts down: asyncio.run, the
+        ASGI server and asgiref's async_to_sync all finalize the loop's
+        async generators before closing it, which closes the client held
+        by _close_with_loop. Per-request loops (async views under WSGI)
+        therefore release their connections too.
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._clients.get(loop)
+        if entry is None:
+            max_connections = getattr(settings, 'GOOGLE_DRIVE_ASYNC_MAX_CONNECTIONS', 200)
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=max_connections,
+                    max_keepalive_connections=max_connections // 4 or 1,
+                ),
+                timeout=httpx.Timeout(30.0, connect=10.0),
+                follow_redirects=True,
+                transport=self.transport,
+            )
+            closer = _close_with_loop(client)
+            await closer.__anext__()
+            entry = self._clients[loop] = (client, closer)
+        return entry[0]
+
+    async def aclose(self):
+        """Close the HTTP client of the running event loop, if it has one."""
+        entry = self._clients.pop(asyncio.get_running_loop(), None)
+        if entry:
+            # Finishing the generator closes the client
+            await entry[1].aclose()
+
+    async def _auth(self) -> Tuple[Dict, Dict]:
+        """Get the headers and query parameters authorizing a Drive request."""
+        credentials = self.drive_service.credentials
+        if credentials:
+            if not credentials.valid:
+                # Refreshing is a blocking HTTP call shared with the sync service
+                await asyncio.to_thread(self.drive_service._refresh_credentials)
+            return {'Authorization': f'Bearer {credentials.token}'}, {}
+        return {}, {'key': self.drive_service.api_key}
+
+    async def _get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None) -> httpx.Response:
+        auth_headers, auth_params = await self._auth()
+        client = await self.get_client()
+        response = await client.get(
+            url, params={**auth_params, **(params or {})}, headers={**auth_headers, **(headers or {})}
+        )
+        response.raise_for_status()
+        return response
+
+    async def list_files_in_folder(self, folder_id: str, include_folders: bool = False) -> List[Dict]:
+        """
+        List all files in a Google Drive folder.
+
+        Args:
+            folder_id: The ID of the Google Drive folder
+            include_folders: Whether to include subfolders in results
+
+        Returns:
+            List of file dictionaries with metadata
+        """
+        results = []
+        params = {
+            'q': build_folder_query(folder_id, include_folders),
+            'spaces': 'drive',
+            'fields': f'nextPageToken, files({FILE_FIELDS})',
+            'pageSize': 100,
+        }
+        try:
+            while True:
+                response = (await self._get(DRIVE_FILES_URL, params)).json()
+                results.extend(response.get('files', []))
+                if not response.get('nextPageToken'):
+                    cache_file_metadata(results)
+                    return results
+                params['pageToken'] = response['nextPageToken']
+        except httpx.HTTPError as error:
+            logger.error(f"Error listing files in folder {folder_id}: {str(error)}")
+            raise
+
+    async def get_image_files(self, folder_id: str) -> List[Dict]:
+        """Get only image files from a Google Drive folder, shaped like GoogleDriveService.get_image_files."""
+        files = await self.list_files_in_folder(folder_id, include_folders=False)
+        return [format_image_file(file) for file in files
+                if file.get('mimeType') in IMAGE_MIME_TYPES and file.get('id')]
+
+    async def get_file_metadata(self, file_id: str, use_cache: bool = True) -> Optional[Dict]:
+        """
+        Get metadata for a specific file, from the shared metadata cache when possible.
+
+        Returns:
+            Dictionary with file metadata or None if not found
+        """
+        if use_cache:
+            file_metadata = get_cached_file_metadata(file_id)
+            if file_metadata:
+                return file_metadata
+
+        try:
+            response = await self._get(f'{DRIVE_FILES_URL}/{file_id}', {'fields': METADATA_FIELDS})
+        except httpx.HTTPError as error:
+            logger.error(f"Error getting file metadata {file_id}: {str(error)}")
+            return None
+        file_metadata = response.json()
+        cache_file_metadata([file_metadata])
+        return file_metadata
+
+    async def get_file_content(self, file_id: str) -> Optional[bytes]:
+        """
+        Get the content of a file from Google Drive.
+
+        Returns:
+            File content as bytes or None if error
+        """
+        try:
+            response = await self._get(f'{DRIVE_FILES_URL}/{file_id}', {'alt': 'media'})
+            return response.content
+        except httpx.HTTPError as error:
+            logger.error(f"Error getting file content {file_id}: {str(error)}")
+            return None
+
+    async def open_file_content(self, file_id: str, start: int = 0, end: Optional[int] = None) -> httpx.Response:
+        """
+        Start downloading a file, optionally a byte range of it.
+
+        The response body is not read yet; pass the response to
+        iter_response_content to stream it.
+
+        Raises:
+            httpx.HTTPStatusError: If Drive rejects the request
+        """
+        auth_headers, auth_params = await self._auth()
+        headers = dict(auth_headers)
+        if start or end is not None:
+            headers['Range'] = f"bytes={start}-{'' if end is None else end}"
+        client = await self.get_client()
+        request = client.build_request(
+            'GET', f'{DRIVE_FILES_URL}/{file_id}', params={**auth_params, 'alt': 'media'}, headers=headers
+        )
+        response = await client.send(request, stream=True)
+        if response.status_code not in (200, 206):
+            await response.aread()
+            await response.aclose()
+            response.raise_for_status()
+        return response
+
+    async def iter_response_content(self, response: httpx.Response,
+                                    chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield the body of a response from open_file_content, then release its connection."""
+        try:
+            async for chunk in response.aiter_bytes(chunk_size):
+                yield chunk
+        finally:
+            await response.aclose()
+
+    async def get_thumbnail(self, file_id: str, size: int, thumbnail_link: Optional[str] = None) -> Optional[bytes]:
+        """
+        Get a thumbnail of an image resized server-side by Drive.
+
+        Behaves like GoogleDriveService.get_thumbnail: a stored link is
+        refreshed from the file metadata if Drive rejects it.
+
+        Returns:
+            Thumbnail content as bytes, or None if Drive has no thumbnail for the file
+        """
+        tried = set()
+        # The given link, then the (possibly cached) metadata link, then a fresh one
+        for source in ('given', 'cache', 'drive'):
+            if source == 'given':
+                link = thumbnail_link
+            else:
+                metadata = await self.get_file_metadata(file_id, use_cache=source == 'cache')
+                link = metadata and metadata.get('thumbnailLink')
+            if not link or link in tried:
+                continue
+            tried.add(link)
+
+            auth_headers, _ = await self._auth()
+            client = await self.get_client()
+            try:
+                response = await client.get(sized_thumbnail_link(link, size), headers=auth_headers)
+            except httpx.HTTPError as error:
+                logger.error(f"Error getting thumbnail {file_id}: {str(error)}")
+                return None
+            if (response.status_code == 200 and response.content
+                    and response.headers.get('content-type', '').startswith('image/')):
+                return response.content
+            logger.warning(f"Drive thumbnail of {file_id} unavailable (HTTP {response.status_code})")
+        return None
+
+
+async def _close_with_loop(client: httpx.AsyncClient):
+    """Async generator parked until its event loop shuts down, then closing client."""
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def get_async_google_drive_service() -> Optional[AsyncGoogleDriveService]:
+    """
+    Get the process-wide AsyncGoogleDriveService.
+
+    Returns:
+        AsyncGoogleDriveService instance or None if configuration is missing
+    """
+    drive_service = get_google_drive_service()
+    if drive_service is None:
+        return None
+
+    async_service = _async_services.get(drive_service)
+    if async_service is None:
+        with _async_services_lock:
+            async_service = _async_services.get(drive_service)
+            if async_service is None:
+                async_service = AsyncGoogleDriveService(drive_service)
+                _async_services[drive_service] = async_service
+    return async_service
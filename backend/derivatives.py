@@ -0,0 +1,229 @@
+"""
+Web-optimized derivatives of locally stored images.
+
+Album and portfolio images are camera originals, often several MB each.
+When one is uploaded, a few smaller renditions (thumbnail, medium, large)
+are rendered with the thumbnail pipeline and stored next to it as
+progressive JPEG and WebP. Their names and dimensions are kept on the
+image row, so the API and the admin can link them without touching storage.
+
+Rendering takes far longer than saving a row, so the row is saved first
+and its derivatives are rendered in a background thread once committed;
+until then the original is served in their place.
+"""
+
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models.fields.files import FieldFile
+from backend.thumbnail_utils import THUMBNAIL_FORMATS, prepare_image, render_variants
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Derivative name -> longest edge in pixels, overridable with settings.IMAGE_DERIVATIVE_SIZES
+DEFAULT_DERIVATIVE_SIZES = {'thumbnail': 400, 'medium': 1200, 'large': 2048}
+DEFAULT_DERIVATIVE_FORMATS = ['webp', 'jpeg']
+
+# Extra encoder options of derivatives, on top of THUMBNAIL_FORMATS
+DERIVATIVE_OPTIONS = {
+    'jpeg': {'progressive': True},
+}
+
+DERIVATIVES_DIR = 'derivatives'
+
+
+def get_derivative_sizes() -> Dict[str, int]:
+    return dict(getattr(settings, 'IMAGE_DERIVATIVE_SIZES', DEFAULT_DERIVATIVE_SIZES))
+
+
+def get_derivative_formats():
+    formats = getattr(settings, 'IMAGE_DERIVATIVE_FORMATS', DEFAULT_DERIVATIVE_FORMATS)
+    return [fmt for fmt in formats if fmt in THUMBNAIL_FORMATS]
+
+
+def get_derivative_name(original_name: str, derivative: str, fmt: str) -> str:
+    """Get the storage name of a derivative: <dir>/derivatives/<stem>_<derivative>.<ext>."""
+    directory, filename = os.path.split(original_name)
+    stem = os.path.splitext(filename)[0]
+    extension = THUMBNAIL_FORMATS[fmt]['extension']
+    return os.path.join(directory, DERIVATIVES_DIR, f"{stem}_{derivative}.{extension}")
+
+
+def generate_derivatives(field_file: FieldFile) -> Dict:
+    """
+    Render and store the derivatives of a stored image.
+
+    The original is decoded once, at the resolution of the largest
+    derivative (see prepare_image), and every smaller one is resampled
+    from the next larger.
+
+    Args:
+        field_file: Committed image file of an ImageField
+
+    Returns:
+        Mapping of derivative name to its width, height and the storage name
+        of every format, e.g. {'thumbnail': {'width': 400, 'height': 300,
+        'webp': '...', 'jpeg': '...'}}; empty if the image could not be read
+    """
+    sizes = get_derivative_sizes()
+    formats = get_derivative_formats()
+    if not field_file or not sizes or not formats:
+        return {}
+
+    storage = field_file.storage
+    derivatives = {}
+    try:
+        with storage.open(field_file.name, 'rb') as original:
+            image = prepare_image(original, max(sizes.values()))
+
+        names_by_size = {}
+        for derivative, size in sizes.items():
+            names_by_size.setdefault(size, []).append(derivative)
+
+        for size, variant in render_variants(image, list(names_by_size)):
+            for derivative in names_by_size[size]:
+                entry = {'width': variant.width, 'height': variant.height}
+                for fmt in formats:
+                    entry[fmt] = _save_variant(storage, variant, get_derivative_name(field_file.name, derivative, fmt), fmt)
+                derivatives[derivative] = entry
+    except Exception as e:
+        logger.error(f"Error generating derivatives of {field_file.name}: {str(e)}")
+        delete_derivatives(storage, derivatives)
+        return {}
+    return derivatives
+
+
+def reset_derivatives(instance, field_name: str = 'image') -> bool:
+    """
+    Drop the derivatives of an image newly assigned to a model instance, before it is saved.
+
+    The derivatives of a replaced image are deleted once the change is
+    committed. Does nothing for unchanged files or when
+    IMAGE_DERIVATIVES_ON_UPLOAD is off.
+
+    Returns:
+        True if derivatives of the new image must be rendered (see schedule_derivatives)
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file._committed or not getattr(settings, 'IMAGE_DERIVATIVES_ON_UPLOAD', True):
+        return False
+    previous = instance.derivatives
+    instance.derivatives = {}
+    if previous:
+        storage = field_file.storage
+        transaction.on_commit(lambda: delete_derivatives(storage, previous))
+    return True
+
+
+def render_derivatives(model, pks: Iterable, on_rendered: Optional[Callable[[], None]] = None,
+                       workers: Optional[int] = None) -> int:
+    """
+    Render and record the derivatives of saved image rows.
+
+    A row whose image was replaced or deleted while rendering keeps what it
+    has and the renditions are discarded.
+
+    Args:
+        model: AlbumImage or PortfolioImage
+        pks: Primary keys of the rows
+        on_rendered: Called once any row got derivatives, e.g. to invalidate
+                     cached responses (rows are updated without signals)
+        workers: Concurrent renders (defaults to ALBUM_UPLOAD_WORKERS)
+
+    Returns:
+        Number of rows updated
+    """
+    images = list(model.objects.filter(pk__in=list(pks)).exclude(image='').only('id', 'image', 'derivatives'))
+    if not images:
+        return 0
+    workers = min(workers or getattr(settings, 'ALBUM_UPLOAD_WORKERS', 8), len(images))
+
+    updated = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for image, derivatives in zip(images, pool.map(lambda image: generate_derivatives(image.image), images)):
+            if not derivatives:
+                continue
+            storage = image.image.storage
+            if model.objects.filter(pk=image.pk, image=image.image.name).update(derivatives=derivatives):
+                delete_derivatives(storage, image.derivatives)
+                updated += 1
+            else:
+                delete_derivatives(storage, derivatives)
+    if updated and on_rendered:
+        on_rendered()
+    return updated
+
+
+def schedule_derivatives(model, pks: Iterable, on_rendered: Optional[Callable[[], None]] = None):
+    """Render the derivatives of image rows in a background thread once the current transaction commits."""
+    pks = list(pks)
+    if not pks or not getattr(settings, 'IMAGE_DERIVATIVES_ON_UPLOAD', True):
+        return
+    transaction.on_commit(lambda: start_background_derivatives(model, pks, on_rendered))
+
+
+def _render_in_background(model, pks, on_rendered):
+    try:
+        render_derivatives(model, pks, on_rendered)
+    except Exception as e:
+        logger.error(f"Error rendering derivatives of {len(pks)} {model._meta.verbose_name_plural}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def start_background_derivatives(model, pks, on_rendered=None):
+    """Render the derivatives of image rows in a daemon thread."""
+    thread = threading.Thread(target=_render_in_background, args=(model, list(pks), on_rendered), daemon=True)
+    thread.start()
+
+
+def _save_variant(storage, image, name: str, fmt: str) -> str:
+    """Encode image to a temporary file and save it to storage under (an available variant of) name."""
+    options = {**THUMBNAIL_FORMATS[fmt]['options'], **DERIVATIVE_OPTIONS.get(fmt, {})}
+    with tempfile.TemporaryFile() as temp_file:
+        image.save(temp_file, THUMBNAIL_FORMATS[fmt]['pil_format'], **options)
+        temp_file.seek(0)
+        return storage.save(name, File(temp_file, name=os.path.basename(name)))
+
+
+def delete_derivatives(storage, derivatives: Optional[Dict]):
+    """Remove the stored files of derivatives returned by generate_derivatives."""
+    for entry in (derivatives or {}).values():
+        for fmt in THUMBNAIL_FORMATS:
+            if entry.get(fmt):
+                try:
+                    storage.delete(entry[fmt])
+                except OSError as e:
+                    logger.warning(f"Could not delete derivative {entry[fmt]}: {str(e)}")
+
+
+def get_derivative_url(field_file: FieldFile, derivatives: Optional[Dict],
+                       derivative: str = 'thumbnail', fmt: str = 'jpeg') -> str:
+    """URL of one rendition of an image, or of the original while it has none."""
+    name = (derivatives or {}).get(derivative, {}).get(fmt)
+    return field_file.storage.url(name) if name else field_file.url
+
+
+def get_derivative_urls(storage, derivatives: Optional[Dict], request=None) -> Dict:
+    """
+    Resolve the storage names of derivatives to URLs, absolute when a request is given.
+
+    Returns:
+        The derivatives with every format's storage name replaced by its URL
+    """
+    urls = {}
+    for derivative, entry in (derivatives or {}).items():
+        urls[derivative] = {}
+        for key, value in entry.items():
+            if key in THUMBNAIL_FORMATS:
+                value = storage.url(value)
+                if request:
+                    value = request.build_absolute_uri(value)
+            urls[derivative][key] = value
+    return urls
@@ -6,14 +6,34 @@ images from publicly shared folders using the Google Drive API v3.
 """
 
 import os
-from typing import List, Dict, Optional
+import re
+import json
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+import httplib2
+from django.conf import settings
 from google.oauth2 import service_account
-from googleapiclient.discovery import build
+from google_auth_httplib2 import AuthorizedHttp, Request as AuthRequest
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Process-wide caches shared by all requests and threads
+_discovery_document = None
+_discovery_lock = threading.Lock()
+_services = {}
+_services_lock = threading.Lock()
+# file ID -> (expiry time, metadata), oldest first
+_metadata_cache = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+
 # Supported image MIME types
 IMAGE_MIME_TYPES = [
     'image/jpeg',
@@ -25,9 +45,77 @@ IMAGE_MIME_TYPES = [
     'image/svg+xml',
 ]
 
+# Size of each ranged request when streaming file content from Drive
+DOWNLOAD_CHUNK_SIZE = 2 * 1024 * 1024
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+
+# Fields returned by get_file_metadata; a subset of FILE_FIELDS, so
+# listings can fill the metadata cache
+METADATA_FIELDS = 'id, name, mimeType, size, modifiedTime, md5Checksum, thumbnailLink'
+
+# Most requests Drive accepts in a single batch request
+BATCH_LIMIT = 100
+
+# Upper bound of the in-process metadata cache
+METADATA_CACHE_MAX_ENTRIES = 10000
+
+# Size suffix of Drive thumbnail links, e.g. '=s220'
+THUMBNAIL_LINK_SIZE_RE = re.compile(r'=s\d+$')
+
+# Fields requested for every file returned by listings and the changes feed
+FILE_FIELDS = 'id, name, mimeType, size, createdTime, modifiedTime, md5Checksum, webContentLink, thumbnailLink'
+
+
+class RateLimiter:
+    """
+    Token bucket limiting the request rate of all threads sharing it.
+    
+    Up to `rate` requests per second are allowed on average, with bursts
+    of up to `burst` requests. Every request of a batch counts, as Drive
+    enforces its quota per inner request.
+    """
+    
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: int = 1):
+        """
+        Wait until requests may be sent.
+        
+        Args:
+            tokens: Number of requests, e.g. the size of a batch request. More
+                    than `burst` are granted once the bucket is full, leaving
+                    it in debt so the following requests wait for the excess.
+        """
+        if self.rate <= 0 or tokens <= 0:
+            return
+        needed = min(tokens, self.burst)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= tokens
+                    return
+                wait_time = (needed - self._tokens) / self.rate
+            time.sleep(wait_time)
+
 
 class GoogleDriveService:
-    """Service class for interacting with Google Drive API."""
+    """
+    Service class for interacting with Google Drive API.
+    
+    One instance is meant to be shared by the whole process. Credentials are
+    loaded once and shared by all threads, while every thread gets its own
+    API resource and authorized HTTP client, because the underlying httplib2
+    connections are not thread-safe.
+    """
     
     def __init__(self, api_key: Optional[str] = None, credentials_path: Optional[str] = None):
         """
@@ -40,27 +128,77 @@ class GoogleDriveService:
         """
         self.api_key = api_key
         self.credentials_path = credentials_path
-        self.service = None
+        self.credentials = None
+        self._local = threading.local()
+        self._credentials_lock = threading.Lock()
+        # Shared by the threads of recursive folder walks
+        self.rate_limiter = RateLimiter(getattr(settings, 'GOOGLE_DRIVE_REQUESTS_PER_SECOND', 20))
+        self._load_credentials()
         self._build_service()
     
-    def _build_service(self):
-        """Build and initialize the Google Drive API service."""
+    def _load_credentials(self):
+        """Load the service account credentials shared by all threads."""
         try:
             if self.credentials_path and os.path.exists(self.credentials_path):
                 # Use service account credentials
-                credentials = service_account.Credentials.from_service_account_file(
+                self.credentials = service_account.Credentials.from_service_account_file(
                     self.credentials_path,
                     scopes=['https://www.googleapis.com/auth/drive.readonly']
                 )
-                self.service = build('drive', 'v3', credentials=credentials)
-            elif self.api_key:
-                # Use API key for public folder access
-                self.service = build('drive', 'v3', developerKey=self.api_key)
-            else:
+            elif not self.api_key:
                 raise ValueError("Either api_key or credentials_path must be provided")
+        except Exception as e:
+            logger.error(f"Error loading Google Drive credentials: {str(e)}")
+            raise
+    
+    def _build_service(self):
+        """Build and initialize the Google Drive API service for the current thread."""
+        try:
+            http = build_http()
+            if self.credentials:
+                # Use service account credentials
+                http = AuthorizedHttp(self.credentials, http=http)
+                service = build_from_document(get_discovery_document(), http=http)
+            else:
+                # Use API key for public folder access
+                service = build_from_document(get_discovery_document(), developerKey=self.api_key, http=http)
         except Exception as e:
             logger.error(f"Error building Google Drive service: {str(e)}")
             raise
+        
+        self._local.service = service
+        self._local.http = http
+        return service
+    
+    def _refresh_credentials(self):
+        """Refresh expired credentials once for all threads instead of once per thread."""
+        if self.credentials.valid:
+            return
+        
+        with self._credentials_lock:
+            if not self.credentials.valid:
+                self.credentials.refresh(AuthRequest(httplib2.Http()))
+    
+    @property
+    def service(self):
+        """Google Drive API resource bound to the current thread."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._build_service()
+        if self.credentials:
+            self._refresh_credentials()
+        return service
+    
+    @property
+    def http(self):
+        """HTTP client of the current thread, authorized with the service account if there is one."""
+        http = getattr(self._local, 'http', None)
+        if http is None:
+            self._build_service()
+            http = self._local.http
+        if self.credentials:
+            self._refresh_credentials()
+        return http
     
     def list_files_in_folder(self, folder_id: str, include_folders: bool = False) -> List[Dict]:
         """
@@ -78,26 +216,18 @@ class GoogleDriveService:
         
         try:
             # Query to get files in the folder
-            query = f"'{folder_id}' in parents and trashed=false"
-            
-            # If we only want images, filter by MIME type
-            if not include_folders:
-                mime_types = " or ".join([f"mimeType='{mime}'" for mime in IMAGE_MIME_TYPES])
-                query += f" and ({mime_types})"
-            else:
-                # Include folders and images
-                mime_types = " or ".join([f"mimeType='{mime}'" for mime in IMAGE_MIME_TYPES])
-                query += f" and (mimeType='application/vnd.google-apps.folder' or {mime_types})"
+            query = build_folder_query(folder_id, include_folders)
             
             results = []
             page_token = None
             
             while True:
                 # Request files from the folder
+                self.rate_limiter.acquire()
                 response = self.service.files().list(
                     q=query,
                     spaces='drive',
-                    fields='nextPageToken, files(id, name, mimeType, size, createdTime, modifiedTime, webContentLink, thumbnailLink)',
+                    fields=f'nextPageToken, files({FILE_FIELDS})',
                     pageToken=page_token,
                     pageSize=100
                 ).execute()
@@ -109,50 +239,84 @@ class GoogleDriveService:
                 if not page_token:
                     break
             
+            cache_file_metadata(results)
             return results
         
         except HttpError as error:
             logger.error(f"Error listing files in folder {folder_id}: {str(error)}")
             raise
     
-    def get_image_files(self, folder_id: str) -> List[Dict]:
+    def get_image_files(self, folder_id: str, recursive: bool = False) -> List[Dict]:
         """
         Get only image files from a Google Drive folder.
         
         Args:
             folder_id: The ID of the Google Drive folder
+            recursive: Whether to include the images of subfolders (see walk_folder)
             
         Returns:
             List of image file dictionaries with metadata
         """
+        if recursive:
+            return self.walk_folder(folder_id)[0]
+        
         files = self.list_files_in_folder(folder_id, include_folders=False)
         
         # Filter to only image files and add direct download links
-        image_files = []
-        for file in files:
-            if file.get('mimeType') in IMAGE_MIME_TYPES:
-                # Generate direct download link
-                file_id = file.get('id')
-                if file_id:
-                    # For public files, we can use webContentLink or generate a direct link
-                    download_link = file.get('webContentLink')
-                    if not download_link:
-                        # Generate direct download link
-                        download_link = f"https://drive.google.com/uc?export=view&id={file_id}"
-                    
-                    image_files.append({
-                        'id': file_id,
-                        'name': file.get('name'),
-                        'mimeType': file.get('mimeType'),
-                        'size': file.get('size'),
-                        'createdTime': file.get('createdTime'),
-                        'modifiedTime': file.get('modifiedTime'),
-                        'thumbnailLink': file.get('thumbnailLink'),
-                        'downloadLink': download_link,
-                        'directLink': f"https://drive.google.com/uc?export=view&id={file_id}",
-                    })
-        
-        return image_files
+        return [format_image_file(file) for file in files
+                if file.get('mimeType') in IMAGE_MIME_TYPES and file.get('id')]
+    
+    def walk_folder(self, folder_id: str, max_depth: Optional[int] = None,
+                    workers: Optional[int] = None) -> Tuple[List[Dict], Dict[str, str]]:
+        """
+        Get the images of a folder and of its subfolders, one depth level at a time.
+        
+        The folders of a level are listed with batch requests of up to
+        BATCH_LIMIT folders (see list_files_in_folders), sent concurrently
+        by a pool, so a tree costs a few round trips per level rather than
+        one per folder. All threads share the service's rate limiter.
+        
+        Args:
+            folder_id: The ID of the root Google Drive folder
+            max_depth: Deepest subfolder level to descend into (0 lists the root only;
+                       defaults to GOOGLE_DRIVE_MAX_FOLDER_DEPTH)
+            workers: Batch requests sent concurrently (defaults to GOOGLE_DRIVE_LISTING_WORKERS)
+            
+        Returns:
+            Tuple of (image dictionaries tagged with folderPath and parentId,
+            dictionary of every walked folder ID to its path, '' for the root)
+        """
+        if max_depth is None:
+            max_depth = getattr(settings, 'GOOGLE_DRIVE_MAX_FOLDER_DEPTH', 5)
+        workers = workers or getattr(settings, 'GOOGLE_DRIVE_LISTING_WORKERS', 8)
+        
+        folders = {folder_id: ''}
+        images = []
+        level = [folder_id]
+        depth = 0
+        
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while level:
+                include_folders = depth < max_depth
+                chunks = [level[start:start + BATCH_LIMIT] for start in range(0, len(level), BATCH_LIMIT)]
+                next_level = []
+                for listing in pool.map(lambda chunk: self.list_files_in_folders(chunk, include_folders), chunks):
+                    for current_id, files in listing.items():
+                        path = folders[current_id]
+                        for file in files:
+                            if file.get('mimeType') == FOLDER_MIME_TYPE:
+                                # A folder reachable twice (e.g. through a second parent) is walked once
+                                if file['id'] in folders:
+                                    continue
+                                folders[file['id']] = f"{path}/{file.get('name', '')}" if path else file.get('name', '')
+                                next_level.append(file['id'])
+                            elif file.get('mimeType') in IMAGE_MIME_TYPES and file.get('id'):
+                                images.append({**format_image_file(file), 'folderPath': path, 'parentId': current_id})
+                level = next_level
+                depth += 1
+        
+        images.sort(key=lambda image: (image['folderPath'], image.get('name') or '', image['id']))
+        return images, folders
     
     def get_folder_info(self, folder_id: str) -> Optional[Dict]:
         """
@@ -199,33 +363,416 @@ class GoogleDriveService:
             logger.error(f"Error getting file content {file_id}: {str(error)}")
             return None
     
-    def get_file_metadata(self, file_id: str) -> Optional[Dict]:
+    def iter_file_content(self, file_id: str, start: int = 0, end: Optional[int] = None,
+                          chunk_size: int = DOWNLOAD_CHUNK_SIZE) -> Iterator[bytes]:
+        """
+        Stream the content of a file from Google Drive in fixed-size chunks.
+        
+        Every chunk is fetched with its own ranged media request, so memory
+        use is bounded by chunk_size regardless of the file size.
+        
+        Args:
+            file_id: The ID of the file
+            start: Position of the first byte to return
+            end: Position of the last byte to return (inclusive), None for end of file
+            chunk_size: Maximum number of bytes fetched per request
+            
+        Yields:
+            Consecutive chunks of the file content
+            
+        Raises:
+            HttpError: If Drive rejects a chunk request
+        """
+        if not self.service:
+            raise ValueError("Google Drive service not initialized")
+        
+        request = self.service.files().get_media(fileId=file_id)
+        offset = start
+        
+        while end is None or offset <= end:
+            chunk_end = offset + chunk_size - 1
+            if end is not None:
+                chunk_end = min(chunk_end, end)
+            headers = dict(request.headers)
+            headers['range'] = f'bytes={offset}-{chunk_end}'
+            response, content = request.http.request(request.uri, request.method, headers=headers)
+            
+            if response.status == 416 and offset == 0:
+                # Empty file, there is no byte to return
+                return
+            if response.status not in (200, 206):
+                raise HttpError(response, content, uri=request.uri)
+            
+            if response.status == 200:
+                # Drive ignored the range and sent the whole file
+                yield content[offset:None if end is None else end + 1]
+                return
+            
+            if content:
+                yield content
+                offset += len(content)
+            
+            total = _content_range_total(response.get('content-range'))
+            if not content or total is None or offset >= total:
+                return
+    
+    def get_file_metadata(self, file_id: str, use_cache: bool = True) -> Optional[Dict]:
         """
         Get metadata for a specific file.
         
+        Metadata seen in a recent listing is answered from the in-process
+        cache without a Drive round trip.
+        
         Args:
             file_id: The ID of the file
+            use_cache: Whether cached metadata may be returned
             
         Returns:
             Dictionary with file metadata or None if not found
         """
+        if use_cache:
+            file_metadata = get_cached_file_metadata(file_id)
+            if file_metadata:
+                return file_metadata
+        
         if not self.service:
             raise ValueError("Google Drive service not initialized")
         
         try:
             file_metadata = self.service.files().get(
                 fileId=file_id,
-                fields='id, name, mimeType, size'
+                fields=METADATA_FIELDS
             ).execute()
+            cache_file_metadata([file_metadata])
             return file_metadata
         except HttpError as error:
             logger.error(f"Error getting file metadata {file_id}: {str(error)}")
             return None
+    
+    def get_files_metadata(self, file_ids: Iterable[str], use_cache: bool = True) -> Dict[str, Optional[Dict]]:
+        """
+        Get metadata for many files, fetching the uncached ones in batch requests.
+        
+        Args:
+            file_ids: IDs of the files
+            use_cache: Whether cached metadata may be returned
+            
+        Returns:
+            Dictionary of file ID to metadata (None for files that were not found)
+        """
+        results = {}
+        missing = []
+        for file_id in dict.fromkeys(file_ids):
+            file_metadata = get_cached_file_metadata(file_id) if use_cache else None
+            if file_metadata:
+                results[file_id] = file_metadata
+            else:
+                missing.append(file_id)
+        
+        if missing and not self.service:
+            raise ValueError("Google Drive service not initialized")
+        
+        def collect(request_id, response, exception):
+            if exception is not None:
+                logger.error(f"Error getting file metadata {request_id}: {str(exception)}")
+            results[request_id] = response if exception is None else None
+        
+        # One HTTP round trip per BATCH_LIMIT files
+        for start in range(0, len(missing), BATCH_LIMIT):
+            batch = self.service.new_batch_http_request(callback=collect)
+            chunk = missing[start:start + BATCH_LIMIT]
+            for file_id in chunk:
+                batch.add(self.service.files().get(fileId=file_id, fields=METADATA_FIELDS), request_id=file_id)
+            self.rate_limiter.acquire(len(chunk))
+            batch.execute()
+        
+        cache_file_metadata(metadata for metadata in results.values() if metadata)
+        return results
+    
+    def list_files_in_folders(self, folder_ids: Iterable[str], include_folders: bool = False) -> Dict[str, List[Dict]]:
+        """
+        List the files of many folders, fetching their pages in batch requests.
+        
+        Every round trip fetches the next page of up to BATCH_LIMIT folders.
+        
+        Args:
+            folder_ids: IDs of the Google Drive folders
+            include_folders: Whether to include subfolders in results
+            
+        Returns:
+            Dictionary of folder ID to its list of file dictionaries
+            
+        Raises:
+            HttpError: If listing any of the folders fails
+        """
+        if not self.service:
+            raise ValueError("Google Drive service not initialized")
+        
+        results = {folder_id: [] for folder_id in folder_ids}
+        # folder ID -> token of the next page to fetch (None for the first page)
+        pending = dict.fromkeys(results)
+        errors = []
+        
+        def collect(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+                pending.pop(request_id, None)
+                return
+            results[request_id].extend(response.get('files', []))
+            if response.get('nextPageToken'):
+                pending[request_id] = response['nextPageToken']
+            else:
+                pending.pop(request_id, None)
+        
+        while pending and not errors:
+            page_requests = list(pending.items())
+            for start in range(0, len(page_requests), BATCH_LIMIT):
+                batch = self.service.new_batch_http_request(callback=collect)
+                chunk = page_requests[start:start + BATCH_LIMIT]
+                for folder_id, page_token in chunk:
+                    batch.add(self.service.files().list(
+                        q=build_folder_query(folder_id, include_folders),
+                        spaces='drive',
+                        fields=f'nextPageToken, files({FILE_FIELDS})',
+                        pageToken=page_token,
+                        pageSize=100
+                    ), request_id=folder_id)
+                # Drive counts every listing of the batch against the quota
+                self.rate_limiter.acquire(len(chunk))
+                batch.execute()
+        
+        if errors:
+            logger.error(f"Error listing files in folders: {str(errors[0])}")
+            raise errors[0]
+        
+        for files in results.values():
+            cache_file_metadata(files)
+        return results
+    
+    def get_thumbnail(self, file_id: str, size: int, thumbnail_link: Optional[str] = None) -> Optional[bytes]:
+        """
+        Get a thumbnail of an image resized server-side by Drive.
+        
+        Far cheaper than downloading the original when only a small
+        rendition is needed. Thumbnail links expire after a few hours, so a
+        link taken from a stored listing or the metadata cache is refreshed
+        from Drive if it is rejected.
+        
+        Args:
+            file_id: The ID of the file
+            size: Longest edge of the thumbnail in pixels
+            thumbnail_link: thumbnailLink from an earlier listing, if known
+            
+        Returns:
+            Thumbnail content as bytes, or None if Drive has no thumbnail for the file
+        """
+        if not self.service:
+            raise ValueError("Google Drive service not initialized")
+        
+        tried = set()
+        # The given link, then the (possibly cached) metadata link, then a fresh one
+        for source in ('given', 'cache', 'drive'):
+            if source == 'given':
+                link = thumbnail_link
+            else:
+                metadata = self.get_file_metadata(file_id, use_cache=source == 'cache')
+                link = metadata and metadata.get('thumbnailLink')
+            if not link or link in tried:
+                continue
+            tried.add(link)
+            
+            try:
+                # The authorized client adds the OAuth token thumbnails of
+                # private files require
+                response, content = self.http.request(sized_thumbnail_link(link, size))
+            except (httplib2.HttpLib2Error, OSError) as error:
+                logger.error(f"Error getting thumbnail {file_id}: {str(error)}")
+                return None
+            if response.status == 200 and response.get('content-type', '').startswith('image/') and content:
+                return content
+            logger.warning(f"Drive thumbnail of {file_id} unavailable (HTTP {response.status})")
+        return None
+    
+    def get_start_page_token(self) -> Optional[str]:
+        """
+        Get the current start page token of the Drive changes feed.
+        
+        The changes feed requires OAuth credentials (a service account);
+        with a plain API key Drive rejects the call and None is returned.
+        
+        Returns:
+            Start page token or None if the changes feed is unavailable
+        """
+        if not self.service:
+            raise ValueError("Google Drive service not initialized")
+        
+        try:
+            response = self.service.changes().getStartPageToken().execute()
+            return response.get('startPageToken')
+        except HttpError as error:
+            logger.warning(f"Drive changes feed unavailable: {str(error)}")
+            return None
+    
+    def list_changes(self, page_token: str) -> Tuple[List[Dict], str]:
+        """
+        List all changes recorded since the given page token.
+        
+        Args:
+            page_token: Token from get_start_page_token or a previous call
+            
+        Returns:
+            Tuple of (list of change dictionaries, new start page token)
+        """
+        if not self.service:
+            raise ValueError("Google Drive service not initialized")
+        
+        try:
+            changes = []
+            new_start_page_token = None
+            
+            while page_token:
+                response = self.service.changes().list(
+                    pageToken=page_token,
+                    spaces='drive',
+                    includeRemoved=True,
+                    fields=f'nextPageToken, newStartPageToken, changes(fileId, removed, file({FILE_FIELDS}, parents, trashed))',
+                    pageSize=1000
+                ).execute()
+                
+                changes.extend(response.get('changes', []))
+                for change in response.get('changes', []):
+                    if change.get('removed') or not change.get('file') or change['file'].get('trashed'):
+                        forget_file_metadata(change.get('fileId'))
+                    else:
+                        cache_file_metadata([change['file']])
+                new_start_page_token = response.get('newStartPageToken', new_start_page_token)
+                page_token = response.get('nextPageToken')
+            
+            return changes, new_start_page_token
+        
+        except HttpError as error:
+            logger.error(f"Error listing Drive changes: {str(error)}")
+            raise
+
+
+def cache_file_metadata(files: Iterable[Dict]):
+    """
+    Remember the metadata of files seen in a listing for GOOGLE_DRIVE_METADATA_TTL seconds.
+    
+    Args:
+        files: File dictionaries including at least the METADATA_FIELDS
+    """
+    ttl = getattr(settings, 'GOOGLE_DRIVE_METADATA_TTL', 120)
+    if ttl <= 0:
+        return
+    
+    expires = time.monotonic() + ttl
+    fields = [field.strip() for field in METADATA_FIELDS.split(',')]
+    with _metadata_cache_lock:
+        for file in files:
+            if not file.get('id'):
+                continue
+            _metadata_cache.pop(file['id'], None)
+            _metadata_cache[file['id']] = (expires, {field: file[field] for field in fields if field in file})
+        while len(_metadata_cache) > METADATA_CACHE_MAX_ENTRIES:
+            _metadata_cache.popitem(last=False)
+
+
+def get_cached_file_metadata(file_id: str) -> Optional[Dict]:
+    """Get the cached metadata of a file, or None if unknown or expired."""
+    with _metadata_cache_lock:
+        entry = _metadata_cache.get(file_id)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del _metadata_cache[file_id]
+            return None
+        return dict(entry[1])
+
+
+def forget_file_metadata(file_id: Optional[str] = None):
+    """Drop the cached metadata of a file, or of every file when file_id is None."""
+    with _metadata_cache_lock:
+        if file_id is None:
+            _metadata_cache.clear()
+        else:
+            _metadata_cache.pop(file_id, None)
+
+
+def build_folder_query(folder_id: str, include_folders: bool = False) -> str:
+    """Build the files.list query for the images (and optionally subfolders) of a folder."""
+    query = f"'{folder_id}' in parents and trashed=false"
+    
+    # If we only want images, filter by MIME type
+    mime_types = " or ".join([f"mimeType='{mime}'" for mime in IMAGE_MIME_TYPES])
+    if not include_folders:
+        query += f" and ({mime_types})"
+    else:
+        # Include folders and images
+        query += f" and (mimeType='{FOLDER_MIME_TYPE}' or {mime_types})"
+    return query
+
+
+def format_image_file(file: Dict) -> Dict:
+    """Shape a Drive file resource into the image dictionary served by the API."""
+    file_id = file['id']
+    # For public files, we can use webContentLink or generate a direct link
+    download_link = file.get('webContentLink')
+    if not download_link:
+        # Generate direct download link
+        download_link = f"https://drive.google.com/uc?export=view&id={file_id}"
+    
+    return {
+        'id': file_id,
+        'name': file.get('name'),
+        'mimeType': file.get('mimeType'),
+        'size': file.get('size'),
+        'createdTime': file.get('createdTime'),
+        'modifiedTime': file.get('modifiedTime'),
+        'md5Checksum': file.get('md5Checksum'),
+        'thumbnailLink': file.get('thumbnailLink'),
+        'downloadLink': download_link,
+        'directLink': f"https://drive.google.com/uc?export=view&id={file_id}",
+    }
+
+
+def _content_range_total(content_range: Optional[str]) -> Optional[int]:
+    """Extract the complete length from a 'bytes start-end/total' Content-Range header."""
+    if not content_range or '/' not in content_range:
+        return None
+    total = content_range.rsplit('/', 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def sized_thumbnail_link(thumbnail_link: str, size: int) -> str:
+    """Rewrite a Drive thumbnailLink to request an image of the given longest edge."""
+    if THUMBNAIL_LINK_SIZE_RE.search(thumbnail_link):
+        return THUMBNAIL_LINK_SIZE_RE.sub(f'=s{size}', thumbnail_link)
+    return f'{thumbnail_link}=s{size}'
+
+
+def get_discovery_document() -> Dict:
+    """
+    Get the parsed Drive v3 discovery document.
+    
+    The document ships with google-api-python-client; it is read and parsed
+    once per process instead of on every service build.
+    """
+    global _discovery_document
+    
+    if _discovery_document is None:
+        with _discovery_lock:
+            if _discovery_document is None:
+                _discovery_document = json.loads(get_static_doc('drive', 'v3'))
+    return _discovery_document
 
 
 def get_google_drive_service() -> Optional[GoogleDriveService]:
     """
-    Factory function to create a GoogleDriveService instance from environment variables.
+    Get the process-wide GoogleDriveService configured from environment variables.
+    
+    The service is created on first use and reused by every later call, so
+    the request hot path does not re-read credentials or rebuild the API client.
     
     Returns:
         GoogleDriveService instance or None if configuration is missing
@@ -237,9 +784,18 @@ def get_google_drive_service() -> Optional[GoogleDriveService]:
         logger.warning("Google Drive API key or credentials path not configured")
         return None
     
-    try:
-        return GoogleDriveService(api_key=api_key, credentials_path=credentials_path)
-    except Exception as e:
-        logger.error(f"Failed to initialize Google Drive service: {str(e)}")
-        return None
-
+    key = (api_key, credentials_path)
+    drive_service = _services.get(key)
+    if drive_service is not None:
+        return drive_service
+    
+    with _services_lock:
+        drive_service = _services.get(key)
+        if drive_service is None:
+            try:
+                drive_service = GoogleDriveService(api_key=api_key, credentials_path=credentials_path)
+            except Exception as e:
+                logger.error(f"Failed to initialize Google Drive service: {str(e)}")
+                return None
+            _services[key] = drive_service
+    return drive_service
@@ -0,0 +1,99 @@
+"""
+Helpers for HTTP validators, byte range requests and content negotiation.
+"""
+
+import re
+from typing import Dict, Optional, Tuple
+from django.utils.http import parse_http_date_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single-range Range header against a resource of the given size.
+
+    Args:
+        header: Value of the Range header (may be None)
+        size: Total size of the resource in bytes
+
+    Returns:
+        Inclusive (start, end) byte positions, or None if the header is
+        absent or not a single byte range (the full resource is then served)
+
+    Raises:
+        ValueError: If the range cannot be satisfied (answer with 416)
+    """
+    if not header:
+        return None
+
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        # Multiple ranges or other units are not supported, ignore them
+        return None
+
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(size - length, 0), size - 1
+
+    start = int(first)
+    end = int(last) if last else size - 1
+    if last and start > end:
+        # Syntactically invalid range, ignore it
+        return None
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def if_range_matches(request, etag: Optional[str], last_modified: Optional[int]) -> bool:
+    """
+    Check the If-Range precondition of a request.
+
+    Returns:
+        True if the Range header may be honoured, False if the full
+        resource must be sent because the client's copy is outdated
+    """
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+
+    if if_range.startswith('"'):
+        # Only strong validators are allowed in If-Range
+        return etag is not None and if_range == etag
+
+    if_range_date = parse_http_date_safe(if_range)
+    return if_range_date is not None and last_modified is not None and if_range_date == last_modified
+
+
+def parse_accept_header(header: Optional[str]) -> Dict[str, float]:
+    """
+    Parse an Accept header into its media ranges and quality values.
+
+    Args:
+        header: Value of the Accept header (may be None)
+
+    Returns:
+        Dictionary of lowercased media range (e.g. 'image/webp', 'image/*')
+        to its q value, 1.0 unless given; q=0 marks a range as not acceptable
+    """
+    accepted = {}
+    for entry in (header or '').lower().split(','):
+        media_range, *params = [part.strip() for part in entry.split(';')]
+        if not media_range:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    quality = min(max(float(value), 0.0), 1.0)
+                except ValueError:
+                    # Malformed q value, treat the range as not acceptable
+                    quality = 0.0
+        accepted[media_range] = max(quality, accepted.get(media_range, 0.0))
+    return accepted
@@ -0,0 +1,90 @@
+"""
+Locks keyed by name, shared between threads and between worker processes.
+
+Used to make sure expensive work for a given key (e.g. rendering the
+thumbnail of one Drive file) runs only once while other workers wait
+for its result.
+"""
+
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import logging
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows has no fcntl
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# key -> [lock, number of threads using it]
+_key_locks = {}
+_key_locks_guard = threading.Lock()
+
+
+@contextmanager
+def thread_lock(key: str):
+    """Hold an in-process lock dedicated to key."""
+    with _key_locks_guard:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _key_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _key_locks[key]
+
+
+@contextmanager
+def file_lock(path: Path):
+    """
+    Hold an exclusive advisory lock on path, shared across processes.
+
+    The lock file is removed on release. Where fcntl is not available the
+    lock is a no-op and only thread_lock protects the critical section.
+    """
+    if fcntl is None:
+        yield
+        return
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    while True:
+        lock_file = open(path, 'a')
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        # The previous holder may have removed the file while we waited,
+        # in which case we hold a lock nobody else can see: retry
+        try:
+            if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        lock_file.close()
+
+    try:
+        yield
+    finally:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        lock_file.close()
+
+
+@contextmanager
+def single_flight(key: str, lock_path: Path):
+    """
+    Run the enclosed block for key in at most one thread of one process at a time.
+
+    Callers should re-check for the result of the work right after
+    entering the block, since another worker may have produced it while
+    they were waiting.
+    """
+    with thread_lock(key):
+        with file_lock(lock_path):
+            yield
@@ -1,23 +1,45 @@
 from rest_framework import serializers
 from portfolio.models import Category, PortfolioImage
 from clients.models import ClientAlbum, AlbumImage, GoogleDriveAlbum
+from backend.derivatives import get_derivative_urls
+from backend.thumbnail_utils import get_thumbnail_sizes
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
         fields = ['id', 'name', 'slug']
 
+class DerivativesField(serializers.Field):
+    """
+    URLs of the web-optimized renditions of an image, e.g.
+    {"thumbnail": {"width": 400, "height": 300, "webp": "...", "jpeg": "..."}}.
+    
+    Empty until the derivatives are generated; clients fall back to the original.
+    """
+    
+    def __init__(self, image_field='image', **kwargs):
+        self.image_field = image_field
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+    
+    def to_representation(self, value):
+        storage = self.parent.Meta.model._meta.get_field(self.image_field).storage
+        return get_derivative_urls(storage, value, self.context.get('request'))
+
 class PortfolioImageSerializer(serializers.ModelSerializer):
     category = CategorySerializer(read_only=True)
+    derivatives = DerivativesField()
     
     class Meta:
         model = PortfolioImage
-        fields = ['id', 'title', 'image', 'category', 'description', 'created_at']
+        fields = ['id', 'title', 'image', 'derivatives', 'category', 'description', 'created_at']
 
 class AlbumImageSerializer(serializers.ModelSerializer):
+    derivatives = DerivativesField()
+    
     class Meta:
         model = AlbumImage
-        fields = ['id', 'image', 'created_at']
+        fields = ['id', 'image', 'derivatives', 'created_at']
 
 class ClientAlbumSerializer(serializers.ModelSerializer):
     images = AlbumImageSerializer(many=True, read_only=True)
@@ -26,6 +48,28 @@ class ClientAlbumSerializer(serializers.ModelSerializer):
         model = ClientAlbum
         fields = ['id', 'title', 'created_at', 'images']
 
+class ClientAlbumSummarySerializer(serializers.ModelSerializer):
+    """
+    Album list entry without nested images.
+    
+    Expects the image_count and cover_image_name annotations added by
+    ClientAlbumViewSet, so a whole page is serialized from one query.
+    """
+    image_count = serializers.IntegerField(read_only=True)
+    cover_image = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = ClientAlbum
+        fields = ['id', 'title', 'created_at', 'image_count', 'cover_image']
+    
+    def get_cover_image(self, obj):
+        """URL of the album's first image, built like AlbumImageSerializer.image"""
+        if not obj.cover_image_name:
+            return None
+        url = AlbumImage._meta.get_field('image').storage.url(obj.cover_image_name)
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
 class GoogleDriveImageSerializer(serializers.Serializer):
     """Serializer for Google Drive image data."""
     id = serializers.CharField()
@@ -37,8 +81,10 @@ class GoogleDriveImageSerializer(serializers.Serializer):
     thumbnailLink = serializers.CharField(required=False, allow_null=True)
     downloadLink = serializers.CharField()
     directLink = serializers.CharField()
+    folderPath = serializers.CharField(required=False, allow_blank=True, default='')
     proxyLink = serializers.SerializerMethodField()
     thumbnailProxyLink = serializers.SerializerMethodField()
+    thumbnailSrcset = serializers.SerializerMethodField()
     
     def get_proxyLink(self, obj):
         """Generate proxy link for authenticated image access"""
@@ -55,6 +101,16 @@ class GoogleDriveImageSerializer(serializers.Serializer):
         if request:
             return request.build_absolute_uri(f'/api/google-drive/image/{obj["id"]}/?thumbnail=true')
         return f"/api/google-drive/image/{obj['id']}/?thumbnail=true"
+    
+    def get_thumbnailSrcset(self, obj):
+        """Generate a srcset of the responsive thumbnail variants"""
+        request = self.context.get('request') if hasattr(self, 'context') else None
+        url = f"/api/google-drive/image/{obj['id']}/"
+        if request:
+            url = request.build_absolute_uri(url)
+        return ', '.join(
+            f"{url}?thumbnail=true&size={size} {size}w" for size in get_thumbnail_sizes()
+        )
 
 class GoogleDriveAlbumSerializer(serializers.ModelSerializer):
     """Serializer for Google Drive Album with images from Drive."""
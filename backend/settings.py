@@ -106,6 +106,32 @@ else:
     }
 
 
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+# Per-process memory by default; set CACHE_REDIS_URL to share one cache between workers
+
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', '')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'avestudio',
+        }
+    }
+
+# Seconds portfolio and category API responses are cached; changes invalidate them
+# at once in the process that made them, other processes see them within this delay
+PORTFOLIO_CACHE_TIMEOUT = int(os.getenv('PORTFOLIO_CACHE_TIMEOUT', '300'))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -165,9 +191,92 @@ CORS_EXPOSE_HEADERS = ['Content-Disposition']
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:3000')
 
 # File upload settings
-# Allow up to 500 files in a single request
+# Allow up to 500 files in a single multipart request
 DATA_UPLOAD_MAX_NUMBER_FILES = 500
-# Increase memory size to handle large bulk uploads (default is 2.5MB, set to 100MB)
-DATA_UPLOAD_MAX_MEMORY_SIZE = 100 * 1024 * 1024  # 100 MB
-# Increase file upload max size (default is 2.5MB, set to 50MB per file)
-FILE_UPLOAD_MAX_MEMORY_SIZE = 50 * 1024 * 1024  # 50 MB
\ No newline at end of file
+# The admin upload forms send images in chunks (see below), so request
+# bodies stay small; non-file form data is still capped in memory
+DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10 MB
+# Files of multipart posts above Django's default 2.5 MB are streamed to a temporary file
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB
+
+# Chunked, resumable admin uploads
+# Size of the chunks the upload forms send, several at once
+CHUNKED_UPLOAD_CHUNK_SIZE = int(os.getenv('CHUNKED_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+# Where chunks are stored until their upload completes (outside MEDIA_ROOT)
+CHUNKED_UPLOAD_DIR = Path(os.getenv('CHUNKED_UPLOAD_DIR', str(BASE_DIR / 'tmp' / 'uploads')))
+# Most files of one chunked upload (0 = unlimited)
+CHUNKED_UPLOAD_MAX_FILES = int(os.getenv('CHUNKED_UPLOAD_MAX_FILES', '5000'))
+# Seconds after which unfinished uploads are discarded
+CHUNKED_UPLOAD_EXPIRY = int(os.getenv('CHUNKED_UPLOAD_EXPIRY', str(24 * 60 * 60)))
+# Seconds after which an upload still being processed is considered
+# interrupted (e.g. by a worker restart), so it can be completed again
+CHUNKED_UPLOAD_PROCESSING_TIMEOUT = int(os.getenv('CHUNKED_UPLOAD_PROCESSING_TIMEOUT', str(60 * 60)))
+
+# Google Drive mirror settings
+# Minimum seconds between two syncs of a Drive album's local mirror with Drive
+GOOGLE_DRIVE_SYNC_INTERVAL = int(os.getenv('GOOGLE_DRIVE_SYNC_INTERVAL', '60'))
+
+# Render missing thumbnails in the background whenever a Drive album is saved
+GOOGLE_DRIVE_PREWARM_ON_SAVE = os.getenv('GOOGLE_DRIVE_PREWARM_ON_SAVE', 'True').lower() == 'true'
+# Concurrent downloads/renders used when pre-warming album thumbnails
+GOOGLE_DRIVE_PREWARM_WORKERS = int(os.getenv('GOOGLE_DRIVE_PREWARM_WORKERS', '4'))
+# Seconds file metadata seen in Drive listings is reused instead of fetched again
+GOOGLE_DRIVE_METADATA_TTL = int(os.getenv('GOOGLE_DRIVE_METADATA_TTL', '120'))
+# Serve the Drive album, listing and image proxy endpoints with native async views
+# (run the project under ASGI, e.g. uvicorn backend.asgi:application, to benefit)
+GOOGLE_DRIVE_ASYNC_VIEWS = os.getenv('GOOGLE_DRIVE_ASYNC_VIEWS', 'False').lower() == 'true'
+# Connection pool size of the async Drive client, per event loop
+GOOGLE_DRIVE_ASYNC_MAX_CONNECTIONS = int(os.getenv('GOOGLE_DRIVE_ASYNC_MAX_CONNECTIONS', '200'))
+# Concurrent original downloads feeding a Drive album ZIP download
+GOOGLE_DRIVE_DOWNLOAD_WORKERS = int(os.getenv('GOOGLE_DRIVE_DOWNLOAD_WORKERS', '4'))
+# Mirror the images of album subfolders too, down to GOOGLE_DRIVE_MAX_FOLDER_DEPTH levels
+GOOGLE_DRIVE_RECURSIVE_ALBUMS = os.getenv('GOOGLE_DRIVE_RECURSIVE_ALBUMS', 'True').lower() == 'true'
+GOOGLE_DRIVE_MAX_FOLDER_DEPTH = int(os.getenv('GOOGLE_DRIVE_MAX_FOLDER_DEPTH', '5'))
+# Batch listing requests (of up to 100 subfolders each) sent concurrently while walking an album folder tree
+GOOGLE_DRIVE_LISTING_WORKERS = int(os.getenv('GOOGLE_DRIVE_LISTING_WORKERS', '8'))
+# Drive listing and metadata requests per second allowed per process, counting
+# every request of a batch (0 disables the limit)
+GOOGLE_DRIVE_REQUESTS_PER_SECOND = float(os.getenv('GOOGLE_DRIVE_REQUESTS_PER_SECOND', '20'))
+
+# Client album archives
+# Build the ZIP of a client album in the background once its images stop changing
+ALBUM_ARCHIVE_PREBUILD = os.getenv('ALBUM_ARCHIVE_PREBUILD', 'True').lower() == 'true'
+# Seconds without image changes before the archive is rebuilt
+ALBUM_ARCHIVE_BUILD_DELAY = int(os.getenv('ALBUM_ARCHIVE_BUILD_DELAY', '30'))
+# Where the archives are stored (outside MEDIA_ROOT, which is served without a PIN check)
+ALBUM_ARCHIVE_DIR = Path(os.getenv('ALBUM_ARCHIVE_DIR', str(BASE_DIR / 'tmp' / 'archives')))
+# Seconds a signed album download link stays valid, including resumed downloads
+ALBUM_DOWNLOAD_LINK_TTL = int(os.getenv('ALBUM_DOWNLOAD_LINK_TTL', '3600'))
+# Concurrent storage writes (image files and QR codes) of the admin bulk upload
+ALBUM_UPLOAD_WORKERS = int(os.getenv('ALBUM_UPLOAD_WORKERS', '8'))
+
+# Thumbnail variants
+# Longest edge in pixels of each responsive thumbnail variant
+THUMBNAIL_SIZES = [int(size) for size in os.getenv('THUMBNAIL_SIZES', '200,400,800,1600').split(',')]
+# Output formats; AVIF/WebP are served to clients that accept them, JPEG to everyone else
+THUMBNAIL_FORMATS = [fmt.strip() for fmt in os.getenv('THUMBNAIL_FORMATS', 'avif,webp,jpeg').split(',')]
+# Image thumbnails are rendered from: 'drive' (Drive's server-side resized
+# rendition, falling back to the original) or 'original' (always download the original)
+THUMBNAIL_SOURCE = os.getenv('THUMBNAIL_SOURCE', 'drive')
+# Byte budget of the thumbnail cache; least recently used thumbnails are evicted
+# beyond it (0 disables eviction)
+THUMBNAIL_CACHE_MAX_BYTES = int(os.getenv('THUMBNAIL_CACHE_MAX_BYTES', str(5 * 1024 ** 3)))
+# Check the cache size after this many generated thumbnail sets
+THUMBNAIL_CACHE_EVICT_EVERY = int(os.getenv('THUMBNAIL_CACHE_EVICT_EVERY', '200'))
+# Seconds between access time updates of a cached thumbnail
+THUMBNAIL_CACHE_TOUCH_INTERVAL = int(os.getenv('THUMBNAIL_CACHE_TOUCH_INTERVAL', '3600'))
+
+# Derivatives of uploaded album and portfolio images
+# Render web-optimized renditions of every uploaded image next to the original,
+# in a background thread once the image is saved
+# (existing images: manage.py generate_image_derivatives)
+IMAGE_DERIVATIVES_ON_UPLOAD = os.getenv('IMAGE_DERIVATIVES_ON_UPLOAD', 'True').lower() == 'true'
+# Rendition name -> longest edge in pixels
+IMAGE_DERIVATIVE_SIZES = {
+    name.strip(): int(size)
+    for name, size in (
+        entry.split(':') for entry in os.getenv('IMAGE_DERIVATIVE_SIZES', 'thumbnail:400,medium:1200,large:2048').split(',')
+    )
+}
+# Output formats of every rendition (JPEGs are progressive)
+IMAGE_DERIVATIVE_FORMATS = [fmt.strip() for fmt in os.getenv('IMAGE_DERIVATIVE_FORMATS', 'webp,jpeg').split(',')]
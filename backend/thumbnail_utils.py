@@ -1,114 +1,770 @@
 """
 Utility functions for generating and caching thumbnails from Google Drive images.
+
+Every image gets a set of responsive variants: one per configured size
+(longest edge in pixels) and output format (JPEG, WebP, AVIF). Variants
+are rendered on demand from a source image downloaded once per file and
+cached next to them until every variant exists.
 """
 
 import os
+import json
 import hashlib
+import tempfile
+import threading
+import time
+from collections import Counter
 from io import BytesIO
-from typing import Optional
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
 from pathlib import Path
 from django.conf import settings
-from PIL import Image
+from PIL import Image, ImageOps, features
+from backend.http_utils import parse_accept_header
+from backend.locks import single_flight
 import logging
 
 logger = logging.getLogger(__name__)
 
 # Thumbnail settings
-THUMBNAIL_SIZE = (800, 800)  # Max dimensions for thumbnails
+THUMBNAIL_SIZE = (800, 800)  # Max dimensions for the default thumbnail
 THUMBNAIL_QUALITY = 85  # JPEG quality for thumbnails
 THUMBNAIL_CACHE_DIR = 'thumbnails'
 
+# Responsive variant sizes (longest edge), overridable with settings.THUMBNAIL_SIZES
+DEFAULT_THUMBNAIL_SIZES = [200, 400, 800, 1600]
+
+# Output formats in order of preference when the client accepts several
+THUMBNAIL_FORMATS = {
+    'avif': {
+        'extension': 'avif',
+        'mime_type': 'image/avif',
+        'pil_format': 'AVIF',
+        'options': {'quality': 60},
+    },
+    'webp': {
+        'extension': 'webp',
+        'mime_type': 'image/webp',
+        'pil_format': 'WEBP',
+        'options': {'quality': 80, 'method': 4},
+    },
+    'jpeg': {
+        'extension': 'jpg',
+        'mime_type': 'image/jpeg',
+        'pil_format': 'JPEG',
+        'options': {'quality': THUMBNAIL_QUALITY, 'optimize': True},
+    },
+}
+DEFAULT_FORMAT = 'jpeg'
+
+# JPEG quality of the cached source image variants are rendered from
+SOURCE_QUALITY = 95
+
+# Cache bookkeeping files, kept out of the shard directories
+LOCKS_DIR = '.locks'
+STATS_FILE = '.stats.json'
+# Merge in-memory hit/miss counters into STATS_FILE every N events
+STATS_FLUSH_EVERY = 100
+# Eviction trims the cache to this fraction of its byte budget
+EVICTION_TARGET_RATIO = 0.9
+
+_pending_stats = Counter(hits=0, misses=0, evictions=0)
+_stats_lock = threading.Lock()
+_writes_since_eviction = 0
+_eviction_running = threading.Event()
+
+
+def get_thumbnail_sizes() -> List[int]:
+    """Get the configured variant sizes, smallest first."""
+    return sorted(getattr(settings, 'THUMBNAIL_SIZES', None) or DEFAULT_THUMBNAIL_SIZES)
+
+
+def get_default_thumbnail_size() -> int:
+    """Get the variant size served when the client does not ask for one."""
+    return nearest_thumbnail_size(max(THUMBNAIL_SIZE))
+
+
+def nearest_thumbnail_size(requested: Optional[int]) -> int:
+    """
+    Map a requested width to the smallest configured size that covers it.
+
+    Args:
+        requested: Requested size in pixels, or None for the default size
+
+    Returns:
+        A configured variant size
+    """
+    if requested is None:
+        return get_default_thumbnail_size()
+    sizes = get_thumbnail_sizes()
+    for size in sizes:
+        if size >= requested:
+            return size
+    return sizes[-1]
+
 
-def get_thumbnail_path(file_id: str) -> Path:
+def get_thumbnail_formats() -> List[str]:
+    """Get the enabled output formats supported by the installed Pillow, in preference order."""
+    enabled = getattr(settings, 'THUMBNAIL_FORMATS', None) or list(THUMBNAIL_FORMATS)
+    formats = [
+        fmt for fmt in THUMBNAIL_FORMATS
+        if fmt in enabled and (fmt == DEFAULT_FORMAT or features.check(fmt))
+    ]
+    return formats or [DEFAULT_FORMAT]
+
+
+def negotiate_thumbnail_format(accept: Optional[str]) -> str:
     """
-    Get the file path for a cached thumbnail.
-    
+    Pick the best output format for an Accept header.
+
+    The enabled format with the highest q value wins, ties going to the
+    preferred (smaller) format. AVIF and WebP are only used when the client
+    lists them explicitly with a non-zero q; JPEG also matches image/* and
+    */* and is the fallback every client can display.
+
+    Args:
+        accept: Value of the request Accept header
+
+    Returns:
+        Format name (key of THUMBNAIL_FORMATS)
+    """
+    accepted = parse_accept_header(accept)
+
+    def quality(fmt):
+        mime_type = THUMBNAIL_FORMATS[fmt]['mime_type']
+        if mime_type in accepted:
+            return accepted[mime_type]
+        if fmt != DEFAULT_FORMAT:
+            return 0.0
+        if not accepted:
+            return 1.0
+        return accepted.get('image/*', accepted.get('*/*', 0.0))
+
+    best = max(get_thumbnail_formats(), key=quality)
+    return best if quality(best) > 0 else DEFAULT_FORMAT
+
+
+def get_thumbnail_mime_type(fmt: str) -> str:
+    """Get the Content-Type of a thumbnail format."""
+    return THUMBNAIL_FORMATS[fmt]['mime_type']
+
+
+def get_thumbnail_cache_dir() -> Path:
+    """Get the root directory of the thumbnail cache."""
+    return Path(settings.MEDIA_ROOT) / THUMBNAIL_CACHE_DIR
+
+
+def get_thumbnail_path(file_id: str, size: Optional[int] = None, fmt: str = DEFAULT_FORMAT) -> Path:
+    """
+    Get the file path for a cached thumbnail variant.
+
+    Thumbnails are spread over two levels of hash-prefix subdirectories
+    (256 x 256 shards) so no directory grows to hundreds of thousands of
+    entries. The directories are created when a thumbnail is written.
+
     Args:
         file_id: Google Drive file ID
-        
+        size: Variant size (defaults to the default thumbnail size)
+        fmt: Output format
+
     Returns:
         Path object for the thumbnail file
     """
-    media_root = Path(settings.MEDIA_ROOT)
-    thumbnail_dir = media_root / THUMBNAIL_CACHE_DIR
-    thumbnail_dir.mkdir(parents=True, exist_ok=True)
-    
+    shard = hashlib.sha1(file_id.encode('utf-8')).hexdigest()
+    size = size or get_default_thumbnail_size()
     # Use file_id as filename (safe for filesystem)
-    # Add .jpg extension for thumbnails
-    return thumbnail_dir / f"{file_id}.jpg"
+    return (
+        get_thumbnail_cache_dir() / shard[:2] / shard[2:4]
+        / f"{file_id}_{size}.{THUMBNAIL_FORMATS[fmt]['extension']}"
+    )
 
 
-def generate_thumbnail(image_content: bytes, file_id: str) -> Optional[Path]:
+def get_thumbnail_source_path(file_id: str) -> Path:
     """
-    Generate a thumbnail from image content and save it to cache.
-    
+    Get the file path of the cached source image the variants of a file are rendered from.
+
+    Args:
+        file_id: Google Drive file ID
+
+    Returns:
+        Path object for the source image, in the shard directory of the variants
+    """
+    return get_thumbnail_path(file_id).with_name(f"{file_id}_source.jpg")
+
+
+def get_thumbnail_lock_path(file_id: str) -> Path:
+    """
+    Get the path of the lock file guarding the generation of the thumbnails of a file.
+
+    Args:
+        file_id: Google Drive file ID
+
+    Returns:
+        Path object for the lock file
+    """
+    return get_thumbnail_cache_dir() / LOCKS_DIR / f"{file_id}.lock"
+
+
+def get_cached_thumbnail(file_id: str, size: Optional[int] = None, fmt: str = DEFAULT_FORMAT) -> Optional[Path]:
+    """
+    Look up a thumbnail variant in the cache, recording the hit for LRU eviction.
+
+    Args:
+        file_id: Google Drive file ID
+        size: Variant size (defaults to the default thumbnail size)
+        fmt: Output format
+
+    Returns:
+        Path to the cached thumbnail, or None if it is not cached
+    """
+    thumbnail_path = get_thumbnail_path(file_id, size, fmt)
+    try:
+        stat = thumbnail_path.stat()
+    except FileNotFoundError:
+        return None
+
+    # The access time drives LRU eviction. Update it explicitly, since
+    # most filesystems are mounted relatime/noatime, but at most once per
+    # interval; mtime is left alone as it backs Last-Modified
+    now = time.time()
+    if now - stat.st_atime > getattr(settings, 'THUMBNAIL_CACHE_TOUCH_INTERVAL', 3600):
+        try:
+            os.utime(thumbnail_path, (now, stat.st_mtime))
+        except OSError:
+            pass
+
+    record_cache_event('hits')
+    return thumbnail_path
+
+
+def record_cache_event(event: str, count: int = 1):
+    """
+    Count a cache hit, miss or eviction.
+
+    Counters are kept in memory and periodically merged into a stats file
+    shared by all worker processes.
+
+    Args:
+        event: One of 'hits', 'misses', 'evictions'
+        count: Number of events
+    """
+    with _stats_lock:
+        _pending_stats[event] += count
+        flush = sum(_pending_stats.values()) >= STATS_FLUSH_EVERY or event == 'evictions'
+    if flush:
+        flush_cache_stats()
+
+
+def flush_cache_stats():
+    """Merge the in-memory cache counters of this process into the shared stats file."""
+    with _stats_lock:
+        pending = dict(_pending_stats)
+        for event in _pending_stats:
+            _pending_stats[event] = 0
+    if not any(pending.values()):
+        return
+
+    cache_dir = get_thumbnail_cache_dir()
+    stats_path = cache_dir / STATS_FILE
+    try:
+        with single_flight('thumbnail-cache-stats', cache_dir / LOCKS_DIR / 'stats.lock'):
+            stats = _read_stats_file(stats_path)
+            for event, count in pending.items():
+                stats[event] = stats.get(event, 0) + count
+            temp_path = stats_path.with_suffix('.tmp')
+            temp_path.write_text(json.dumps(stats))
+            os.replace(temp_path, stats_path)
+    except OSError as e:
+        logger.error(f"Error writing thumbnail cache stats: {str(e)}")
+
+
+def _read_stats_file(stats_path: Path) -> Dict[str, int]:
+    try:
+        return json.loads(stats_path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def get_cache_stats() -> Dict:
+    """
+    Get the cache size and the hit/miss/eviction counters of all processes.
+
+    Returns:
+        Dictionary with files, bytes, hits, misses, evictions and hit_rate
+    """
+    flush_cache_stats()
+    stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    stats.update(_read_stats_file(get_thumbnail_cache_dir() / STATS_FILE))
+
+    entries = _scan_cache()
+    stats['files'] = len(entries)
+    stats['bytes'] = sum(entry[1] for entry in entries)
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+    return stats
+
+
+def _scan_cache() -> List[Tuple[float, int, str]]:
+    """List (atime, size, path) of every cached thumbnail."""
+    entries = []
+    root = get_thumbnail_cache_dir()
+    if not root.exists():
+        return entries
+
+    pending = [str(root)]
+    while pending:
+        with os.scandir(pending.pop()) as scan:
+            for entry in scan:
+                if entry.name.startswith('.'):
+                    # Lock directory, stats file and in-progress temporary files
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    try:
+                        stat = entry.stat(follow_symlinks=False)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_atime, stat.st_size, entry.path))
+    return entries
+
+
+def evict_thumbnail_cache(max_bytes: Optional[int] = None) -> Dict:
+    """
+    Delete least recently used thumbnails until the cache fits its byte budget.
+
+    When the cache is over budget it is trimmed to 90% of it, so eviction
+    does not run again after the very next write.
+
+    Args:
+        max_bytes: Byte budget (defaults to THUMBNAIL_CACHE_MAX_BYTES; 0 disables eviction)
+
+    Returns:
+        Dictionary with files, bytes (after eviction), evicted and evicted_bytes
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'THUMBNAIL_CACHE_MAX_BYTES', 0)
+
+    cache_dir = get_thumbnail_cache_dir()
+    with single_flight('thumbnail-cache-eviction', cache_dir / LOCKS_DIR / 'eviction.lock'):
+        entries = _scan_cache()
+        total = sum(entry[1] for entry in entries)
+        result = {'files': len(entries), 'bytes': total, 'evicted': 0, 'evicted_bytes': 0}
+        if not max_bytes or total <= max_bytes:
+            return result
+
+        target = int(max_bytes * EVICTION_TARGET_RATIO)
+        entries.sort()
+        for _, file_size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= file_size
+            result['evicted'] += 1
+            result['evicted_bytes'] += file_size
+
+        result['files'] -= result['evicted']
+        result['bytes'] = total
+
+    record_cache_event('evictions', result['evicted'])
+    logger.info(f"Evicted {result['evicted']} thumbnail(s), {result['evicted_bytes']} bytes")
+    return result
+
+
+def _eviction_worker():
+    try:
+        evict_thumbnail_cache()
+    except Exception as e:
+        logger.error(f"Error evicting thumbnail cache: {str(e)}")
+    finally:
+        _eviction_running.clear()
+
+
+def _maybe_schedule_eviction():
+    """Run an eviction pass in the background after every THUMBNAIL_CACHE_EVICT_EVERY writes."""
+    global _writes_since_eviction
+
+    if not getattr(settings, 'THUMBNAIL_CACHE_MAX_BYTES', 0):
+        return
+    with _stats_lock:
+        _writes_since_eviction += 1
+        if _writes_since_eviction < getattr(settings, 'THUMBNAIL_CACHE_EVICT_EVERY', 200):
+            return
+        _writes_since_eviction = 0
+    if _eviction_running.is_set():
+        return
+    _eviction_running.set()
+    threading.Thread(target=_eviction_worker, daemon=True).start()
+
+
+def migrate_legacy_thumbnails() -> int:
+    """
+    Move thumbnails written in the flat cache layout into their shard directory.
+
+    Handles both <file_id>.jpg (single 800 px JPEG) and <file_id>_<size>.<ext>.
+
+    Returns:
+        Number of thumbnails moved
+    """
+    extensions = {options['extension']: fmt for fmt, options in THUMBNAIL_FORMATS.items()}
+    root = get_thumbnail_cache_dir()
+    if not root.exists():
+        return 0
+
+    moved = 0
+    for entry in list(os.scandir(root)):
+        if not entry.is_file() or entry.name.startswith('.') or entry.name == STATS_FILE:
+            continue
+        stem, _, extension = entry.name.rpartition('.')
+        fmt = extensions.get(extension)
+        if not fmt:
+            continue
+        file_id, _, size = stem.rpartition('_')
+        if not (file_id and size.isdigit()):
+            # Pre-variant layout: a single default-size JPEG
+            file_id, size = stem, str(max(THUMBNAIL_SIZE))
+
+        target = get_thumbnail_path(file_id, int(size), fmt)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(entry.path, target)
+        moved += 1
+    return moved
+
+
+def _save_atomically(image: Image.Image, path: Path, fmt: str, **options):
+    """Encode image to a temporary file next to path, then rename it into place, overriding encoder options."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.stem}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            image.save(temp_file, THUMBNAIL_FORMATS[fmt]['pil_format'], **{**THUMBNAIL_FORMATS[fmt]['options'], **options})
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def fit_size(size: Tuple[int, int], max_edge: int) -> Tuple[int, int]:
+    """
+    Compute the dimensions of an image scaled to fit in a max_edge square.
+
+    Images are never upscaled.
+
+    Args:
+        size: Original (width, height)
+        max_edge: Maximum length of the longest edge
+
+    Returns:
+        Scaled (width, height)
+    """
+    width, height = size
+    scale = min(max_edge / width, max_edge / height, 1)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def prepare_image(source: Union[bytes, BinaryIO], max_edge: int) -> Image.Image:
+    """
+    Decode an image at the lowest resolution that still covers max_edge.
+
+    JPEGs are downscaled in the DCT domain while decoding (draft mode), other
+    formats are box-reduced by an integer factor right after decoding, so the
+    full-resolution bitmap of a large original is never materialised.
+    EXIF orientation is applied once and the result is flattened to RGB.
+
+    Args:
+        source: Raw image bytes or a binary file object
+        max_edge: Longest edge of the largest variant that will be rendered
+
+    Returns:
+        RGB image at least max_edge pixels on its longest edge (unless the
+        original is smaller)
+    """
+    if isinstance(source, bytes):
+        source = BytesIO(source)
+    image = Image.open(source)
+
+    # JPEG only: let libjpeg decode at 1/2, 1/4 or 1/8 scale
+    image.draft('RGB', fit_size(image.size, max_edge))
+
+    # Other formats: cheap integer box reduction down to the target size
+    target = fit_size(image.size, max_edge)
+    factor = min(image.width // target[0], image.height // target[1])
+    if factor >= 2:
+        if image.mode in ('P', '1'):
+            # Averaging palette indices or bilevel pixels makes no sense
+            image = image.convert('RGBA' if image.mode == 'P' else 'L')
+        image = image.reduce(factor)
+
+    # Apply EXIF orientation once, on the reduced image
+    image = ImageOps.exif_transpose(image)
+
+    # Convert to RGB if necessary (for JPEG output)
+    if image.mode in ('RGBA', 'LA', 'P', 'PA'):
+        # Create white background for transparent images
+        if image.mode in ('P', 'PA'):
+            image = image.convert('RGBA')
+        rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+        rgb_image.paste(image, mask=image.split()[-1])
+        image = rgb_image
+    elif image.mode != 'RGB':
+        image = image.convert('RGB')
+
+    return image
+
+
+def render_variants(image: Image.Image, sizes: List[int]) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Resize a prepared image to every size, largest first.
+
+    Each variant is resampled with LANCZOS from the next larger one, while
+    its dimensions are computed from the prepared image to avoid
+    accumulating rounding errors.
+
+    Args:
+        image: Image returned by prepare_image
+        sizes: Variant sizes (longest edge)
+
+    Yields:
+        Tuples of (size, resized image)
+    """
+    source = image
+    for size in sorted(sizes, reverse=True):
+        target = fit_size(image.size, size)
+        if source.size != target:
+            source = source.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        yield size, source
+
+
+def generate_thumbnails(image_content: bytes, file_id: str, fmt: str = DEFAULT_FORMAT,
+                        sizes: Optional[List[int]] = None) -> Dict[int, Path]:
+    """
+    Generate size variants of a thumbnail in one format and save them to cache.
+
+    The original is decoded once, at the reduced resolution the largest
+    requested variant needs (see prepare_image). Files are written to a
+    temporary file first and then renamed into place, so readers never
+    see a partially written file.
+
     Args:
         image_content: Raw image bytes
         file_id: Google Drive file ID (for cache filename)
-        
+        fmt: Output format
+        sizes: Variant sizes to render (defaults to every configured size)
+
     Returns:
-        Path to the saved thumbnail, or None if generation failed
+        Mapping of size to the saved thumbnail path, empty if generation failed
     """
     try:
-        # Open image from bytes
-        image = Image.open(BytesIO(image_content))
-        
-        # Convert to RGB if necessary (for JPEG output)
-        if image.mode in ('RGBA', 'LA', 'P'):
-            # Create white background for transparent images
-            rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-            if image.mode == 'P':
-                image = image.convert('RGBA')
-            rgb_image.paste(image, mask=image.split()[-1] if image.mode in ('RGBA', 'LA') else None)
-            image = rgb_image
-        elif image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # Create thumbnail maintaining aspect ratio
-        image.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
-        
-        # Save thumbnail
-        thumbnail_path = get_thumbnail_path(file_id)
-        image.save(thumbnail_path, 'JPEG', quality=THUMBNAIL_QUALITY, optimize=True)
-        
-        logger.info(f"Generated thumbnail for file {file_id}: {thumbnail_path}")
-        return thumbnail_path
-    
+        sizes = sizes or get_thumbnail_sizes()
+        image = prepare_image(image_content, max(sizes))
+    except Exception as e:
+        logger.error(f"Error generating thumbnail for file {file_id}: {str(e)}")
+        return {}
+    return render_thumbnails(image, file_id, fmt, sizes)
+
+
+def render_thumbnails(image: Image.Image, file_id: str, fmt: str, sizes: List[int]) -> Dict[int, Path]:
+    """
+    Render size variants of a prepared image in one format and save them to cache.
+
+    Args:
+        image: Image returned by prepare_image
+        file_id: Google Drive file ID (for cache filename)
+        fmt: Output format
+        sizes: Variant sizes to render
+
+    Returns:
+        Mapping of size to the saved thumbnail path, empty if rendering failed
+    """
+    try:
+        thumbnail_paths = {}
+        for size, variant in render_variants(image, sizes):
+            thumbnail_path = get_thumbnail_path(file_id, size, fmt)
+            _save_atomically(variant, thumbnail_path, fmt)
+            thumbnail_paths[size] = thumbnail_path
+
+        logger.info(f"Generated {fmt} thumbnails for file {file_id}: {sorted(thumbnail_paths)}")
+        return thumbnail_paths
+
+    except Exception as e:
+        logger.error(f"Error generating thumbnail for file {file_id}: {str(e)}")
+        return {}
+
+
+def load_thumbnail_source(
+    file_id: str,
+    image_content: Union[bytes, Callable[[], Optional[bytes]]],
+    max_edge: Optional[int] = None,
+) -> Optional[Image.Image]:
+    """
+    Get the image the thumbnails of a file are rendered from.
+
+    The first miss of a file fetches its content (Drive's rendition or the
+    original), decodes it at the largest variant size and caches it as a
+    high-quality JPEG, so misses for the other sizes and formats render
+    from that instead of downloading again. Reads do not refresh its
+    access time, so LRU eviction drops it before its variants.
+
+    Args:
+        file_id: Google Drive file ID
+        image_content: Raw image bytes, or a callable returning them; the
+                       callable is only invoked if no source is cached
+        max_edge: Longest edge the caller renders, to decode a cached
+                  source at reduced resolution (defaults to the largest size)
+
+    Returns:
+        RGB image at least max_edge pixels on its longest edge (unless the
+        source is smaller), or None if the content is unavailable or unreadable
+    """
+    largest = max(get_thumbnail_sizes())
+    source_path = get_thumbnail_source_path(file_id)
+    try:
+        with open(source_path, 'rb') as source_file:
+            image = prepare_image(source_file, min(max_edge or largest, largest))
+            image.load()
+        return image
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable thumbnail source of file {file_id}: {str(e)}")
+
+    if callable(image_content):
+        image_content = image_content()
+    if not image_content:
+        return None
+
+    try:
+        image = prepare_image(image_content, largest)
+        target = fit_size(image.size, largest)
+        if image.size != target:
+            image = image.resize(target, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        _save_atomically(image, source_path, 'jpeg', quality=SOURCE_QUALITY)
     except Exception as e:
         logger.error(f"Error generating thumbnail for file {file_id}: {str(e)}")
         return None
+    return image
+
+
+def _drop_complete_source(file_id: str):
+    """Delete the cached source of a file once every variant of it exists."""
+    if all(
+        get_thumbnail_path(file_id, size, fmt).exists()
+        for fmt in get_thumbnail_formats() for size in get_thumbnail_sizes()
+    ):
+        try:
+            os.remove(get_thumbnail_source_path(file_id))
+        except FileNotFoundError:
+            pass
+
+
+def get_thumbnail_source_loader(drive_service, file_id: str, thumbnail_link: Optional[str] = None) -> Callable[[], Optional[bytes]]:
+    """
+    Build a loader for the image the thumbnails of a Drive file are rendered from.
 
+    With THUMBNAIL_SOURCE = 'drive' the loader fetches Drive's own resized
+    rendition at the largest variant size and only downloads the original
+    when Drive has no thumbnail; with 'original' it always downloads the
+    original. The content is fetched at most once per loader, and only if
+    no source of the file is cached yet (see load_thumbnail_source).
 
-def get_or_create_thumbnail(file_id: str, image_content: bytes) -> Optional[Path]:
+    Args:
+        drive_service: GoogleDriveService to fetch the image with
+        file_id: Google Drive file ID
+        thumbnail_link: thumbnailLink from a listing or the metadata, if known
+
+    Returns:
+        Callable returning the source image content, or None if unavailable
+    """
+    content = []
+
+    def load():
+        if not content:
+            source = None
+            if getattr(settings, 'THUMBNAIL_SOURCE', 'drive') == 'drive':
+                source = drive_service.get_thumbnail(file_id, max(get_thumbnail_sizes()), thumbnail_link)
+            if source is None:
+                source = drive_service.get_file_content(file_id)
+            content.append(source)
+        return content[0]
+
+    return load
+
+
+def get_or_create_thumbnail(
+    file_id: str,
+    image_content: Union[bytes, Callable[[], Optional[bytes]]],
+    size: Optional[int] = None,
+    fmt: str = DEFAULT_FORMAT,
+    sizes: Optional[List[int]] = None,
+) -> Optional[Path]:
     """
     Get existing thumbnail or create a new one.
-    
+
+    A miss only renders the requested size, so a small thumbnail never pays
+    for encoding the largest one; the other sizes are rendered by their own
+    misses or by the album warmup (which passes every size). Every miss of
+    a file renders from the same cached source (see load_thumbnail_source),
+    so the file is downloaded once whatever the size and format.
+
+    Generation is single-flight per file ID: when several threads or worker
+    processes miss the cache for the same file at once, only one of them
+    downloads the source and renders the variant while the others wait and
+    reuse its result.
+
     Args:
         file_id: Google Drive file ID
-        image_content: Raw image bytes (only used if thumbnail doesn't exist)
-        
+        image_content: Raw image bytes, or a callable returning them; the
+                       callable is only invoked if the thumbnail must be generated
+        size: Variant size (defaults to the default thumbnail size)
+        fmt: Output format
+        sizes: Further variant sizes to render from the same download, if not cached yet
+
     Returns:
         Path to thumbnail file, or None if generation failed
     """
-    thumbnail_path = get_thumbnail_path(file_id)
-    
+    size = size or get_default_thumbnail_size()
+
     # Return existing thumbnail if it exists
-    if thumbnail_path.exists():
+    thumbnail_path = get_cached_thumbnail(file_id, size, fmt)
+    if thumbnail_path:
         return thumbnail_path
-    
-    # Generate new thumbnail
-    return generate_thumbnail(image_content, file_id)
 
+    with single_flight(f"thumbnail:{file_id}", get_thumbnail_lock_path(file_id)):
+        # Another worker may have generated it while we were waiting
+        thumbnail_path = get_cached_thumbnail(file_id, size, fmt)
+        if thumbnail_path:
+            return thumbnail_path
 
-def get_thumbnail_url(file_id: str) -> str:
+        record_cache_event('misses')
+        # Generate the requested variant (and the other missing ones asked for)
+        render_sizes = [size] + [
+            other for other in (sizes or []) if other != size and not get_thumbnail_path(file_id, other, fmt).exists()
+        ]
+        image = load_thumbnail_source(file_id, image_content, max(render_sizes))
+        if image is None:
+            return None
+        thumbnail_path = render_thumbnails(image, file_id, fmt, render_sizes).get(size)
+        if thumbnail_path:
+            _drop_complete_source(file_id)
+
+    _maybe_schedule_eviction()
+    return thumbnail_path
+
+
+def get_thumbnail_url(file_id: str, size: Optional[int] = None, fmt: str = DEFAULT_FORMAT) -> str:
     """
     Get the URL for a thumbnail.
-    
+
     Args:
         file_id: Google Drive file ID
-        
+        size: Variant size (defaults to the default thumbnail size)
+        fmt: Output format
+
     Returns:
         URL path to the thumbnail
     """
-    return f"{settings.MEDIA_URL}{THUMBNAIL_CACHE_DIR}/{file_id}.jpg"
-
+    relative_path = get_thumbnail_path(file_id, size, fmt).relative_to(settings.MEDIA_ROOT)
+    return f"{settings.MEDIA_URL}{relative_path.as_posix()}"
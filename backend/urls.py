@@ -6,7 +6,7 @@ from django.conf.urls.static import static
 from rest_framework.routers import DefaultRouter
 from backend.sitemap import sitemaps
 from portfolio.views import PortfolioViewSet, CategoryViewSet
-from clients.views import ClientAlbumViewSet, GoogleDriveAlbumViewSet, verify_pin, download_album, proxy_google_drive_image
+from clients.views import ClientAlbumViewSet, GoogleDriveAlbumViewSet, verify_pin, download_album, download_album_archive, proxy_google_drive_image
 from backend.views import list_google_drive_images, get_google_drive_folder_info
 
 router = DefaultRouter()
@@ -23,7 +23,18 @@ urlpatterns = [
     path('api/verify-pin', verify_pin, name='verify-pin-no-slash'),
     path('api/download-album/', download_album, name='download-album'),
     path('api/download-album', download_album, name='download-album-no-slash'),
+    path('api/download-album/<str:token>/', download_album_archive, name='download-album-archive'),
     path('api/google-drive/images/', list_google_drive_images, name='google-drive-images'),
     path('api/google-drive/folder-info/', get_google_drive_folder_info, name='google-drive-folder-info'),
     path('api/google-drive/image/<str:file_id>/', proxy_google_drive_image, name='google-drive-image-proxy'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+if getattr(settings, 'GOOGLE_DRIVE_ASYNC_VIEWS', False):
+    # Native async Drive views for ASGI deployments, matched before the sync ones
+    from clients import async_views
+
+    urlpatterns = [
+        path('api/drive-albums/<str:pk>/', async_views.drive_album_detail, name='drive-album-detail-async'),
+        path('api/google-drive/images/', async_views.list_google_drive_images, name='google-drive-images-async'),
+        path('api/google-drive/image/<str:file_id>/', async_views.proxy_google_drive_image, name='google-drive-image-proxy-async'),
+    ] + urlpatterns
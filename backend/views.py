@@ -8,11 +8,24 @@ from rest_framework import status
 from django.conf import settings
 from backend.google_drive import get_google_drive_service
 from backend.serializers import GoogleDriveImageSerializer
+from clients.drive_sync import get_album_images
+from clients.models import GoogleDriveAlbum
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _folder_images_data(folder_id, images):
+    """Serialize the images listed from a Google Drive folder."""
+    serializer = GoogleDriveImageSerializer(images, many=True)
+    return {
+        'success': True,
+        'count': len(images),
+        'folder_id': folder_id,
+        'images': serializer.data
+    }
+
+
 @api_view(['GET'])
 def list_google_drive_images(request):
     """
@@ -43,18 +56,14 @@ def list_google_drive_images(request):
         )
     
     try:
-        # Get images from the folder
-        images = drive_service.get_image_files(folder_id)
-        
-        # Serialize the data
-        serializer = GoogleDriveImageSerializer(images, many=True)
+        # Serve folders that belong to an album from its local mirror
+        album = GoogleDriveAlbum.objects.filter(folder_id=folder_id).order_by('created_at').first()
+        if album:
+            images = get_album_images(album, drive_service)
+        else:
+            images = drive_service.get_image_files(folder_id)
         
-        return Response({
-            'success': True,
-            'count': len(images),
-            'folder_id': folder_id,
-            'images': serializer.data
-        }, status=status.HTTP_200_OK)
+        return Response(_folder_images_data(folder_id, images), status=status.HTTP_200_OK)
     
     except Exception as e:
         logger.error(f"Error fetching images from Google Drive folder {folder_id}: {str(e)}")
@@ -0,0 +1,287 @@
+"""
+Streaming ZIP writer for album downloads.
+
+Entries are written one after the other as their content is read, with
+the CRC and sizes in a data descriptor after each entry, so an archive of
+any size is produced with constant memory and its first bytes can be sent
+before the last file has been read. Already-compressed formats (JPEG,
+PNG, ...) are stored as-is, and ZIP64 records are written where sizes,
+offsets or the number of entries exceed the classic ZIP limits.
+"""
+
+import os
+import struct
+import time
+import zlib
+from typing import Callable, Iterable, Iterator, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Size of each read from the entry sources
+CHUNK_SIZE = 1024 * 1024
+
+# Formats that do not shrink further with deflate
+STORED_EXTENSIONS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.heic', '.heif',
+    '.mp4', '.mov', '.m4v', '.zip', '.gz', '.rar', '.7z',
+}
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+# Values that no longer fit the classic 32/16-bit fields
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP64_COUNT_LIMIT = 0xFFFF
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+
+# General purpose flags: sizes in data descriptor, UTF-8 names
+FLAGS = 0x08 | 0x800
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+# Made by UNIX, so the external attributes carry file permissions
+VERSION_MADE_BY = (3 << 8) | VERSION_ZIP64
+EXTERNAL_ATTRIBUTES = (0o100644 << 16)
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+DATA_DESCRIPTOR_ZIP64 = struct.Struct('<IIQQ')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+ZIP64_END = struct.Struct('<IQHHIIQQQQ')
+ZIP64_LOCATOR = struct.Struct('<IIQI')
+END = struct.Struct('<IHHHHIIH')
+
+
+class ZipEntry:
+    """A file of the archive and the values known once it has been written."""
+
+    def __init__(self, name: str, open_content: Callable[[], Iterable[bytes]], size: Optional[int],
+                 method: int, date_time: time.struct_time):
+        self.name = name
+        self.encoded_name = name.encode('utf-8')
+        self.open_content = open_content
+        self.size = size
+        self.method = method
+        self.dos_time, self.dos_date = _dos_date_time(date_time)
+        # Entries of unknown size may turn out to be large
+        self.zip64 = size is None or size >= ZIP64_LIMIT
+        self.crc = 0
+        self.compressed_size = 0
+        self.uncompressed_size = 0
+        self.offset = 0
+
+
+class ZipStream:
+    """
+    ZIP archive produced on the fly while it is iterated.
+
+    Usage:
+        archive = ZipStream()
+        archive.add_file('/path/to/photo.jpg', 'photo.jpg')
+        response = StreamingHttpResponse(archive, content_type='application/zip')
+        response['Content-Length'] = archive.content_length()
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.entries: List[ZipEntry] = []
+        self._names = set()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add_file(self, path: str, arcname: Optional[str] = None, compress: Optional[bool] = None):
+        """
+        Add a file from disk; it is only opened when the archive reaches it.
+
+        Args:
+            path: Path of the file
+            arcname: Name in the archive (defaults to the file name)
+            compress: Deflate the content (defaults to False for already-compressed formats)
+        """
+        stat = os.stat(path)
+
+        def open_content():
+            with open(path, 'rb') as source:
+                while True:
+                    chunk = source.read(self.chunk_size)
+                    if not chunk:
+                        return
+                    yield chunk
+
+        self.add_stream(arcname or os.path.basename(path), open_content, stat.st_size,
+                        compress=compress, date_time=time.localtime(stat.st_mtime))
+
+    def add_stream(self, arcname: str, open_content: Callable[[], Iterable[bytes]], size: Optional[int] = None,
+                   compress: Optional[bool] = None, date_time: Optional[time.struct_time] = None):
+        """
+        Add an entry whose content is produced by a callable.
+
+        Args:
+            arcname: Name in the archive; made unique if already taken
+            open_content: Called when the archive reaches the entry, returns an iterable of chunks
+            size: Size of the content in bytes, if known
+            compress: Deflate the content (defaults to False for already-compressed formats)
+            date_time: Modification time (defaults to now)
+        """
+        if compress is None:
+            compress = os.path.splitext(arcname)[1].lower() not in STORED_EXTENSIONS
+        self.entries.append(ZipEntry(
+            self._unique_name(arcname.lstrip('/')),
+            open_content,
+            size,
+            ZIP_DEFLATED if compress else ZIP_STORED,
+            date_time or time.localtime(),
+        ))
+
+    def _unique_name(self, name: str) -> str:
+        """Suffix duplicate names the way file managers do: photo.jpg, photo (1).jpg, ..."""
+        unique_name = name
+        stem, extension = os.path.splitext(name)
+        counter = 1
+        while unique_name in self._names:
+            unique_name = f"{stem} ({counter}){extension}"
+            counter += 1
+        self._names.add(unique_name)
+        return unique_name
+
+    def content_length(self) -> Optional[int]:
+        """
+        Get the exact size of the archive before it is written.
+
+        Returns:
+            Size in bytes, or None if it cannot be known in advance
+            (deflated entries or entries of unknown size)
+        """
+        if any(entry.method != ZIP_STORED or entry.size is None for entry in self.entries):
+            return None
+
+        offset = 0
+        central_directory_size = 0
+        for entry in self.entries:
+            local_header = len(_local_header(entry))
+            descriptor = DATA_DESCRIPTOR_ZIP64.size if entry.zip64 else DATA_DESCRIPTOR.size
+            central_directory_size += len(_central_header(entry, entry.size, entry.size, offset))
+            offset += local_header + entry.size + descriptor
+        return offset + central_directory_size + len(_end_records(len(self.entries), central_directory_size, offset))
+
+    def __iter__(self) -> Iterator[bytes]:
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            header = _local_header(entry)
+            yield header
+            offset += len(header)
+
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -15) if entry.method == ZIP_DEFLATED else None
+            crc = 0
+            compressed_size = 0
+            uncompressed_size = 0
+            for chunk in entry.open_content():
+                if not chunk:
+                    continue
+                crc = zlib.crc32(chunk, crc)
+                uncompressed_size += len(chunk)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                    if not chunk:
+                        continue
+                compressed_size += len(chunk)
+                yield chunk
+            if compressor:
+                chunk = compressor.flush()
+                compressed_size += len(chunk)
+                yield chunk
+
+            if entry.size is not None and uncompressed_size != entry.size:
+                logger.warning(f"{entry.name} changed while it was archived: "
+                               f"expected {entry.size} bytes, read {uncompressed_size}")
+            if not entry.zip64 and max(compressed_size, uncompressed_size) >= ZIP64_LIMIT:
+                raise ValueError(f"{entry.name} exceeds 4 GiB but was not announced as ZIP64")
+
+            entry.crc = crc
+            entry.compressed_size = compressed_size
+            entry.uncompressed_size = uncompressed_size
+            if entry.zip64:
+                descriptor = DATA_DESCRIPTOR_ZIP64.pack(0x08074b50, crc, compressed_size, uncompressed_size)
+            else:
+                descriptor = DATA_DESCRIPTOR.pack(0x08074b50, crc, compressed_size, uncompressed_size)
+            yield descriptor
+            offset += compressed_size + len(descriptor)
+
+        central_directory_offset = offset
+        central_directory = b''.join(
+            _central_header(entry, entry.compressed_size, entry.uncompressed_size, entry.offset)
+            for entry in self.entries
+        )
+        yield central_directory
+        yield _end_records(len(self.entries), len(central_directory), central_directory_offset)
+
+
+def _dos_date_time(date_time: time.struct_time):
+    """Convert a time to the MS-DOS (time, date) pair; DOS dates start in 1980."""
+    if date_time.tm_year < 1980:
+        return 0, (1 << 5) | 1
+    dos_time = (date_time.tm_hour << 11) | (date_time.tm_min << 5) | (date_time.tm_sec // 2)
+    dos_date = ((date_time.tm_year - 1980) << 9) | (date_time.tm_mon << 5) | date_time.tm_mday
+    return dos_time, dos_date
+
+
+def _local_header(entry: ZipEntry) -> bytes:
+    """Local file header; CRC and sizes follow the data in the data descriptor."""
+    if entry.zip64:
+        # Sizes are written in the ZIP64 extra field, zero until the descriptor
+        extra = struct.pack('<HHQQ', 0x0001, 16, 0, 0)
+        sizes = ZIP64_MARKER
+        version = VERSION_ZIP64
+    else:
+        extra = b''
+        sizes = 0
+        version = VERSION_DEFAULT
+    return LOCAL_HEADER.pack(
+        0x04034b50, version, FLAGS, entry.method, entry.dos_time, entry.dos_date,
+        0, sizes, sizes, len(entry.encoded_name), len(extra),
+    ) + entry.encoded_name + extra
+
+
+def _central_header(entry: ZipEntry, compressed_size: int, uncompressed_size: int, offset: int) -> bytes:
+    """Central directory header, with a ZIP64 extra field for every value that overflows."""
+    zip64_values = []
+    if uncompressed_size >= ZIP64_LIMIT:
+        zip64_values.append(uncompressed_size)
+        uncompressed_size = ZIP64_MARKER
+    if compressed_size >= ZIP64_LIMIT:
+        zip64_values.append(compressed_size)
+        compressed_size = ZIP64_MARKER
+    if offset >= ZIP64_LIMIT:
+        zip64_values.append(offset)
+        offset = ZIP64_MARKER
+
+    extra = b''
+    if zip64_values:
+        extra = struct.pack(f'<HH{len(zip64_values)}Q', 0x0001, 8 * len(zip64_values), *zip64_values)
+    version = VERSION_ZIP64 if entry.zip64 or zip64_values else VERSION_DEFAULT
+    return CENTRAL_HEADER.pack(
+        0x02014b50, VERSION_MADE_BY, version, FLAGS, entry.method, entry.dos_time, entry.dos_date,
+        entry.crc, compressed_size, uncompressed_size, len(entry.encoded_name), len(extra),
+        0, 0, 0, EXTERNAL_ATTRIBUTES, offset,
+    ) + entry.encoded_name + extra
+
+
+def _end_records(count: int, central_directory_size: int, central_directory_offset: int) -> bytes:
+    """End of central directory record, preceded by its ZIP64 variants when needed."""
+    records = b''
+    if (count >= ZIP64_COUNT_LIMIT or central_directory_size >= ZIP64_LIMIT
+            or central_directory_offset >= ZIP64_LIMIT):
+        zip64_end_offset = central_directory_offset + central_directory_size
+        records = ZIP64_END.pack(
+            0x06064b50, ZIP64_END.size - 12, VERSION_MADE_BY, VERSION_ZIP64, 0, 0,
+            count, count, central_directory_size, central_directory_offset,
+        ) + ZIP64_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1)
+        count = ZIP64_COUNT_MARKER
+        central_directory_size = min(central_directory_size, ZIP64_MARKER)
+        central_directory_offset = ZIP64_MARKER
+    return records + END.pack(
+        0x06054b50, 0, 0, count, count, central_directory_size, central_directory_offset, 0,
+    )
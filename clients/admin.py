@@ -1,14 +1,20 @@
 from django.contrib import admin
+from django.db.models import Count, Sum
+from django.template.defaultfilters import filesizeformat
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
-from django.urls import path
+from django.urls import path, reverse
 from django.shortcuts import redirect, get_object_or_404
 from django.contrib import messages
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
 from django.template.response import TemplateResponse
-import re
+import json
 import uuid
-from collections import defaultdict
-from .models import ClientAlbum, AlbumImage, GoogleDriveAlbum
+from backend.derivatives import get_derivative_url
+from .ingest import group_uploads_by_name, ingest_album_uploads, ingest_grouped_uploads
+from .models import ClientAlbum, AlbumImage, GoogleDriveAlbum, UploadBatch, UploadBatchFile
+from .uploads import UploadError, create_upload_batch, get_upload_status, start_upload_batch_completion, write_chunk
 
 
 class AlbumImageInline(admin.TabularInline):
@@ -24,7 +30,7 @@ class AlbumImageInline(admin.TabularInline):
         if obj and obj.pk and obj.image:
             return format_html(
                 '<img src="{}" style="width: 80px; height: 80px; object-fit: cover; border-radius: 4px;" />',
-                obj.image.url
+                obj.thumbnail_url
             )
         return mark_safe('<span style="color: #999;">No image</span>')
     thumbnail.short_description = "Preview"
@@ -38,7 +44,7 @@ class AlbumImageInline(admin.TabularInline):
 
 @admin.register(ClientAlbum)
 class ClientAlbumAdmin(admin.ModelAdmin):
-    list_display = ('title', 'pin', 'image_count', 'created_at', 'qr_code_display')
+    list_display = ('title', 'pin', 'image_count', 'total_size', 'created_at', 'qr_code_display')
     readonly_fields = ('pin', 'qr_code', 'qr_code_display', 'client_access_url')
     inlines = [AlbumImageInline]
     actions = ['regenerate_qr_codes', 'print_qr_codes']
@@ -63,17 +69,34 @@ class ClientAlbumAdmin(admin.ModelAdmin):
             path('print-qr-codes/<str:album_ids>/', self.admin_site.admin_view(self.view_qr_codes_html), name='clients_clientalbum_print_qr_pdf'),
             path('<uuid:album_id>/upload-multiple/', self.admin_site.admin_view(self.upload_multiple_images), name='clients_clientalbum_upload_multiple'),
             path('<uuid:album_id>/regenerate-qr/', self.admin_site.admin_view(self.regenerate_qr_code), name='clients_clientalbum_regenerate_qr'),
+            path('uploads/', self.admin_site.admin_view(self.upload_batch_create), name='clients_clientalbum_upload_batch_create'),
+            path('uploads/<uuid:batch_id>/', self.admin_site.admin_view(self.upload_batch_status), name='clients_clientalbum_upload_batch'),
+            path('uploads/<uuid:batch_id>/files/<int:file_id>/chunks/<int:index>/', self.admin_site.admin_view(self.upload_batch_chunk), name='clients_clientalbum_upload_chunk'),
+            path('uploads/<uuid:batch_id>/complete/', self.admin_site.admin_view(self.upload_batch_complete), name='clients_clientalbum_upload_batch_complete'),
         ]
         return custom_urls + urls
     
+    def get_queryset(self, request):
+        # Counted by the changelist query instead of once per row
+        return super().get_queryset(request).annotate(
+            image_total=Count('images'),
+            bytes_total=Sum('images__size'),
+        )
+    
     def image_count(self, obj):
-        return obj.images.count()
+        return obj.image_total
     image_count.short_description = 'Images'
+    image_count.admin_order_field = 'image_total'
+    
+    def total_size(self, obj):
+        return filesizeformat(obj.bytes_total or 0)
+    total_size.short_description = 'Size'
+    total_size.admin_order_field = 'bytes_total'
     
     def qr_code_display(self, obj):
         if obj.qr_code:
             return format_html(
-                '<img src="{}" style="max-width: 200px; max-height: 200px;" />',
+                '<img src="{}" loading="lazy" decoding="async" style="max-width: 200px; max-height: 200px;" />',
                 obj.qr_code.url
             )
         return "No QR code"
@@ -121,29 +144,6 @@ class ClientAlbumAdmin(admin.ModelAdmin):
         messages.success(request, f'QR code regenerated for "{album.title}".')
         return redirect('admin:clients_clientalbum_change', album_id)
     
-    def extract_base_name(self, filename):
-        """Extract base name from filename like 'andrew (1)' -> 'andrew'"""
-        # Remove file extension
-        name_without_ext = re.sub(r'\.[^.]+$', '', filename)
-        # Match pattern like "name (number)" or "name (x)"
-        match = re.match(r'^(.+?)\s*\([^)]+\)\s*$', name_without_ext, re.IGNORECASE)
-        if match:
-            return match.group(1).strip()
-        # If no pattern match, return the name without extension
-        return name_without_ext.strip()
-    
-    def get_unique_album_title(self, base_title):
-        """Get a unique album title, appending numbers if duplicate exists"""
-        if not ClientAlbum.objects.filter(title=base_title).exists():
-            return base_title
-        
-        counter = 2
-        while True:
-            new_title = f"{base_title} {counter}"
-            if not ClientAlbum.objects.filter(title=new_title).exists():
-                return new_title
-            counter += 1
-    
     def bulk_upload_with_auto_albums(self, request):
         """Bulk upload images and auto-create albums based on filenames"""
         if request.method == 'POST':
@@ -154,51 +154,10 @@ class ClientAlbumAdmin(admin.ModelAdmin):
                 messages.error(request, 'Please select at least one image to upload.')
                 return redirect('admin:clients_clientalbum_bulk_upload')
             
-            # Group files by base name
-            grouped_files = defaultdict(list)
-            for file in files:
-                base_name = self.extract_base_name(file.name)
-                # Capitalize first letter
-                base_name = base_name.capitalize() if base_name else "Untitled"
-                grouped_files[base_name].append(file)
-            
-            # Create albums and upload images
-            albums_created = []
-            total_images = 0
-            
-            for base_name, file_list in grouped_files.items():
-                # Build album title
-                if scoala:
-                    album_title = f"{base_name} ({scoala})"
-                else:
-                    album_title = base_name
-                
-                # Ensure unique title
-                album_title = self.get_unique_album_title(album_title)
-                
-                # Create or get album
-                album, created = ClientAlbum.objects.get_or_create(
-                    title=album_title,
-                    defaults={}
-                )
-                
-                if created:
-                    albums_created.append(album_title)
-                
-                # Upload images to album
-                for file in file_list:
-                    AlbumImage.objects.create(album=album, image=file)
-                    total_images += 1
-            
-            # Success message
-            if albums_created:
-                albums_msg = f"Created {len(albums_created)} new album(s): {', '.join(albums_created)}"
-            else:
-                albums_msg = "Images added to existing albums."
-            
-            messages.success(
-                request, 
-                f'Successfully uploaded {total_images} image(s). {albums_msg}'
+            # Group files by base name and create the albums in bulk
+            report = ingest_grouped_uploads(group_uploads_by_name(files, scoala))
+            self.message_bulk_upload(
+                request, report.images, [album.title for album in report.albums_created], report.format_timings()
             )
             return redirect('admin:clients_clientalbum_changelist')
         
@@ -261,13 +220,9 @@ class ClientAlbumAdmin(admin.ModelAdmin):
         
         if request.method == 'POST':
             files = request.FILES.getlist('images')
-            uploaded_count = 0
-            
-            for file in files:
-                AlbumImage.objects.create(album=album, image=file)
-                uploaded_count += 1
+            report = ingest_album_uploads(album, files)
             
-            messages.success(request, f'Successfully uploaded {uploaded_count} image(s) to "{album.title}".')
+            self.message_album_upload(request, album, report.images, report.format_timings())
             return redirect('admin:clients_clientalbum_change', album_id)
         
         # GET request - show upload form
@@ -279,6 +234,77 @@ class ClientAlbumAdmin(admin.ModelAdmin):
             'has_view_permission': self.has_view_permission(request, album),
         }
         return TemplateResponse(request, 'admin/clients/clientalbum/upload_multiple.html', context)
+    
+    def message_bulk_upload(self, request, images, albums_created, timings):
+        if albums_created:
+            albums_msg = f"Created {len(albums_created)} new album(s): {', '.join(albums_created)}"
+        else:
+            albums_msg = "Images added to existing albums."
+        
+        messages.success(request, f'Successfully uploaded {images} image(s). {albums_msg} ({timings})')
+    
+    def message_album_upload(self, request, album, images, timings):
+        messages.success(request, f'Successfully uploaded {images} image(s) to "{album.title}". ({timings})')
+    
+    def upload_batch_create(self, request):
+        """Start a chunked upload: register the files, to an album or for albums named after them"""
+        if request.method != 'POST':
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+        try:
+            data = json.loads(request.body)
+            album = None
+            if data.get('album'):
+                album = ClientAlbum.objects.filter(pk=data['album']).first()
+                if album is None:
+                    return JsonResponse({'error': 'Album not found'}, status=404)
+            batch = create_upload_batch(
+                data.get('files') or [], album=album, school=str(data.get('school') or '').strip()[:200]
+            )
+        except (ValueError, AttributeError, ValidationError) as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse(get_upload_status(batch), status=201)
+    
+    def upload_batch_status(self, request, batch_id):
+        """Files of a chunked upload and the chunks received so far, to resume it"""
+        batch = get_object_or_404(UploadBatch, pk=batch_id)
+        return JsonResponse(get_upload_status(batch))
+    
+    def upload_batch_chunk(self, request, batch_id, file_id, index):
+        """Store one chunk of a file, sent as the raw request body"""
+        if request.method != 'PUT':
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+        upload_file = get_object_or_404(UploadBatchFile.objects.select_related('batch'), pk=file_id, batch_id=batch_id)
+        try:
+            size = write_chunk(upload_file, index, request)
+        except UploadError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        return JsonResponse({'file': upload_file.id, 'index': index, 'size': size})
+    
+    def upload_batch_complete(self, request, batch_id):
+        """
+        Queue the ingest of a chunked upload once all its chunks arrived.
+        
+        Answers 202 while the upload is processed in the background (clients
+        poll upload_batch_status), then the result once it is completed.
+        """
+        if request.method != 'POST':
+            return JsonResponse({'error': 'Method not allowed'}, status=405)
+        batch = get_object_or_404(UploadBatch.objects.select_related('album'), pk=batch_id)
+        if batch.state != UploadBatch.COMPLETED:
+            try:
+                start_upload_batch_completion(batch)
+            except UploadError as e:
+                return JsonResponse({'error': str(e)}, status=400)
+            return JsonResponse(get_upload_status(batch), status=202)
+        
+        result = batch.result
+        if batch.album_id:
+            self.message_album_upload(request, batch.album, result['images'], result['timings'])
+            redirect_url = reverse('admin:clients_clientalbum_change', args=[batch.album_id])
+        else:
+            self.message_bulk_upload(request, result['images'], result['albums_created'], result['timings'])
+            redirect_url = reverse('admin:clients_clientalbum_changelist')
+        return JsonResponse({**result, 'redirect': redirect_url})
 
 
 @admin.register(AlbumImage)
@@ -292,8 +318,8 @@ class AlbumImageAdmin(admin.ModelAdmin):
     def thumbnail(self, obj):
         if obj.image:
             return format_html(
-                '<img src="{}" style="width: 50px; height: 50px; object-fit: cover;" />',
-                obj.image.url
+                '<img src="{}" loading="lazy" decoding="async" style="width: 50px; height: 50px; object-fit: cover;" />',
+                obj.thumbnail_url
             )
         return "No image"
     thumbnail.short_description = "Thumbnail"
@@ -306,7 +332,7 @@ class AlbumImageAdmin(admin.ModelAdmin):
         if obj.pk and obj.image:
             return format_html(
                 '<img src="{}" style="max-width: 500px; max-height: 500px; object-fit: contain;" />',
-                obj.image.url
+                get_derivative_url(obj.image, obj.derivatives, 'medium')
             )
         return "No image"
     image_preview.short_description = "Preview"
@@ -344,7 +370,7 @@ class GoogleDriveAlbumAdmin(admin.ModelAdmin):
             return "No QR code"
         if obj.qr_code:
             return format_html(
-                '<img src="{}" style="max-width: 200px; max-height: 200px;" />',
+                '<img src="{}" loading="lazy" decoding="async" style="max-width: 200px; max-height: 200px;" />',
                 obj.qr_code.url
             )
         return "No QR code"
@@ -0,0 +1,168 @@
+"""
+Prebuilt ZIP archives of client albums.
+
+Each archive is built once per version of the album content and stored
+under ALBUM_ARCHIVE_DIR/<album id>/<version>.zip, so repeat downloads
+only cost disk I/O. The version is a hash of the album images, so adding
+or removing an image makes the stored archive stale without any explicit
+bookkeeping; stale files are deleted as soon as the album changes.
+Archives are kept outside MEDIA_ROOT, which is served without a PIN check.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+from django.conf import settings
+from django.db import close_old_connections
+from backend.locks import single_flight
+from backend.zip_stream import ZipStream
+from .models import ClientAlbum
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Pending debounced builds: album id -> Timer
+_timers = {}
+_timers_lock = threading.Lock()
+
+
+def get_album_version(album: ClientAlbum) -> str:
+    """
+    Get the version of an album's content.
+
+    Args:
+        album: The client album
+
+    Returns:
+        Hex digest identifying the set of images in the album
+    """
+    digest = hashlib.sha1()
+    for image_id, image_name in album.images.order_by('id').values_list('id', 'image'):
+        digest.update(f"{image_id}:{image_name}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def get_archives_root() -> Path:
+    """Get the directory holding the archives of every album."""
+    return Path(getattr(settings, 'ALBUM_ARCHIVE_DIR', Path(settings.BASE_DIR) / 'tmp' / 'archives'))
+
+
+def get_archive_dir(album_id) -> Path:
+    """Get the directory holding the archives of an album."""
+    return get_archives_root() / str(album_id)
+
+
+def get_archive_path(album_id, version: str) -> Path:
+    """Get the path of the archive of an album version."""
+    return get_archive_dir(album_id) / f"{version}.zip"
+
+
+def build_album_archive(album: ClientAlbum) -> Optional[Path]:
+    """
+    Write the archive of the current version of an album, unless it exists.
+
+    Concurrent builds of the same album, in any worker process, are
+    serialized and all but the first find the finished archive.
+
+    Args:
+        album: The client album
+
+    Returns:
+        Path to the archive, or None if the album has no images on disk
+    """
+    version = get_album_version(album)
+    archive_path = get_archive_path(album.id, version)
+    if archive_path.exists():
+        return archive_path
+
+    lock_path = get_archives_root() / '.locks' / f"{album.id}.lock"
+    with single_flight(f"archive:{album.id}", lock_path):
+        if archive_path.exists():
+            return archive_path
+
+        archive = ZipStream()
+        for image in album.images.all():
+            if image.image and os.path.exists(image.image.path):
+                archive.add_file(image.image.path, image.filename)
+        if not len(archive):
+            return None
+
+        archive_path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=archive_path.parent, prefix='.', suffix='.zip.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as temp_file:
+                for chunk in archive:
+                    temp_file.write(chunk)
+            os.replace(temp_path, archive_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        # Older versions can no longer be served
+        invalidate_album_archives(album.id, keep=version)
+
+    logger.info(f"Built archive {version} of album {album.id} ({archive_path.stat().st_size} bytes)")
+    return archive_path
+
+
+def invalidate_album_archives(album_id, keep: Optional[str] = None):
+    """
+    Delete the stored archives of an album.
+
+    Args:
+        album_id: ID of the album
+        keep: Version whose archive is kept
+    """
+    archive_dir = get_archive_dir(album_id)
+    if not archive_dir.exists():
+        return
+    if keep is None:
+        shutil.rmtree(archive_dir, ignore_errors=True)
+        return
+    for path in archive_dir.glob('*.zip'):
+        if path.stem != keep:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _build_in_background(album_id):
+    with _timers_lock:
+        _timers.pop(album_id, None)
+    try:
+        album = ClientAlbum.objects.filter(pk=album_id).first()
+        if album:
+            build_album_archive(album)
+    except Exception as e:
+        logger.error(f"Error building archive of album {album_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def schedule_archive_build(album_id, delay: Optional[float] = None):
+    """
+    Build the archive of an album in a background thread after a quiet period.
+
+    Every call restarts the countdown, so uploading a batch of images
+    triggers a single build once the batch is complete.
+
+    Args:
+        album_id: ID of the album
+        delay: Seconds to wait (defaults to ALBUM_ARCHIVE_BUILD_DELAY)
+    """
+    if delay is None:
+        delay = getattr(settings, 'ALBUM_ARCHIVE_BUILD_DELAY', 30)
+
+    with _timers_lock:
+        timer = _timers.pop(album_id, None)
+        if timer:
+            timer.cancel()
+        timer = threading.Timer(delay, _build_in_background, args=(album_id,))
+        timer.daemon = True
+        _timers[album_id] = timer
+        timer.start()
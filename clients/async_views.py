@@ -0,0 +1,213 @@
+"""
+Async (ASGI) versions of the Google Drive views.
+
+Drive round trips are awaited on the event loop through the pooled
+AsyncGoogleDriveService instead of blocking a worker thread each, so one
+process can serve hundreds of concurrent Drive requests. Thumbnail
+rendering and mirror syncs still run in threads, as they are CPU or
+database bound.
+
+Enabled in backend/urls.py with GOOGLE_DRIVE_ASYNC_VIEWS; responses are
+the same as those of the sync views.
+"""
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+import httpx
+from rest_framework import status
+from backend.async_drive import AsyncGoogleDriveService, get_async_google_drive_service
+from backend.google_drive import cache_file_metadata
+from backend.thumbnail_utils import get_cached_thumbnail, get_or_create_thumbnail, get_thumbnail_sizes
+from backend.views import _folder_images_data
+from .drive_sync import get_album_images, get_album_images_page, is_mirror_fresh
+from .models import GoogleDriveAlbum
+from .views import (
+    _drive_album_data, _drive_album_request, _drive_file_preconditions, _drive_file_response,
+    _thumbnail_params, _thumbnail_response,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def aget_album_images(album: GoogleDriveAlbum, drive_service):
+    """
+    Get the images of an album from the local mirror.
+
+    A fresh mirror is read with the async ORM; a stale one is synced in a
+    thread by get_album_images, at most once per sync interval.
+    """
+    if is_mirror_fresh(album):
+        images = [drive_file.as_drive_image() async for drive_file in album.drive_files.all()]
+        cache_file_metadata(images)
+        return images
+    return await sync_to_async(get_album_images)(album, drive_service)
+
+
+async def aload_thumbnail_source(drive: AsyncGoogleDriveService, file_id: str, thumbnail_link=None):
+    """Async counterpart of get_thumbnail_source_loader: Drive's rendition first, then the original."""
+    source = None
+    if getattr(settings, 'THUMBNAIL_SOURCE', 'drive') == 'drive':
+        source = await drive.get_thumbnail(file_id, max(get_thumbnail_sizes()), thumbnail_link)
+    if source is None:
+        source = await drive.get_file_content(file_id)
+    return source
+
+
+async def _stream_drive_file(file_id, first_chunk, chunks):
+    """Yield the chunks of a Drive download, logging failures that happen mid-stream."""
+    yield first_chunk
+    try:
+        async for chunk in chunks:
+            yield chunk
+    except Exception as e:
+        # Headers are already sent, the client sees a truncated download
+        logger.error(f"Error streaming Google Drive image {file_id}: {str(e)}")
+
+
+@require_GET
+async def proxy_google_drive_image(request, file_id):
+    """
+    Async proxy endpoint serving Google Drive images, see clients.views.proxy_google_drive_image.
+    """
+    drive = get_async_google_drive_service()
+    if not drive:
+        return JsonResponse(
+            {'error': 'Google Drive service is not configured'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    thumbnail = _thumbnail_params(request)
+
+    try:
+        # If thumbnail requested, try to serve cached thumbnail first
+        if thumbnail:
+            thumbnail_size, thumbnail_format, thumbnail_mime_type = thumbnail
+            thumbnail_path = get_cached_thumbnail(file_id, thumbnail_size, thumbnail_format)
+            if thumbnail_path:
+                return await sync_to_async(_thumbnail_response, thread_sensitive=False)(
+                    request, thumbnail_path, thumbnail_mime_type
+                )
+
+        file_metadata = await drive.get_file_metadata(file_id)
+        if not file_metadata:
+            return JsonResponse({'error': 'File not found'}, status=status.HTTP_404_NOT_FOUND)
+
+        # Render the thumbnail in a thread; the source download inside the
+        # single-flight section still runs on the event loop
+        if thumbnail:
+            def load_source():
+                return async_to_sync(aload_thumbnail_source)(drive, file_id, file_metadata.get('thumbnailLink'))
+
+            thumbnail_path = await sync_to_async(get_or_create_thumbnail, thread_sensitive=False)(
+                file_id, load_source, size=thumbnail_size, fmt=thumbnail_format
+            )
+            if thumbnail_path and thumbnail_path.exists():
+                return await sync_to_async(_thumbnail_response, thread_sensitive=False)(
+                    request, thumbnail_path, thumbnail_mime_type
+                )
+            # Fall through to full image if thumbnail generation fails
+
+        early_response, headers, size, byte_range = _drive_file_preconditions(request, file_metadata)
+        if early_response:
+            return early_response
+
+        # Start the download and read its first chunk before answering, so
+        # Drive errors still produce a proper error response
+        try:
+            if byte_range:
+                drive_response = await drive.open_file_content(file_id, start=byte_range[0], end=byte_range[1])
+            else:
+                drive_response = await drive.open_file_content(file_id)
+            chunks = drive.iter_response_content(drive_response)
+            first_chunk = await anext(chunks, b'')
+        except httpx.HTTPError as e:
+            logger.error(f"Error getting file content {file_id}: {str(e)}")
+            return JsonResponse(
+                {'error': 'Failed to retrieve file content'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        return _drive_file_response(
+            file_metadata, _stream_drive_file(file_id, first_chunk, chunks), headers, size, byte_range
+        )
+
+    except Exception as e:
+        logger.error(f"Error proxying Google Drive image {file_id}: {str(e)}")
+        return JsonResponse(
+            {'error': f'Failed to retrieve image: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@require_GET
+async def drive_album_detail(request, pk):
+    """Async version of GoogleDriveAlbumViewSet.retrieve."""
+    try:
+        instance = await GoogleDriveAlbum.objects.aget(pk=pk)
+    except (GoogleDriveAlbum.DoesNotExist, ValidationError):
+        return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    drive = get_async_google_drive_service()
+    page_params, error = _drive_album_request(instance, request.GET, drive is not None)
+    if error:
+        body, error_status = error
+        return JsonResponse(body, status=error_status)
+
+    try:
+        # Serve images from the local mirror, pulling only Drive deltas
+        drive_service = drive.drive_service if drive else None
+        if page_params:
+            page_size, after, page = page_params
+            images, count, next_cursor = await sync_to_async(get_album_images_page)(
+                instance, drive_service, page_size, after=after, page=page
+            )
+            return JsonResponse(_drive_album_data(request, instance, images, page_params, count, next_cursor))
+
+        images = await aget_album_images(instance, drive_service)
+        return JsonResponse(_drive_album_data(request, instance, images, page_params))
+
+    except Exception as e:
+        logger.error(f"Error fetching images from Google Drive for album {instance.id}: {str(e)}")
+        return JsonResponse(
+            {'error': f'Failed to fetch images from Google Drive: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@require_GET
+async def list_google_drive_images(request):
+    """Async version of backend.views.list_google_drive_images."""
+    folder_id = request.GET.get('folder_id')
+    if not folder_id:
+        return JsonResponse(
+            {'error': 'folder_id query parameter is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    drive = get_async_google_drive_service()
+    if not drive:
+        return JsonResponse(
+            {'error': 'Google Drive service is not configured. Please check your environment variables.'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+
+    try:
+        # Serve folders that belong to an album from its local mirror
+        album = await GoogleDriveAlbum.objects.filter(folder_id=folder_id).order_by('created_at').afirst()
+        if album:
+            images = await aget_album_images(album, drive.drive_service)
+        else:
+            images = await drive.get_image_files(folder_id)
+
+        return JsonResponse(_folder_images_data(folder_id, images), status=status.HTTP_200_OK)
+
+    except Exception as e:
+        logger.error(f"Error fetching images from Google Drive folder {folder_id}: {str(e)}")
+        return JsonResponse(
+            {'error': f'Failed to fetch images: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
@@ -0,0 +1,159 @@
+"""
+ZIP downloads of Google Drive albums.
+
+Originals are downloaded by a bounded pool of threads a few images ahead
+of the one being written, so the archive is fed as fast as the client
+reads it instead of waiting one Drive round trip per image. Entries are
+always written in album order, whatever order the downloads finish in.
+"""
+
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, IO, Iterator, List, Optional, Tuple
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from googleapiclient.errors import HttpError
+from backend.google_drive import GoogleDriveService
+from backend.zip_stream import CHUNK_SIZE, ZipStream
+from .drive_sync import get_album_images
+from .models import GoogleDriveAlbum
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Downloads are kept in memory up to this size, then spill to a temporary file
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+# Attempts per original before the download is aborted
+DOWNLOAD_ATTEMPTS = 3
+
+
+class OrderedPrefetcher:
+    """
+    Run fetch over items with a thread pool, handing out results in item order.
+
+    At most `ahead` items are downloaded or waiting to be consumed at any
+    time, which bounds the memory and disk used by the buffers.
+    """
+
+    def __init__(self, items: List, fetch: Callable, workers: int, ahead: Optional[int] = None):
+        self.items = items
+        self.fetch = fetch
+        self.ahead = ahead or workers
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._futures = {}
+        self._submitted = 0
+
+    def get(self, index: int):
+        """Wait for the result of items[index], scheduling the next ones."""
+        while self._submitted < len(self.items) and self._submitted < index + self.ahead:
+            self._futures[self._submitted] = self._pool.submit(self.fetch, self.items[self._submitted])
+            self._submitted += 1
+        return self._futures.pop(index).result()
+
+    def close(self):
+        """
+        Cancel pending downloads without waiting for the ones in flight.
+
+        Buffers of unconsumed results are released as soon as their
+        download finishes, so a disconnecting client frees the worker at once.
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        for future in self._futures.values():
+            future.add_done_callback(_release_result)
+        self._futures.clear()
+
+
+def _release_result(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def download_to_buffer(drive_service: GoogleDriveService, file_id: str) -> IO[bytes]:
+    """
+    Download a Drive file into a spooled temporary file, retrying transient failures.
+
+    Returns:
+        Buffer positioned at the start of the content; the caller closes it
+    """
+    for attempt in range(1, DOWNLOAD_ATTEMPTS + 1):
+        buffer = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        try:
+            for chunk in drive_service.iter_file_content(file_id):
+                buffer.write(chunk)
+            buffer.seek(0)
+            return buffer
+        except (HttpError, OSError) as e:
+            buffer.close()
+            if attempt == DOWNLOAD_ATTEMPTS:
+                raise
+            logger.warning(f"Retrying download of {file_id} after error: {str(e)}")
+            time.sleep(attempt)
+
+
+def build_drive_album_archive(
+    album: GoogleDriveAlbum,
+    drive_service: GoogleDriveService,
+    workers: Optional[int] = None,
+) -> Tuple[ZipStream, OrderedPrefetcher]:
+    """
+    Prepare the ZIP archive of a Drive album.
+
+    The file list and sizes come from the album's local mirror, so when
+    every image is an already-compressed format the archive size is known
+    before the first download starts.
+
+    Args:
+        album: The Drive album
+        drive_service: Service used to download the originals
+        workers: Concurrent downloads (defaults to GOOGLE_DRIVE_DOWNLOAD_WORKERS)
+
+    Returns:
+        The archive and the prefetcher feeding it, to pass to iter_drive_album_archive
+    """
+    workers = workers or getattr(settings, 'GOOGLE_DRIVE_DOWNLOAD_WORKERS', 4)
+    images = get_album_images(album, drive_service)
+    prefetcher = OrderedPrefetcher(
+        [image['id'] for image in images],
+        lambda file_id: download_to_buffer(drive_service, file_id),
+        workers,
+    )
+
+    archive = ZipStream()
+    for index, image in enumerate(images):
+        name = image.get('name') or image['id']
+        archive.add_stream(
+            # Keep the album's subfolders in the archive
+            f"{image['folderPath']}/{name}" if image.get('folderPath') else name,
+            lambda index=index: _read_buffer(prefetcher.get(index)),
+            size=int(image['size']) if image.get('size') else None,
+            date_time=_drive_time(image.get('modifiedTime')),
+        )
+    return archive, prefetcher
+
+
+def iter_drive_album_archive(archive: ZipStream, prefetcher: OrderedPrefetcher) -> Iterator[bytes]:
+    """Yield the archive bytes, stopping the downloads if the client goes away."""
+    try:
+        yield from archive
+    except Exception as e:
+        # Headers are already sent, the client sees a truncated download
+        logger.error(f"Error streaming Google Drive album archive: {str(e)}")
+    finally:
+        prefetcher.close()
+
+
+def _read_buffer(buffer: IO[bytes]) -> Iterator[bytes]:
+    with buffer:
+        while True:
+            chunk = buffer.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _drive_time(value: Optional[str]) -> Optional[time.struct_time]:
+    """Convert a Drive RFC 3339 timestamp to the local time stored in ZIP entries."""
+    modified_time = parse_datetime(value) if value else None
+    return modified_time.astimezone().timetuple() if modified_time else None
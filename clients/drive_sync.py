@@ -0,0 +1,281 @@
+"""
+Local mirror of Google Drive album folders.
+
+Album views are served from the DriveFile table instead of walking the
+Drive folder on every request. The mirror is filled by a full listing of
+the folder tree the first time and then kept up to date by pulling only
+the deltas from the Drive changes feed.
+"""
+
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from googleapiclient.errors import HttpError
+from backend.google_drive import FOLDER_MIME_TYPE, IMAGE_MIME_TYPES, GoogleDriveService, cache_file_metadata
+from .models import DriveFile, GoogleDriveAlbum
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Mirror fields refreshed when Drive reports a change to a known file
+UPDATE_FIELDS = [
+    'name', 'mime_type', 'size', 'created_time', 'modified_time',
+    'md5_checksum', 'web_content_link', 'thumbnail_link', 'parent_id', 'folder_path',
+]
+
+# Statuses of changes.list for a page token Drive no longer accepts
+INVALID_PAGE_TOKEN_STATUSES = (400, 404, 410)
+
+
+def get_sync_interval() -> timedelta:
+    """Minimum time between two Drive syncs of the same album."""
+    return timedelta(seconds=getattr(settings, 'GOOGLE_DRIVE_SYNC_INTERVAL', 60))
+
+
+def is_mirror_fresh(album: GoogleDriveAlbum) -> bool:
+    """Whether the album mirror was synced recently enough to skip Drive."""
+    return bool(album.synced_at) and timezone.now() - album.synced_at < get_sync_interval()
+
+
+def _upsert_files(album: GoogleDriveAlbum, files: List[Dict]):
+    """Insert new mirror rows and update the ones that already exist."""
+    if not files:
+        return
+
+    rows = [DriveFile.from_drive(album, data) for data in files]
+    DriveFile.objects.bulk_create(
+        rows,
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['album', 'file_id'],
+        update_fields=UPDATE_FIELDS,
+    )
+
+
+def _mark_synced(album: GoogleDriveAlbum, changes_page_token: str, drive_folders: Optional[Dict[str, str]] = None):
+    """Store the new mirror position without going through GoogleDriveAlbum.save."""
+    album.changes_page_token = changes_page_token
+    album.synced_at = timezone.now()
+    if drive_folders is not None:
+        album.drive_folders = drive_folders
+    GoogleDriveAlbum.objects.filter(pk=album.pk).update(
+        changes_page_token=album.changes_page_token,
+        synced_at=album.synced_at,
+        drive_folders=album.drive_folders,
+    )
+
+
+def full_sync(album: GoogleDriveAlbum, drive_service: GoogleDriveService):
+    """Rebuild the album mirror from a complete listing of the Drive folder and its subfolders."""
+    # Take the changes token before listing so nothing that changes
+    # during the walk is missed by the next incremental sync
+    start_page_token = drive_service.get_start_page_token()
+    if getattr(settings, 'GOOGLE_DRIVE_RECURSIVE_ALBUMS', True):
+        files, drive_folders = drive_service.walk_folder(album.folder_id)
+    else:
+        files = drive_service.get_image_files(album.folder_id)
+        drive_folders = {album.folder_id: ''}
+
+    with transaction.atomic():
+        album.drive_files.exclude(file_id__in=[data['id'] for data in files]).delete()
+        _upsert_files(album, files)
+        _mark_synced(album, start_page_token or '', drive_folders)
+
+    logger.info(f"Full Drive sync of album {album.id}: {len(files)} image(s) in {len(drive_folders)} folder(s)")
+
+
+def _affects_folder_tree(album: GoogleDriveAlbum, drive_folders: Dict[str, str], change: Dict) -> bool:
+    """Whether a change adds, moves, renames or removes a folder of the album tree."""
+    file_id = change.get('fileId')
+    data = change.get('file') or {}
+    if file_id == album.folder_id:
+        return False
+    if file_id in drive_folders:
+        return True
+    return (
+        data.get('mimeType') == FOLDER_MIME_TYPE
+        and any(parent in drive_folders for parent in data.get('parents', []))
+    )
+
+
+def incremental_sync(album: GoogleDriveAlbum, drive_service: GoogleDriveService):
+    """Apply the Drive changes recorded since the last sync to the album mirror."""
+    changes, new_start_page_token = drive_service.list_changes(album.changes_page_token)
+    drive_folders = album.drive_folders or {album.folder_id: ''}
+
+    if getattr(settings, 'GOOGLE_DRIVE_RECURSIVE_ALBUMS', True) and any(
+        _affects_folder_tree(album, drive_folders, change) for change in changes
+    ):
+        # Whole subtrees may have appeared or disappeared, walk the tree again
+        logger.info(f"Folder tree of album {album.id} changed, resyncing it")
+        full_sync(album, drive_service)
+        return
+
+    updated = {}
+    removed = set()
+    for change in changes:
+        file_id = change.get('fileId')
+        data = change.get('file') or {}
+        parent_id = next((parent for parent in data.get('parents', []) if parent in drive_folders), None)
+        in_album = (
+            not change.get('removed')
+            and not data.get('trashed')
+            and parent_id is not None
+            and data.get('mimeType') in IMAGE_MIME_TYPES
+        )
+        # Later changes of the same file win
+        if in_album:
+            updated[file_id] = {**data, 'parentId': parent_id, 'folderPath': drive_folders[parent_id]}
+            removed.discard(file_id)
+        else:
+            removed.add(file_id)
+            updated.pop(file_id, None)
+
+    with transaction.atomic():
+        if removed:
+            album.drive_files.filter(file_id__in=removed).delete()
+        _upsert_files(album, list(updated.values()))
+        _mark_synced(album, new_start_page_token or album.changes_page_token)
+
+    logger.info(
+        f"Incremental Drive sync of album {album.id}: "
+        f"{len(updated)} updated, {len(removed)} removed"
+    )
+
+
+def sync_album(album: GoogleDriveAlbum, drive_service: Optional[GoogleDriveService], force: bool = False):
+    """
+    Bring the local mirror of an album up to date with Drive.
+
+    Args:
+        album: The album whose folder is mirrored
+        drive_service: Drive service to pull from (None serves the mirror as is)
+        force: Sync even if the mirror was synced within the sync interval
+    """
+    if not drive_service or (not force and is_mirror_fresh(album)):
+        return
+
+    # Mirrors synced before subfolders were tracked are walked again once
+    recursive = getattr(settings, 'GOOGLE_DRIVE_RECURSIVE_ALBUMS', True)
+    try:
+        if album.changes_page_token and album.synced_at and (album.drive_folders or not recursive):
+            try:
+                incremental_sync(album, drive_service)
+            except HttpError as error:
+                if error.resp.status not in INVALID_PAGE_TOKEN_STATUSES:
+                    raise
+                # Expired or invalid changes token: drop it and start over from a full listing
+                logger.warning(f"Drive changes token of album {album.id} rejected, resyncing it: {str(error)}")
+                album.changes_page_token = ''
+                GoogleDriveAlbum.objects.filter(pk=album.pk).update(changes_page_token='')
+                full_sync(album, drive_service)
+        else:
+            full_sync(album, drive_service)
+    except HttpError as error:
+        if not album.synced_at:
+            raise
+        # Drive is unavailable (e.g. a 5xx), the last mirror is better than an error
+        logger.error(f"Drive sync of album {album.id} failed, serving the existing mirror: {str(error)}")
+
+
+def get_album_images(album: GoogleDriveAlbum, drive_service: Optional[GoogleDriveService]) -> List[Dict]:
+    """
+    Get the images of an album from the local mirror, syncing it first if stale.
+
+    Returns:
+        List of image dictionaries in the GoogleDriveService.get_image_files shape
+
+    Raises:
+        ValueError: If the album has never been synced and Drive is not configured
+    """
+    if not drive_service and not album.synced_at:
+        raise ValueError("Google Drive service is not configured")
+
+    sync_album(album, drive_service)
+    images = [drive_file.as_drive_image() for drive_file in album.drive_files.all()]
+    # The images about to be displayed are the ones the proxy will be asked for
+    cache_file_metadata(images)
+    return images
+
+
+def encode_cursor(drive_file: DriveFile) -> str:
+    """Encode the position of a mirror row as an opaque pagination cursor."""
+    position = json.dumps([drive_file.folder_path, drive_file.name, drive_file.file_id])
+    return urlsafe_b64encode(position.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str, str]:
+    """
+    Decode a cursor made by encode_cursor.
+
+    Returns:
+        The (folder_path, name, file_id) position the cursor points after
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        position = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('utf-8'))
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(position, list) or len(position) != 3 or not all(isinstance(value, str) for value in position):
+        raise ValueError("Invalid cursor")
+    return tuple(position)
+
+
+def get_album_images_page(
+    album: GoogleDriveAlbum,
+    drive_service: Optional[GoogleDriveService],
+    page_size: int,
+    after: Optional[Tuple[str, str, str]] = None,
+    page: Optional[int] = None,
+) -> Tuple[List[Dict], int, Optional[str]]:
+    """
+    Get one page of the images of an album from the local mirror, syncing it first if stale.
+
+    Pages follow the mirror order (folder path, name, file ID). Cursors
+    seek directly to their position on the listing index, so deep pages
+    cost the same as the first one; page numbers use an offset.
+
+    Args:
+        album: The Drive album
+        drive_service: Drive service to sync from (None serves the mirror as is)
+        page_size: Number of images per page
+        after: Position decoded from a cursor; the page starts after it
+        page: 1-based page number, used when no cursor is given
+
+    Returns:
+        Tuple of (images of the page, total number of images, cursor of the next page or None)
+
+    Raises:
+        ValueError: If the album has never been synced and Drive is not configured
+    """
+    if not drive_service and not album.synced_at:
+        raise ValueError("Google Drive service is not configured")
+
+    sync_album(album, drive_service)
+    drive_files = album.drive_files.all()
+    count = drive_files.count()
+
+    if after:
+        folder_path, name, file_id = after
+        drive_files = drive_files.filter(
+            Q(folder_path__gt=folder_path)
+            | Q(folder_path=folder_path, name__gt=name)
+            | Q(folder_path=folder_path, name=name, file_id__gt=file_id)
+        )
+    elif page and page > 1:
+        drive_files = drive_files[(page - 1) * page_size:]
+
+    # One extra row tells whether there is a next page
+    rows = list(drive_files[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    images = [drive_file.as_drive_image() for drive_file in rows[:page_size]]
+    cache_file_metadata(images)
+    return images, count, next_cursor
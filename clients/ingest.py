@@ -0,0 +1,250 @@
+"""
+Bulk ingest of uploaded images into client albums.
+
+The admin bulk upload used to create albums and images one at a time,
+with a title probe per counter step and a synchronous storage write and
+INSERT per file. Here titles are resolved with a few indexed lookups, image files and
+QR codes are written by a thread pool, and rows are inserted with
+bulk_create, so the database work of a 500-image upload is a handful of
+queries. The time spent in each phase is reported back to the admin.
+"""
+
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from backend.derivatives import schedule_derivatives
+from .archives import invalidate_album_archives, schedule_archive_build
+from .models import AlbumImage, ClientAlbum
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Numbered titles probed per base title by the first title lookup, doubled by every further one
+TITLE_PROBE_WINDOW = 4
+# Most titles looked up by one query, below the parameter limit of every backend
+TITLE_LOOKUP_BATCH = 500
+
+
+class IngestReport:
+    """Outcome of an ingest: created albums, stored images and per-phase timings."""
+
+    def __init__(self):
+        self.albums_created: List[ClientAlbum] = []
+        self.images = 0
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time the enclosed block under the given phase name."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.monotonic() - started
+
+    def format_timings(self) -> str:
+        return ', '.join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
+
+
+def resolve_unique_titles(base_titles: Iterable[str]) -> Dict[str, str]:
+    """
+    Pick an unused album title for every base title with a few indexed lookups.
+
+    Titles follow the numbering of the original admin: "Ana", then
+    "Ana 2", "Ana 3", ... Titles handed out in the same call are never reused.
+    The candidates are looked up by exact title (served by the title
+    index), a window of numbers per base title at a time, so a base title
+    with few albums costs a single query for the whole upload.
+
+    Args:
+        base_titles: Wanted titles
+
+    Returns:
+        Dictionary of base title -> title to create the album with
+    """
+    base_titles = list(dict.fromkeys(base_titles))
+
+    def candidate(base_title, counter):
+        return base_title if counter == 1 else f"{base_title} {counter}"
+
+    taken = set()
+    titles = {}
+    # Next counter to try, and the first counter not looked up yet
+    counters = dict.fromkeys(base_titles, 1)
+    probed = dict.fromkeys(base_titles, 1)
+    window = TITLE_PROBE_WINDOW
+    while len(titles) < len(base_titles):
+        unresolved = [base_title for base_title in base_titles if base_title not in titles]
+        lookups = [
+            candidate(base_title, counter)
+            for base_title in unresolved
+            for counter in range(probed[base_title], probed[base_title] + window)
+        ]
+        for start in range(0, len(lookups), TITLE_LOOKUP_BATCH):
+            taken.update(
+                ClientAlbum.objects.filter(title__in=lookups[start:start + TITLE_LOOKUP_BATCH])
+                .values_list('title', flat=True)
+            )
+        for base_title in unresolved:
+            probed[base_title] += window
+        window *= 2
+
+        # Hand titles out in order, stopping at the first base title whose window is exhausted
+        for base_title in unresolved:
+            counter = counters[base_title]
+            while counter < probed[base_title] and candidate(base_title, counter) in taken:
+                counter += 1
+            counters[base_title] = counter
+            if counter >= probed[base_title]:
+                break
+            titles[base_title] = candidate(base_title, counter)
+            taken.add(titles[base_title])
+    return titles
+
+
+def extract_base_name(filename: str) -> str:
+    """Extract base name from filename like 'andrew (1)' -> 'andrew'"""
+    # Remove file extension
+    name_without_ext = re.sub(r'\.[^.]+$', '', filename)
+    # Match pattern like "name (number)" or "name (x)"
+    match = re.match(r'^(.+?)\s*\([^)]+\)\s*$', name_without_ext, re.IGNORECASE)
+    if match:
+        return match.group(1).strip()
+    # If no pattern match, return the name without extension
+    return name_without_ext.strip()
+
+
+def group_uploads_by_name(files: Iterable[File], school: str = '') -> Dict[str, List[File]]:
+    """
+    Group uploaded files into albums by file name: "andrew (1).jpg" and
+    "andrew (2).jpg" go to "Andrew", or "Andrew (<school>)" if a school is given.
+
+    Returns:
+        Dictionary of wanted album title -> files, as taken by ingest_grouped_uploads
+    """
+    groups = defaultdict(list)
+    for upload in files:
+        base_name = extract_base_name(upload.name)
+        # Capitalize first letter
+        base_name = base_name.capitalize() if base_name else "Untitled"
+        groups[f"{base_name} ({school})" if school else base_name].append(upload)
+    return dict(groups)
+
+
+def _store_image(image: AlbumImage, upload: File) -> AlbumImage:
+    """Write an uploaded file to storage the way AlbumImage.save would, without saving the row."""
+    field = image.image.field
+    name = field.generate_filename(image, upload.name)
+    image.image.name = field.storage.save(name, upload, max_length=field.max_length)
+    image.size = upload.size
+    return image
+
+
+def _generate_qr_code(album: ClientAlbum) -> ClientAlbum:
+    album.generate_qr_code()
+    return album
+
+
+def _run_pool(function, items: List, workers: int) -> List:
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(function, items))
+
+
+def _delete_stored_files(albums: List[ClientAlbum], images: List[AlbumImage]):
+    """Remove the files written for an ingest whose rows could not be inserted."""
+    for album in albums:
+        if album.qr_code:
+            album.qr_code.delete(save=False)
+    for image in images:
+        if image.image.name:
+            image.image.delete(save=False)
+
+
+def _ingest(
+    report: IngestReport,
+    new_albums: List[ClientAlbum],
+    uploads: List[Tuple[ClientAlbum, File]],
+    workers: Optional[int],
+) -> IngestReport:
+    workers = workers or getattr(settings, 'ALBUM_UPLOAD_WORKERS', 8)
+    images = [AlbumImage(album=album) for album, _ in uploads]
+
+    try:
+        with report.phase('files'):
+            _run_pool(_generate_qr_code, new_albums, workers)
+            _run_pool(lambda pair: _store_image(*pair), [(image, upload) for image, (_, upload) in zip(images, uploads)], workers)
+
+        with report.phase('database'), transaction.atomic():
+            ClientAlbum.objects.bulk_create(new_albums, batch_size=500)
+            AlbumImage.objects.bulk_create(images, batch_size=500)
+            schedule_derivatives(AlbumImage, [image.pk for image in images])
+    except BaseException:
+        _delete_stored_files(new_albums, images)
+        raise
+
+    # bulk_create sends no post_save, so refresh the album archives here
+    album_ids = {album.id for album, _ in uploads}
+
+    def refresh_archives():
+        for album_id in album_ids:
+            invalidate_album_archives(album_id)
+            if getattr(settings, 'ALBUM_ARCHIVE_PREBUILD', True):
+                schedule_archive_build(album_id)
+
+    transaction.on_commit(refresh_archives)
+
+    report.albums_created = new_albums
+    report.images = len(images)
+    logger.info(
+        f"Ingested {report.images} image(s) into {len(album_ids)} album(s), "
+        f"{len(new_albums)} new: {report.format_timings()}"
+    )
+    return report
+
+
+def ingest_grouped_uploads(groups: Dict[str, List[File]], workers: Optional[int] = None) -> IngestReport:
+    """
+    Create one new album per group of uploaded files.
+
+    Args:
+        groups: Wanted album title -> files to put in it; titles already
+                in use get a numeric suffix
+        workers: Concurrent storage writes (defaults to ALBUM_UPLOAD_WORKERS)
+
+    Returns:
+        IngestReport of the created albums and images
+    """
+    report = IngestReport()
+    with report.phase('titles'):
+        titles = resolve_unique_titles(groups)
+
+    new_albums = []
+    uploads = []
+    for base_title, files in groups.items():
+        album = ClientAlbum(title=titles[base_title])
+        new_albums.append(album)
+        uploads.extend((album, upload) for upload in files)
+    return _ingest(report, new_albums, uploads, workers)
+
+
+def ingest_album_uploads(album: ClientAlbum, files: List[File], workers: Optional[int] = None) -> IngestReport:
+    """
+    Add uploaded files to an existing album.
+
+    Args:
+        album: The client album
+        files: Uploaded image files
+        workers: Concurrent storage writes (defaults to ALBUM_UPLOAD_WORKERS)
+
+    Returns:
+        IngestReport of the created images
+    """
+    return _ingest(IngestReport(), [], [(album, upload) for upload in files], workers)
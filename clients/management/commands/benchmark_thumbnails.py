@@ -0,0 +1,125 @@
+import multiprocessing
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from backend.thumbnail_utils import get_thumbnail_sizes, prepare_image, render_variants
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.gif', '.bmp'}
+
+
+def full_decode_pipeline(content, sizes):
+    """The previous pipeline: full-resolution decode, then LANCZOS thumbnails."""
+    image = Image.open(BytesIO(content))
+    image = image.convert('RGB')
+    for size in sorted(sizes, reverse=True):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        image.save(BytesIO(), 'JPEG', quality=85, optimize=True)
+
+
+def fast_pipeline(content, sizes):
+    """The draft/reduce pipeline used by generate_thumbnails."""
+    image = prepare_image(content, max(sizes))
+    for _, variant in render_variants(image, sizes):
+        variant.save(BytesIO(), 'JPEG', quality=85, optimize=True)
+
+
+def _max_rss() -> int:
+    """Peak resident set size of this process in bytes."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return usage if sys.platform == 'darwin' else usage * 1024
+
+
+def _peak_memory_growth(pipeline, content, sizes) -> int:
+    before = _max_rss()
+    pipeline(content, sizes)
+    return _max_rss() - before
+
+
+def measure_peak_memory(pipeline, content, sizes) -> float:
+    """
+    Measure the peak memory of one pipeline run, in MB.
+
+    Pillow allocates bitmaps outside the Python allocator, so the run
+    happens in a fresh forked process and the growth of its peak resident
+    set size is reported.
+    """
+    context = multiprocessing.get_context('fork')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(_peak_memory_growth, pipeline, content, sizes).result() / (1024 * 1024)
+
+
+class Command(BaseCommand):
+    help = 'Compare the fast thumbnail pipeline with a full-resolution decode on a corpus of images'
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus', nargs='?', help='Directory of sample images')
+        parser.add_argument('--generate', type=int, default=0,
+                            help='Benchmark on N synthetic 24 MP JPEGs instead of a corpus')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per image and pipeline')
+        parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                            help='Variant sizes to render (defaults to THUMBNAIL_SIZES)')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            if options['generate']:
+                corpus = Path(temp_dir)
+                self.stdout.write(f'Generating {options["generate"]} synthetic 6000x4000 JPEGs...')
+                gradient = Image.linear_gradient('L').resize((6000, 4000))
+                for index in range(options['generate']):
+                    # Smooth gradients with sensor-like noise compress like real photos
+                    noise = Image.effect_noise((6000, 4000), 16 + 4 * index)
+                    Image.merge('RGB', (
+                        Image.blend(gradient, noise, 0.3),
+                        gradient.rotate(180),
+                        Image.blend(gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), noise, 0.2),
+                    )).save(corpus / f'synthetic_{index}.jpg', 'JPEG', quality=90)
+            elif options['corpus']:
+                corpus = Path(options['corpus'])
+            else:
+                raise CommandError('Pass a corpus directory or --generate N')
+
+            files = sorted(path for path in corpus.iterdir() if path.suffix.lower() in IMAGE_EXTENSIONS)
+            if not files:
+                raise CommandError(f'No images found in {corpus}')
+            self.run_benchmark(files, options['sizes'] or get_thumbnail_sizes(), options['repeat'])
+
+    def run_benchmark(self, files, sizes, repeat):
+        self.stdout.write(f'Rendering variants {sizes} for {len(files)} image(s), best of {repeat} run(s)\n')
+        self.stdout.write(f'{"image":<32} {"full ms":>9} {"fast ms":>9} {"full MB":>9} {"fast MB":>9} {"speedup":>8}')
+
+        totals = {'full': [], 'fast': [], 'full_mb': [], 'fast_mb': []}
+        for path in files:
+            content = path.read_bytes()
+            row = {}
+            for name, pipeline in (('full', full_decode_pipeline), ('fast', fast_pipeline)):
+                timings = []
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    pipeline(content, sizes)
+                    timings.append((time.perf_counter() - started) * 1000)
+                row[name] = min(timings)
+                row[f'{name}_mb'] = measure_peak_memory(pipeline, content, sizes)
+                totals[name].append(row[name])
+                totals[f'{name}_mb'].append(row[f'{name}_mb'])
+
+            self.stdout.write(
+                f'{path.name[:32]:<32} {row["full"]:>9.1f} {row["fast"]:>9.1f} '
+                f'{row["full_mb"]:>9.1f} {row["fast_mb"]:>9.1f} {row["full"] / row["fast"]:>7.1f}x'
+            )
+
+        full_ms = statistics.mean(totals['full'])
+        fast_ms = statistics.mean(totals['fast'])
+        full_mb = statistics.mean(totals['full_mb'])
+        fast_mb = statistics.mean(totals['fast_mb'])
+        self.stdout.write(self.style.SUCCESS(
+            f'\nMean per image: {full_ms:.1f} ms -> {fast_ms:.1f} ms ({full_ms / fast_ms:.1f}x faster), '
+            f'peak memory {full_mb:.1f} MB -> {fast_mb:.1f} MB ({full_mb / max(fast_mb, 0.1):.1f}x smaller)'
+        ))
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from backend.derivatives import delete_derivatives, generate_derivatives
+from clients.models import AlbumImage
+from portfolio.cache import bump_cache_version
+from portfolio.models import PortfolioImage
+
+
+class Command(BaseCommand):
+    help = 'Generate the web-optimized derivatives of album and portfolio images uploaded before they existed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate the derivatives of every image')
+        parser.add_argument('--workers', type=int, default=None, help='Number of concurrent renders')
+        parser.add_argument('--batch-size', type=int, default=100, help='Images rendered and saved per batch')
+
+    def handle(self, *args, **options):
+        workers = options['workers'] or getattr(settings, 'ALBUM_UPLOAD_WORKERS', 8)
+        for model in (AlbumImage, PortfolioImage):
+            queryset = model.objects.exclude(image='').only('id', 'image', 'derivatives').order_by('id')
+            if not options['force']:
+                queryset = queryset.filter(derivatives={})
+            total = queryset.count()
+            self.stdout.write(f'{model._meta.verbose_name_plural}: {total} image(s)')
+
+            done = failed = 0
+            last_id = None
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                while True:
+                    # Keyset batches, since rendered images leave the filtered queryset
+                    batch_queryset = queryset if last_id is None else queryset.filter(id__gt=last_id)
+                    images = list(batch_queryset[:options['batch_size']])
+                    if not images:
+                        break
+                    last_id = images[-1].id
+
+                    replaced = []
+                    for image, derivatives in zip(images, pool.map(lambda image: generate_derivatives(image.image), images)):
+                        if derivatives:
+                            replaced.append((image.image.storage, image.derivatives))
+                            image.derivatives = derivatives
+                        else:
+                            # Unreadable original: keep what it had
+                            failed += 1
+                    model.objects.bulk_update(images, ['derivatives'])
+                    if model is PortfolioImage:
+                        # bulk_update sends no signals: drop cached responses linking the replaced files
+                        bump_cache_version()
+                    for storage, derivatives in replaced:
+                        delete_derivatives(storage, derivatives)
+
+                    done += len(images)
+                    self.stdout.write(f'  {done}/{total}, {failed} failed')
+
+            self.stdout.write(self.style.SUCCESS(f'  {done - failed} generated, {failed} failed'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from backend.thumbnail_utils import evict_thumbnail_cache, get_cache_stats, migrate_legacy_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Report on the thumbnail cache, evict least recently used thumbnails and migrate the legacy layout'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--evict', action='store_true', help='Evict thumbnails beyond the byte budget')
+        parser.add_argument('--max-bytes', type=int, default=None,
+                            help='Byte budget to evict down to (defaults to THUMBNAIL_CACHE_MAX_BYTES)')
+        parser.add_argument('--migrate-legacy', action='store_true',
+                            help='Move thumbnails of the flat cache layout into shard directories')
+
+    def handle(self, *args, **options):
+        if options['migrate_legacy']:
+            moved = migrate_legacy_thumbnails()
+            self.stdout.write(self.style.SUCCESS(f'Moved {moved} legacy thumbnail(s)'))
+
+        if options['evict']:
+            result = evict_thumbnail_cache(options['max_bytes'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Evicted {result["evicted"]} thumbnail(s), {result["evicted_bytes"] / 1024 ** 2:.1f} MB'
+            ))
+
+        stats = get_cache_stats()
+        self.stdout.write(
+            f'{stats["files"]} file(s), {stats["bytes"] / 1024 ** 2:.1f} MB; '
+            f'{stats["hits"]} hit(s), {stats["misses"]} miss(es) ({stats["hit_rate"]:.1%} hit rate), '
+            f'{stats["evictions"]} eviction(s)'
+        )
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from backend.google_drive import get_google_drive_service
+from clients.models import GoogleDriveAlbum
+from clients.thumbnail_warmup import warm_album_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Generate missing thumbnails of Google Drive albums ahead of the first visit'
+
+    def add_arguments(self, parser):
+        parser.add_argument('album_ids', nargs='*', help='IDs of the albums to warm')
+        parser.add_argument('--all', action='store_true', help='Warm every Google Drive album')
+        parser.add_argument('--workers', type=int, default=None, help='Number of concurrent downloads/renders')
+
+    def handle(self, *args, **options):
+        if options['all']:
+            albums = GoogleDriveAlbum.objects.exclude(folder_id='').order_by('created_at')
+        elif options['album_ids']:
+            albums = GoogleDriveAlbum.objects.filter(id__in=options['album_ids']).order_by('created_at')
+        else:
+            raise CommandError('Pass album IDs or --all')
+
+        drive_service = get_google_drive_service()
+        if not drive_service:
+            raise CommandError('Google Drive service is not configured. Please check your environment variables.')
+
+        for album in albums:
+            self.stdout.write(f'Warming "{album.title}" ({album.id})')
+
+            def progress(stats):
+                done = stats['generated'] + stats['failed']
+                missing = stats['total'] - stats['cached']
+                self.stdout.write(
+                    f'  {done}/{missing} thumbnails, {stats["failed"]} failed, '
+                    f'{stats["rate"]:.1f}/s'
+                )
+
+            stats = warm_album_thumbnails(album, drive_service, workers=options['workers'], progress=progress)
+            self.stdout.write(self.style.SUCCESS(
+                f'  {stats["generated"]} generated, {stats["cached"]} already cached, '
+                f'{stats["failed"]} failed in {stats["elapsed"]:.1f}s ({stats["rate"]:.1f} thumbnails/s)'
+            ))
@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-17 17:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0002_googledrivealbum'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googledrivealbum',
+            name='changes_page_token',
+            field=models.CharField(blank=True, editable=False, help_text='Drive changes feed position of the local mirror', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='googledrivealbum',
+            name='synced_at',
+            field=models.DateTimeField(blank=True, editable=False, help_text='Last time the local mirror was synced with Drive', null=True),
+        ),
+        migrations.CreateModel(
+            name='DriveFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file_id', models.CharField(max_length=200)),
+                ('name', models.CharField(max_length=500)),
+                ('mime_type', models.CharField(max_length=100)),
+                ('size', models.BigIntegerField(blank=True, null=True)),
+                ('created_time', models.CharField(blank=True, max_length=40, null=True)),
+                ('modified_time', models.CharField(blank=True, max_length=40, null=True)),
+                ('md5_checksum', models.CharField(blank=True, max_length=32, null=True)),
+                ('web_content_link', models.URLField(blank=True, max_length=1000, null=True)),
+                ('thumbnail_link', models.URLField(blank=True, max_length=1000, null=True)),
+                ('album', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drive_files', to='clients.googledrivealbum')),
+            ],
+            options={
+                'ordering': ['name', 'file_id'],
+                'indexes': [models.Index(fields=['album', 'name', 'file_id'], name='clients_drivefile_listing')],
+                'constraints': [models.UniqueConstraint(fields=('album', 'file_id'), name='unique_drive_file_per_album')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 6.0 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0003_drivefile_mirror'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='drivefile',
+            options={'ordering': ['folder_path', 'name', 'file_id']},
+        ),
+        migrations.RemoveIndex(
+            model_name='drivefile',
+            name='clients_drivefile_listing',
+        ),
+        migrations.AddField(
+            model_name='drivefile',
+            name='folder_path',
+            field=models.CharField(blank=True, default='', help_text='Subfolder path inside the album, empty for the album folder', max_length=1000),
+        ),
+        migrations.AddField(
+            model_name='drivefile',
+            name='parent_id',
+            field=models.CharField(blank=True, default='', help_text='Drive folder directly containing the file', max_length=200),
+        ),
+        migrations.AddField(
+            model_name='googledrivealbum',
+            name='drive_folders',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Mirrored Drive folders: folder ID -> path inside the album'),
+        ),
+        migrations.AddIndex(
+            model_name='drivefile',
+            index=models.Index(fields=['album', 'folder_path', 'name', 'file_id'], name='clients_drivefile_listing'),
+        ),
+    ]
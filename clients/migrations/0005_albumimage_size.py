@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-17 18:01
+
+from django.db import migrations, models
+
+
+def backfill_sizes(apps, schema_editor):
+    """Read the size of the images uploaded before the field existed from storage."""
+    AlbumImage = apps.get_model('clients', 'AlbumImage')
+    images = AlbumImage.objects.filter(size__isnull=True).exclude(image='').only('id', 'image')
+    batch = []
+    for image in images.iterator(chunk_size=500):
+        try:
+            image.size = image.image.storage.size(image.image.name)
+        except (FileNotFoundError, OSError):
+            continue
+        batch.append(image)
+        if len(batch) >= 500:
+            AlbumImage.objects.bulk_update(batch, ['size'])
+            batch = []
+    AlbumImage.objects.bulk_update(batch, ['size'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0004_drive_folders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='albumimage',
+            name='size',
+            field=models.BigIntegerField(blank=True, editable=False, help_text='File size in bytes', null=True),
+        ),
+        migrations.RunPython(backfill_sizes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-17 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0005_albumimage_size'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='albumimage',
+            options={'ordering': ['created_at', 'id']},
+        ),
+        migrations.AddIndex(
+            model_name='albumimage',
+            index=models.Index(fields=['album', 'created_at', 'id'], name='clients_albumimage_listing'),
+        ),
+        migrations.AddIndex(
+            model_name='clientalbum',
+            index=models.Index(fields=['title'], name='clients_album_title'),
+        ),
+        migrations.AddIndex(
+            model_name='clientalbum',
+            index=models.Index(fields=['-created_at', 'id'], name='clients_album_created'),
+        ),
+        migrations.AddIndex(
+            model_name='googledrivealbum',
+            index=models.Index(fields=['folder_id', 'created_at'], name='clients_drivealbum_folder'),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 6.0 on 2026-10-17 19:12
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0006_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadBatch',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('school', models.CharField(blank=True, help_text='Appended to the names of albums created by a bulk upload', max_length=200)),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('result', models.JSONField(blank=True, help_text='Summary of the ingest, returned again if completion is retried', null=True)),
+                ('album', models.ForeignKey(blank=True, help_text='Album receiving the images; empty for a bulk upload creating albums from file names', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='upload_batches', to='clients.clientalbum')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='UploadBatchFile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('size', models.BigIntegerField()),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='files', to='clients.uploadbatch')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+def mark_completed_batches(apps, schema_editor):
+    UploadBatch = apps.get_model('clients', 'UploadBatch')
+    UploadBatch.objects.filter(completed_at__isnull=False).update(state='completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0008_albumimage_derivatives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadbatch',
+            name='error',
+            field=models.TextField(blank=True, help_text='Why the last ingest attempt failed'),
+        ),
+        migrations.AddField(
+            model_name='uploadbatch',
+            name='state',
+            field=models.CharField(choices=[('uploading', 'Uploading'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='uploading', max_length=20),
+        ),
+        migrations.RunPython(mark_completed_batches, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 23:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('clients', '0009_uploadbatch_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadbatch',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, help_text='When the last ingest attempt started; one still processing after CHUNKED_UPLOAD_PROCESSING_TIMEOUT is considered interrupted', null=True),
+        ),
+    ]
@@ -5,6 +5,7 @@ from io import BytesIO
 from django.core.files import File
 from django.db import models
 from django.conf import settings
+from backend.derivatives import get_derivative_url, reset_derivatives, schedule_derivatives
 import random
 
 def generate_pin():
@@ -17,6 +18,13 @@ class ClientAlbum(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     qr_code = models.ImageField(upload_to='qrcodes/', blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            # Unique title probes of the bulk upload and the newest-first album list
+            models.Index(fields=['title'], name='clients_album_title'),
+            models.Index(fields=['-created_at', 'id'], name='clients_album_created'),
+        ]
+
     def generate_qr_code(self):
         """Generate or regenerate the QR code with the current domain from settings"""
         frontend_url = getattr(settings, 'FRONTEND_URL', 'http://localhost:3000')
@@ -41,8 +49,28 @@ class ClientAlbum(models.Model):
 class AlbumImage(models.Model):
     album = models.ForeignKey(ClientAlbum, related_name='images', on_delete=models.CASCADE)
     image = models.ImageField(upload_to='client_albums/')
+    size = models.BigIntegerField(blank=True, null=True, editable=False, help_text="File size in bytes")
+    derivatives = models.JSONField(default=dict, blank=True, editable=False, help_text="Web-optimized renditions of the image (see backend.derivatives)")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['created_at', 'id']
+        indexes = [
+            models.Index(fields=['album', 'created_at', 'id'], name='clients_albumimage_listing'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Record the size of new or replaced files, so album totals are a single SUM
+        if self.image and (self.size is None or not self.image._committed):
+            try:
+                self.size = self.image.size
+            except (FileNotFoundError, OSError):
+                self.size = None
+        render = reset_derivatives(self)
+        super().save(*args, **kwargs)
+        if render:
+            schedule_derivatives(AlbumImage, [self.pk])
+
     def __str__(self):
         # Show filename or a more descriptive identifier
         if self.image:
@@ -57,6 +85,57 @@ class AlbumImage(models.Model):
             return self.image.name.split('/')[-1]
         return "No image"
 
+    @property
+    def thumbnail_url(self):
+        """URL of the small rendition of the image, for previews"""
+        return get_derivative_url(self.image, self.derivatives)
+
+
+class UploadBatch(models.Model):
+    """Chunked, resumable admin upload whose files are ingested together once all chunks arrived"""
+    UPLOADING = 'uploading'
+    PROCESSING = 'processing'
+    COMPLETED = 'completed'
+    FAILED = 'failed'
+    STATE_CHOICES = [
+        (UPLOADING, 'Uploading'),
+        (PROCESSING, 'Processing'),
+        (COMPLETED, 'Completed'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    album = models.ForeignKey(ClientAlbum, related_name='upload_batches', on_delete=models.CASCADE, blank=True, null=True, help_text="Album receiving the images; empty for a bulk upload creating albums from file names")
+    school = models.CharField(max_length=200, blank=True, help_text="Appended to the names of albums created by a bulk upload")
+    chunk_size = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default=UPLOADING)
+    error = models.TextField(blank=True, help_text="Why the last ingest attempt failed")
+    processing_started_at = models.DateTimeField(blank=True, null=True, help_text="When the last ingest attempt started; one still processing after CHUNKED_UPLOAD_PROCESSING_TIMEOUT is considered interrupted")
+    completed_at = models.DateTimeField(blank=True, null=True)
+    result = models.JSONField(blank=True, null=True, help_text="Summary of the ingest, returned again if completion is retried")
+
+    def __str__(self):
+        return f"Upload {self.id} ({self.state})"
+
+
+class UploadBatchFile(models.Model):
+    """A file of an upload batch; its chunks are stored on disk until the batch completes"""
+    batch = models.ForeignKey(UploadBatch, related_name='files', on_delete=models.CASCADE)
+    name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return self.name
+
+    @property
+    def total_chunks(self):
+        """Number of chunks of the file; an empty file still has one (empty) chunk"""
+        return max(1, -(-self.size // self.batch.chunk_size))
+
 
 class GoogleDriveAlbum(models.Model):
     """Model for albums that pull images from Google Drive folders"""
@@ -66,6 +145,15 @@ class GoogleDriveAlbum(models.Model):
     folder_id = models.CharField(max_length=200, blank=True, editable=False, help_text="Extracted from folder link")
     created_at = models.DateTimeField(auto_now_add=True)
     qr_code = models.ImageField(upload_to='qrcodes/', blank=True, null=True)
+    changes_page_token = models.CharField(max_length=200, blank=True, editable=False, help_text="Drive changes feed position of the local mirror")
+    synced_at = models.DateTimeField(blank=True, null=True, editable=False, help_text="Last time the local mirror was synced with Drive")
+    drive_folders = models.JSONField(default=dict, blank=True, editable=False, help_text="Mirrored Drive folders: folder ID -> path inside the album")
+
+    class Meta:
+        indexes = [
+            # Folder listings served from the mirror of the oldest album using the folder
+            models.Index(fields=['folder_id', 'created_at'], name='clients_drivealbum_folder'),
+        ]
 
     def extract_folder_id(self):
         """Extract folder ID from Google Drive URL"""
@@ -101,6 +189,11 @@ class GoogleDriveAlbum(models.Model):
         if self.folder_link:
             extracted_id = self.extract_folder_id()
             if extracted_id:
+                if extracted_id != self.folder_id:
+                    # Folder changed, force a full resync of the local mirror
+                    self.changes_page_token = ''
+                    self.synced_at = None
+                    self.drive_folders = {}
                 self.folder_id = extracted_id
             else:
                 raise ValueError("Could not extract folder ID from the provided Google Drive link. Please check the link format.")
@@ -113,3 +206,68 @@ class GoogleDriveAlbum(models.Model):
 
     def __str__(self):
         return f"{self.title} (Drive: {self.folder_id[:20] if self.folder_id else 'N/A'}...)"
+
+
+class DriveFile(models.Model):
+    """Local mirror of an image file inside a Google Drive album folder"""
+    album = models.ForeignKey(GoogleDriveAlbum, related_name='drive_files', on_delete=models.CASCADE)
+    file_id = models.CharField(max_length=200)
+    name = models.CharField(max_length=500)
+    mime_type = models.CharField(max_length=100)
+    size = models.BigIntegerField(blank=True, null=True)
+    created_time = models.CharField(max_length=40, blank=True, null=True)
+    modified_time = models.CharField(max_length=40, blank=True, null=True)
+    md5_checksum = models.CharField(max_length=32, blank=True, null=True)
+    web_content_link = models.URLField(max_length=1000, blank=True, null=True)
+    thumbnail_link = models.URLField(max_length=1000, blank=True, null=True)
+    parent_id = models.CharField(max_length=200, blank=True, default='', help_text="Drive folder directly containing the file")
+    folder_path = models.CharField(max_length=1000, blank=True, default='', help_text="Subfolder path inside the album, empty for the album folder")
+
+    class Meta:
+        ordering = ['folder_path', 'name', 'file_id']
+        constraints = [
+            models.UniqueConstraint(fields=['album', 'file_id'], name='unique_drive_file_per_album'),
+        ]
+        indexes = [
+            models.Index(fields=['album', 'folder_path', 'name', 'file_id'], name='clients_drivefile_listing'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.file_id})"
+
+    @classmethod
+    def from_drive(cls, album, data):
+        """Build an unsaved mirror row from a Drive file dictionary"""
+        size = data.get('size')
+        parents = data.get('parents') or ['']
+        return cls(
+            album=album,
+            file_id=data['id'],
+            name=data.get('name') or '',
+            mime_type=data.get('mimeType') or '',
+            size=int(size) if size else None,
+            created_time=data.get('createdTime'),
+            modified_time=data.get('modifiedTime'),
+            md5_checksum=data.get('md5Checksum'),
+            web_content_link=data.get('webContentLink') or data.get('downloadLink'),
+            thumbnail_link=data.get('thumbnailLink'),
+            parent_id=data.get('parentId') or parents[0],
+            folder_path=data.get('folderPath') or '',
+        )
+
+    def as_drive_image(self):
+        """Return the same dictionary shape as GoogleDriveService.get_image_files"""
+        direct_link = f"https://drive.google.com/uc?export=view&id={self.file_id}"
+        return {
+            'id': self.file_id,
+            'name': self.name,
+            'mimeType': self.mime_type,
+            'size': str(self.size) if self.size is not None else None,
+            'createdTime': self.created_time,
+            'modifiedTime': self.modified_time,
+            'md5Checksum': self.md5_checksum,
+            'thumbnailLink': self.thumbnail_link,
+            'downloadLink': self.web_content_link or direct_link,
+            'directLink': direct_link,
+            'folderPath': self.folder_path,
+        }
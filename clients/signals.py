@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from backend.derivatives import delete_derivatives
+from .archives import invalidate_album_archives, schedule_archive_build
+from .models import AlbumImage, ClientAlbum, GoogleDriveAlbum
+from .thumbnail_warmup import start_background_warmup
+
+
+@receiver(post_save, sender=GoogleDriveAlbum)
+def warm_drive_album_thumbnails(sender, instance, **kwargs):
+    """Render the thumbnails of a saved Drive album before the QR code is handed out"""
+    if not getattr(settings, 'GOOGLE_DRIVE_PREWARM_ON_SAVE', True) or not instance.folder_id:
+        return
+    transaction.on_commit(lambda: start_background_warmup(instance.pk))
+
+
+@receiver(post_save, sender=AlbumImage)
+@receiver(post_delete, sender=AlbumImage)
+def rebuild_album_archive(sender, instance, **kwargs):
+    """Drop the stale archive of an album whose images changed and prebuild the new one"""
+    album_id = instance.album_id
+
+    def refresh():
+        invalidate_album_archives(album_id)
+        if getattr(settings, 'ALBUM_ARCHIVE_PREBUILD', True):
+            schedule_archive_build(album_id)
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=AlbumImage)
+def delete_album_image_derivatives(sender, instance, **kwargs):
+    """Remove the renditions of a deleted image once the deletion is committed"""
+    storage, derivatives = instance.image.storage, instance.derivatives
+    if derivatives:
+        transaction.on_commit(lambda: delete_derivatives(storage, derivatives))
+
+
+@receiver(post_delete, sender=ClientAlbum)
+def delete_album_archives(sender, instance, **kwargs):
+    """Remove the archives of a deleted album"""
+    album_id = instance.pk
+    transaction.on_commit(lambda: invalidate_album_archives(album_id))
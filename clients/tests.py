@@ -1,3 +1,1811 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from io import BytesIO, StringIO
+from pathlib import Path
+from datetime import timedelta
+from unittest import mock
+import httplib2
+import httpx
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpMockSequence
+from django.utils import timezone
+from backend import google_drive, thumbnail_utils
+from backend.async_drive import AsyncGoogleDriveService
+from backend.derivatives import render_derivatives
+from backend.google_drive import BATCH_LIMIT, FOLDER_MIME_TYPE, get_google_drive_service
+from backend.locks import file_lock
+from backend.serializers import AlbumImageSerializer
+from backend.thumbnail_utils import (
+    evict_thumbnail_cache, get_cached_thumbnail, get_or_create_thumbnail, get_thumbnail_cache_dir,
+    get_thumbnail_path, get_thumbnail_source_path, migrate_legacy_thumbnails, negotiate_thumbnail_format, prepare_image,
+    render_variants,
+)
+from . import async_views
+from .archives import build_album_archive, get_album_version, get_archive_dir, get_archive_path
+from .drive_archive import OrderedPrefetcher
+from .drive_sync import get_album_images, sync_album
+from .ingest import ingest_album_uploads, ingest_grouped_uploads, resolve_unique_titles
+from backend import zip_stream
+from backend.zip_stream import ZipStream
+from .models import AlbumImage, ClientAlbum, DriveFile, GoogleDriveAlbum, UploadBatch
+from .thumbnail_warmup import warm_album_thumbnails
+from .uploads import complete_upload_batch, delete_stale_upload_batches, get_batch_dir
 
-# Create your tests here.
+FOLDER_ID = 'folder123'
+
+
+def make_jpeg(size=(1200, 900), color=(200, 80, 40)):
+    """Encode a solid-color JPEG of the given size."""
+    buffer = BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+def drive_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'{"error": {"message": "Drive error"}}')
+
+
+class FakeDriveService:
+    """In-memory stand-in for GoogleDriveService backed by a dict of files."""
+
+    def __init__(self, files=None, supports_changes=True):
+        self.files = {}
+        self.contents = {}
+        self.thumbnails = {}
+        self.changes = []
+        self.supports_changes = supports_changes
+        self.calls = []
+        for data in files or []:
+            self.files[data['id']] = data
+
+    def _file(self, file_id, name, parents=(FOLDER_ID,), mime_type='image/jpeg', **extra):
+        return {
+            'id': file_id,
+            'name': name,
+            'mimeType': mime_type,
+            'size': '1024',
+            'modifiedTime': '2025-01-01T10:00:00.000Z',
+            'md5Checksum': f'md5-{file_id}',
+            'parents': list(parents),
+            **extra,
+        }
+
+    def add(self, file_id, name, **kwargs):
+        data = self._file(file_id, name, **kwargs)
+        self.files[file_id] = data
+        self.changes.append({'fileId': file_id, 'removed': False, 'file': data})
+
+    def remove(self, file_id):
+        self.files.pop(file_id)
+        self.changes.append({'fileId': file_id, 'removed': True})
+
+    def get_start_page_token(self):
+        self.calls.append('get_start_page_token')
+        return str(len(self.changes)) if self.supports_changes else None
+
+    def list_changes(self, page_token):
+        self.calls.append('list_changes')
+        return self.changes[int(page_token):], str(len(self.changes))
+
+    def get_file_metadata(self, file_id):
+        self.calls.append('get_file_metadata')
+        data = self.files.get(file_id)
+        if data:
+            return {**data, 'size': str(len(self.contents.get(file_id, b'')))}
+        return None
+
+    def get_files_metadata(self, file_ids, use_cache=True):
+        self.calls.append('get_files_metadata')
+        return {file_id: self.files.get(file_id) for file_id in file_ids}
+
+    def iter_file_content(self, file_id, start=0, end=None, chunk_size=4):
+        self.calls.append('iter_file_content')
+        content = self.contents[file_id][start:None if end is None else end + 1]
+        for offset in range(0, len(content), chunk_size):
+            yield content[offset:offset + chunk_size]
+
+    def get_file_content(self, file_id):
+        self.calls.append('get_file_content')
+        return self.contents.get(file_id)
+
+    def get_thumbnail(self, file_id, size, thumbnail_link=None):
+        self.calls.append('get_thumbnail')
+        return self.thumbnails.get(file_id)
+
+    def get_image_files(self, folder_id):
+        self.calls.append('get_image_files')
+        return [
+            data for data in self.files.values()
+            if folder_id in data['parents'] and data['mimeType'] != FOLDER_MIME_TYPE
+        ]
+
+    def walk_folder(self, folder_id):
+        self.calls.append('walk_folder')
+        folders = {folder_id: ''}
+        queue = [folder_id]
+        while queue:
+            parent = queue.pop(0)
+            for data in self.files.values():
+                if data['mimeType'] == FOLDER_MIME_TYPE and parent in data['parents'] and data['id'] not in folders:
+                    folders[data['id']] = f"{folders[parent]}/{data['name']}".lstrip('/')
+                    queue.append(data['id'])
+        images = [
+            {**data, 'parentId': parent, 'folderPath': folders[parent]}
+            for data in self.files.values() if data['mimeType'] != FOLDER_MIME_TYPE
+            for parent in data['parents'][:1] if parent in folders
+        ]
+        return images, folders
+
+
+class MediaRootTestCase(TestCase):
+    """Run every test against a throwaway MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=self.media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, archive_dir, ignore_errors=True)
+        archive_override = override_settings(ALBUM_ARCHIVE_DIR=Path(archive_dir))
+        archive_override.enable()
+        self.addCleanup(archive_override.disable)
+        google_drive.forget_file_metadata()
+        # Render derivatives inline instead of in a thread closing the test's connection
+        derivatives_patch = mock.patch('backend.derivatives.start_background_derivatives', side_effect=render_derivatives)
+        derivatives_patch.start()
+        self.addCleanup(derivatives_patch.stop)
+
+
+class DriveMirrorSyncTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.album = GoogleDriveAlbum.objects.create(
+            title='Wedding',
+            folder_link=f'https://drive.google.com/drive/folders/{FOLDER_ID}',
+        )
+        self.drive = FakeDriveService()
+        self.drive.add('a', 'b.jpg')
+        self.drive.add('b', 'a.jpg')
+        self.drive.add('elsewhere', 'c.jpg', parents=('other',))
+
+    def expire_mirror(self):
+        GoogleDriveAlbum.objects.filter(pk=self.album.pk).update(synced_at=timezone.now() - timedelta(hours=1))
+        self.album.refresh_from_db()
+
+    def test_first_sync_lists_folder_and_stores_token(self):
+        images = get_album_images(self.album, self.drive)
+
+        self.assertEqual([image['id'] for image in images], ['b', 'a'])
+        self.assertEqual(self.drive.calls, ['get_start_page_token', 'walk_folder'])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.changes_page_token, '3')
+
+    def test_fresh_mirror_is_served_without_drive_calls(self):
+        sync_album(self.album, self.drive)
+        self.drive.calls.clear()
+
+        images = get_album_images(self.album, self.drive)
+
+        self.assertEqual(len(images), 2)
+        self.assertEqual(self.drive.calls, [])
+
+    def test_incremental_sync_applies_only_deltas(self):
+        sync_album(self.album, self.drive)
+        self.drive.add('new', 'd.jpg')
+        self.drive.remove('a')
+        self.drive.add('b', 'renamed.jpg')
+        self.drive.add('moved', 'e.jpg', parents=('other',))
+        self.drive.calls.clear()
+        self.expire_mirror()
+
+        images = get_album_images(self.album, self.drive)
+
+        self.assertEqual(self.drive.calls, ['list_changes'])
+        self.assertEqual(
+            [(image['id'], image['name']) for image in images],
+            [('new', 'd.jpg'), ('b', 'renamed.jpg')],
+        )
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.changes_page_token, '7')
+
+    def test_rejected_changes_token_triggers_full_sync(self):
+        sync_album(self.album, self.drive)
+        self.drive.add('new', 'd.jpg')
+        self.drive.calls.clear()
+        self.expire_mirror()
+
+        with mock.patch.object(self.drive, 'list_changes', side_effect=drive_error(410)):
+            images = get_album_images(self.album, self.drive)
+
+        self.assertEqual(self.drive.calls, ['get_start_page_token', 'walk_folder'])
+        self.assertEqual([image['id'] for image in images], ['b', 'a', 'new'])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.changes_page_token, '4')
+
+    def test_drive_outage_serves_existing_mirror(self):
+        sync_album(self.album, self.drive)
+        self.expire_mirror()
+
+        with mock.patch.object(self.drive, 'list_changes', side_effect=drive_error(503)):
+            images = get_album_images(self.album, self.drive)
+
+        self.assertEqual([image['id'] for image in images], ['b', 'a'])
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.changes_page_token, '3')
+
+    def test_drive_outage_without_mirror_raises(self):
+        with mock.patch.object(self.drive, 'walk_folder', side_effect=drive_error(503)):
+            with self.assertRaises(HttpError):
+                sync_album(self.album, self.drive)
+
+    def test_without_changes_feed_falls_back_to_full_listing(self):
+        drive = FakeDriveService(supports_changes=False)
+        drive.add('a', 'a.jpg')
+        sync_album(self.album, drive)
+        drive.add('b', 'b.jpg')
+        self.expire_mirror()
+
+        images = get_album_images(self.album, drive)
+
+        self.assertEqual([image['id'] for image in images], ['a', 'b'])
+        self.assertEqual(drive.calls.count('walk_folder'), 2)
+
+    def test_changing_folder_link_resets_mirror(self):
+        sync_album(self.album, self.drive)
+        self.album.folder_link = 'https://drive.google.com/drive/folders/other'
+        self.album.save()
+
+        self.assertEqual(self.album.changes_page_token, '')
+        self.assertIsNone(self.album.synced_at)
+        get_album_images(self.album, self.drive)
+        self.assertEqual(list(DriveFile.objects.values_list('file_id', flat=True)), ['elsewhere'])
+
+    def test_subfolder_images_are_mirrored_with_their_path(self):
+        self.drive.add('ceremony', 'Ceremony', mime_type=FOLDER_MIME_TYPE)
+        self.drive.add('day1', 'Day 1', parents=('ceremony',), mime_type=FOLDER_MIME_TYPE)
+        self.drive.add('nested', 'n.jpg', parents=('day1',))
+
+        images = get_album_images(self.album, self.drive)
+
+        self.assertEqual(
+            [(image['id'], image['folderPath']) for image in images],
+            [('b', ''), ('a', ''), ('nested', 'Ceremony/Day 1')],
+        )
+        self.assertEqual(DriveFile.objects.get(file_id='nested').parent_id, 'day1')
+        self.album.refresh_from_db()
+        self.assertEqual(self.album.drive_folders, {FOLDER_ID: '', 'ceremony': 'Ceremony', 'day1': 'Ceremony/Day 1'})
+
+    def test_images_of_known_subfolders_sync_incrementally(self):
+        self.drive.add('ceremony', 'Ceremony', mime_type=FOLDER_MIME_TYPE)
+        sync_album(self.album, self.drive)
+        self.drive.add('late', 'l.jpg', parents=('ceremony',))
+        self.drive.calls.clear()
+        self.expire_mirror()
+
+        images = get_album_images(self.album, self.drive)
+
+        self.assertEqual(self.drive.calls, ['list_changes'])
+        self.assertIn(('late', 'Ceremony'), [(image['id'], image['folderPath']) for image in images])
+
+    def test_folder_changes_resync_the_tree(self):
+        sync_album(self.album, self.drive)
+        self.drive.add('party', 'Party', mime_type=FOLDER_MIME_TYPE)
+        self.drive.add('dance', 'd.jpg', parents=('party',))
+        self.drive.calls.clear()
+        self.expire_mirror()
+
+        images = get_album_images(self.album, self.drive)
+
+        self.assertEqual(self.drive.calls, ['list_changes', 'get_start_page_token', 'walk_folder'])
+        self.assertIn(('dance', 'Party'), [(image['id'], image['folderPath']) for image in images])
+
+    @override_settings(GOOGLE_DRIVE_RECURSIVE_ALBUMS=False)
+    def test_recursion_can_be_disabled(self):
+        self.drive.add('ceremony', 'Ceremony', mime_type=FOLDER_MIME_TYPE)
+        self.drive.add('nested', 'n.jpg', parents=('ceremony',))
+
+        images = get_album_images(self.album, self.drive)
+
+        self.assertEqual([image['id'] for image in images], ['b', 'a'])
+        self.assertEqual(self.drive.calls, ['get_start_page_token', 'get_image_files'])
+
+    def test_album_endpoint_pages_with_cursors(self):
+        for index in range(5):
+            self.drive.add(f'p{index}', f'photo{index}.jpg')
+        url = f'/api/drive-albums/{self.album.id}/'
+
+        with mock.patch('clients.views.get_google_drive_service', return_value=self.drive):
+            first = self.client.get(url, {'page_size': 3}).json()
+            second = self.client.get(first['next']).json()
+            third = self.client.get(url, {'page_size': 3, 'page': 3}).json()
+
+        self.assertEqual(first['count'], 7)
+        self.assertEqual([image['name'] for image in first['images']], ['a.jpg', 'b.jpg', 'photo0.jpg'])
+        self.assertEqual([image['name'] for image in second['images']], ['photo1.jpg', 'photo2.jpg', 'photo3.jpg'])
+        self.assertEqual([image['name'] for image in third['images']], ['photo4.jpg'])
+        self.assertIsNone(third['next_cursor'])
+        # Only the first request synced the mirror
+        self.assertEqual(self.drive.calls.count('walk_folder'), 1)
+
+    def test_album_endpoint_rejects_invalid_cursor(self):
+        with mock.patch('clients.views.get_google_drive_service', return_value=self.drive):
+            response = self.client.get(f'/api/drive-albums/{self.album.id}/', {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.drive.calls, [])
+
+    def test_album_endpoint_serves_mirror(self):
+        with mock.patch('clients.views.get_google_drive_service', return_value=self.drive):
+            response = self.client.get(f'/api/drive-albums/{self.album.id}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([image['id'] for image in response.json()['images']], ['b', 'a'])
+
+        # Once mirrored the album keeps working while Drive is unavailable
+        with mock.patch('clients.views.get_google_drive_service', return_value=None):
+            response = self.client.get(f'/api/drive-albums/{self.album.id}/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()['images']), 2)
+
+
+@mock.patch.dict(os.environ, {'GOOGLE_DRIVE_API_KEY': 'test-key'})
+@mock.patch.dict(google_drive._services, clear=True)
+class GoogleDriveServicePoolTests(TestCase):
+    def test_service_is_shared_by_the_process(self):
+        with mock.patch('backend.google_drive.build_from_document', wraps=google_drive.build_from_document) as build:
+            first = get_google_drive_service()
+            second = get_google_drive_service()
+
+            self.assertIs(first, second)
+            self.assertIs(first.service, second.service)
+            self.assertEqual(build.call_count, 1)
+
+    def test_each_thread_gets_its_own_api_resource(self):
+        drive_service = get_google_drive_service()
+        resources = []
+        thread = threading.Thread(target=lambda: resources.append(drive_service.service))
+        thread.start()
+        thread.join()
+
+        self.assertIsNot(resources[0], drive_service.service)
+        self.assertIs(google_drive.get_discovery_document(), google_drive.get_discovery_document())
+
+    def test_service_account_requests_use_an_authorized_client(self):
+        drive_service = google_drive.GoogleDriveService(api_key='test-key')
+        drive_service.credentials = mock.Mock(valid=True)
+        drive_service._build_service()
+
+        self.assertIsInstance(drive_service.http, AuthorizedHttp)
+        self.assertIs(drive_service.http.credentials, drive_service.credentials)
+
+
+class DriveImageStreamingTests(TestCase):
+    def test_iter_file_content_fetches_ranged_chunks(self):
+        with mock.patch.dict(os.environ, {'GOOGLE_DRIVE_API_KEY': 'test-key'}):
+            drive_service = google_drive.GoogleDriveService(api_key='test-key')
+        http = HttpMockSequence([
+            ({'status': '206', 'content-range': 'bytes 0-3/10'}, b'0123'),
+            ({'status': '206', 'content-range': 'bytes 4-7/10'}, b'4567'),
+            ({'status': '206', 'content-range': 'bytes 8-9/10'}, b'89'),
+        ])
+        drive_service._local.service = build_from_document(
+            google_drive.get_discovery_document(), http=http
+        )
+
+        self.assertEqual(list(drive_service.iter_file_content('file', chunk_size=4)), [b'0123', b'4567', b'89'])
+
+    def test_proxy_streams_full_size_image(self):
+        drive = FakeDriveService()
+        drive.add('photo', 'photo.jpg')
+        drive.contents['photo'] = b'x' * 10
+
+        with mock.patch('clients.views.get_google_drive_service', return_value=drive):
+            response = self.client.get('/api/google-drive/image/photo/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Length'], '10')
+        self.assertEqual(b''.join(response.streaming_content), b'x' * 10)
+        self.assertNotIn('get_file_content', drive.calls)
+
+    def proxy(self, **headers):
+        drive = FakeDriveService()
+        drive.add('photo', 'photo.jpg')
+        drive.contents['photo'] = b'0123456789'
+        with mock.patch('clients.views.get_google_drive_service', return_value=drive):
+            response = self.client.get('/api/google-drive/image/photo/', headers=headers)
+        return response, drive
+
+    def test_proxy_sends_validators(self):
+        response, _ = self.proxy()
+
+        self.assertEqual(response['ETag'], '"md5-photo"')
+        self.assertEqual(response['Last-Modified'], 'Wed, 01 Jan 2025 10:00:00 GMT')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_proxy_answers_revalidation_without_download(self):
+        for headers in ({'If-None-Match': '"md5-photo"'}, {'If-Modified-Since': 'Wed, 01 Jan 2025 10:00:00 GMT'}):
+            response, drive = self.proxy(**headers)
+
+            self.assertEqual(response.status_code, 304)
+            self.assertNotIn('iter_file_content', drive.calls)
+
+    def test_proxy_serves_byte_ranges(self):
+        response, _ = self.proxy(Range='bytes=2-5')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+
+        response, _ = self.proxy(Range='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+    def test_proxy_ignores_range_for_outdated_if_range(self):
+        response, _ = self.proxy(Range='bytes=2-5', **{'If-Range': '"stale"'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+
+    def test_proxy_rejects_unsatisfiable_range(self):
+        response, _ = self.proxy(Range='bytes=20-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+
+class ThumbnailSingleFlightTests(MediaRootTestCase):
+    def test_concurrent_misses_download_and_render_once(self):
+        content = make_jpeg()
+        downloads = []
+
+        def load_content():
+            downloads.append(threading.get_ident())
+            time.sleep(0.2)
+            return content
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(get_or_create_thumbnail('photo', load_content)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(downloads), 1)
+        self.assertEqual(set(results), {get_thumbnail_path('photo')})
+        with Image.open(get_thumbnail_path('photo')) as thumbnail:
+            self.assertEqual(thumbnail.size, (800, 600))
+        # Only the requested size is rendered next to the cached source, and
+        # no temporary or lock files are left behind
+        self.assertEqual(
+            sorted(path.name for path in get_thumbnail_cache_dir().rglob('*') if path.is_file()),
+            ['photo_800.jpg', 'photo_source.jpg'],
+        )
+
+    def test_file_lock_excludes_other_holders(self):
+        lock_path = Path(self.media_root) / 'test.lock'
+        events = []
+
+        def hold(name):
+            with file_lock(lock_path):
+                events.append(f'{name}-in')
+                time.sleep(0.1)
+                events.append(f'{name}-out')
+
+        threads = [threading.Thread(target=hold, args=(name,)) for name in ('a', 'b')]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([event[-3:] for event in events], ['-in', 'out', '-in', 'out'])
+
+
+class ThumbnailCacheTests(MediaRootTestCase):
+    def write_thumbnail(self, file_id, size, atime):
+        path = get_thumbnail_path(file_id, size)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b'x' * 100)
+        os.utime(path, (atime, atime))
+        return path
+
+    def test_thumbnails_are_sharded_by_hash_prefix(self):
+        path = get_thumbnail_path('photo', 400, 'webp')
+
+        relative = path.relative_to(get_thumbnail_cache_dir())
+        self.assertEqual(len(relative.parts), 3)
+        self.assertEqual([len(part) for part in relative.parts[:2]], [2, 2])
+        self.assertEqual(relative.name, 'photo_400.webp')
+        # Looking up a path does not create directories
+        self.assertFalse(path.parent.exists())
+
+    def test_eviction_removes_least_recently_used_first(self):
+        now = time.time()
+        paths = [self.write_thumbnail(f'photo{index}', 400, now - 1000 + index) for index in range(10)]
+
+        result = evict_thumbnail_cache(max_bytes=500)
+
+        # Trimmed to 90% of the budget, oldest access first
+        self.assertEqual(result['evicted'], 6)
+        self.assertEqual(result['bytes'], 400)
+        self.assertEqual([path.exists() for path in paths], [False] * 6 + [True] * 4)
+
+    def test_cache_hits_refresh_access_time_but_not_mtime(self):
+        old = time.time() - 7200
+        path = self.write_thumbnail('photo', 400, old)
+
+        self.assertEqual(get_cached_thumbnail('photo', 400), path)
+        self.assertGreater(path.stat().st_atime, old)
+        self.assertEqual(path.stat().st_mtime, old)
+        self.assertIsNone(get_cached_thumbnail('other', 400))
+
+    def test_legacy_flat_thumbnails_are_migrated(self):
+        cache_dir = get_thumbnail_cache_dir()
+        cache_dir.mkdir(parents=True)
+        (cache_dir / 'old.jpg').write_bytes(b'x')
+        (cache_dir / 'new_200.webp').write_bytes(b'x')
+
+        self.assertEqual(migrate_legacy_thumbnails(), 2)
+        self.assertTrue(get_thumbnail_path('old', 800, 'jpeg').exists())
+        self.assertTrue(get_thumbnail_path('new', 200, 'webp').exists())
+
+    def test_management_command_reports_hit_rate(self):
+        thumbnail_utils._pending_stats.clear()
+        content = make_jpeg()
+        get_or_create_thumbnail('photo', content)
+        get_or_create_thumbnail('photo', content)
+        output = StringIO()
+
+        call_command('thumbnail_cache', stdout=output)
+
+        # The thumbnail and the source it was rendered from
+        self.assertIn('2 file(s)', output.getvalue())
+        self.assertIn('1 hit(s), 1 miss(es)', output.getvalue())
+
+
+class ThumbnailWarmupTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.album = GoogleDriveAlbum.objects.create(
+            title='School',
+            folder_link=f'https://drive.google.com/drive/folders/{FOLDER_ID}',
+        )
+        self.drive = FakeDriveService()
+        for index in range(5):
+            self.drive.add(f'photo{index}', f'{index}.jpg')
+            self.drive.contents[f'photo{index}'] = make_jpeg()
+
+    def test_warms_only_missing_thumbnails(self):
+        reports = []
+        stats = warm_album_thumbnails(self.album, self.drive, workers=3, progress=reports.append)
+
+        self.assertEqual((stats['total'], stats['generated'], stats['failed']), (5, 5, 0))
+        self.assertEqual(len(reports), 5)
+        self.assertTrue(all(get_thumbnail_path(f'photo{index}').exists() for index in range(5)))
+
+        stats = warm_album_thumbnails(self.album, self.drive)
+        self.assertEqual((stats['cached'], stats['generated']), (5, 0))
+        self.assertEqual(self.drive.calls.count('get_file_content'), 5)
+
+    def test_thumbnail_links_are_refreshed_in_one_batch(self):
+        fresh = {f'photo{index}': {'thumbnailLink': f'https://lh3.googleusercontent.com/fresh{index}'} for index in range(5)}
+
+        with mock.patch.object(self.drive, 'get_files_metadata', return_value=fresh) as get_files_metadata, \
+                mock.patch.object(self.drive, 'get_thumbnail', return_value=None) as get_thumbnail:
+            warm_album_thumbnails(self.album, self.drive)
+
+        get_files_metadata.assert_called_once()
+        self.assertEqual(
+            sorted(call.args[2] for call in get_thumbnail.call_args_list),
+            sorted(metadata['thumbnailLink'] for metadata in fresh.values()),
+        )
+
+    def test_saving_album_schedules_background_warmup(self):
+        with mock.patch('clients.signals.start_background_warmup') as start:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.album.save()
+
+        start.assert_called_once_with(self.album.pk)
+
+    def test_management_command_reports_progress(self):
+        out = StringIO()
+        with mock.patch('clients.management.commands.warm_drive_thumbnails.get_google_drive_service', return_value=self.drive):
+            call_command('warm_drive_thumbnails', str(self.album.id), workers=2, stdout=out)
+
+        self.assertIn('5/5 thumbnails', out.getvalue())
+        self.assertIn('5 generated, 0 already cached', out.getvalue())
+
+
+class ThumbnailVariantTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.drive = FakeDriveService()
+        self.drive.add('photo', 'photo.jpg')
+        self.drive.contents['photo'] = make_jpeg((2400, 1600))
+
+    def get_thumbnail(self, query='', accept='image/jpeg,*/*'):
+        with mock.patch('clients.views.get_google_drive_service', return_value=self.drive):
+            return self.client.get(f'/api/google-drive/image/photo/?thumbnail=true{query}', headers={'Accept': accept})
+
+    def test_variant_size_is_rounded_up_to_a_configured_size(self):
+        response = self.get_thumbnail('&size=300')
+
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('Accept', response['Vary'])
+        with Image.open(BytesIO(response.content)) as thumbnail:
+            self.assertEqual(thumbnail.size, (400, 267))
+
+    def test_miss_renders_only_the_requested_size(self):
+        response = self.get_thumbnail('&size=200', accept='image/avif,*/*')
+
+        self.assertEqual(response['Content-Type'], 'image/avif')
+        self.assertEqual(
+            sorted(path.name for path in get_thumbnail_cache_dir().rglob('*') if path.is_file()),
+            ['photo_200.avif', 'photo_source.jpg'],
+        )
+
+    def test_misses_of_other_sizes_and_formats_do_not_download_again(self):
+        for query, accept in [('&size=200', 'image/avif,*/*'), ('&size=400', 'image/webp,*/*'), ('', 'image/jpeg,*/*')]:
+            self.assertEqual(self.get_thumbnail(query, accept=accept).status_code, 200)
+
+        self.assertEqual(self.drive.calls.count('get_file_content'), 1)
+        with Image.open(get_thumbnail_path('photo', 400, 'webp')) as thumbnail:
+            self.assertEqual(thumbnail.size, (400, 267))
+
+    def test_source_is_dropped_once_every_variant_exists(self):
+        with override_settings(THUMBNAIL_SIZES=[200, 400], THUMBNAIL_FORMATS=['jpeg']):
+            self.get_thumbnail('&size=200')
+            self.assertTrue(get_thumbnail_source_path('photo').exists())
+
+            self.get_thumbnail('&size=400')
+
+        self.assertFalse(get_thumbnail_source_path('photo').exists())
+        self.assertEqual(self.drive.calls.count('get_file_content'), 1)
+
+    def test_accept_quality_values_are_honoured(self):
+        cases = [
+            ('image/avif;q=0,image/webp,*/*', 'webp'),
+            ('image/avif;q=0.5,image/webp;q=0.8,*/*;q=0.1', 'webp'),
+            ('image/webp;q=0.5,image/jpeg', 'jpeg'),
+            ('image/webp;q=0,image/*', 'jpeg'),
+            ('image/avif,image/webp,image/apng,image/*,*/*;q=0.8', 'avif'),
+            ('text/html', 'jpeg'),
+            ('', 'jpeg'),
+        ]
+        for accept, fmt in cases:
+            with self.subTest(accept=accept):
+                self.assertEqual(negotiate_thumbnail_format(accept), fmt)
+
+    def test_format_is_negotiated_from_accept(self):
+        cases = [
+            ('image/avif,image/webp,*/*', 'image/avif', 'AVIF'),
+            ('image/webp,*/*', 'image/webp', 'WEBP'),
+            ('*/*', 'image/jpeg', 'JPEG'),
+        ]
+        for accept, mime_type, pil_format in cases:
+            with self.subTest(accept=accept):
+                response = self.get_thumbnail(accept=accept)
+
+                self.assertEqual(response['Content-Type'], mime_type)
+                with Image.open(BytesIO(response.content)) as thumbnail:
+                    self.assertEqual(thumbnail.format, pil_format)
+                    self.assertEqual(thumbnail.width, 800)
+
+    @override_settings(THUMBNAIL_FORMATS=['webp', 'jpeg'])
+    def test_disabled_formats_are_not_served(self):
+        response = self.get_thumbnail(accept='image/avif,image/webp,*/*')
+
+        self.assertEqual(response['Content-Type'], 'image/webp')
+
+    def test_serializer_emits_srcset(self):
+        from backend.serializers import GoogleDriveImageSerializer
+        image = {'id': 'photo', 'name': 'photo.jpg', 'mimeType': 'image/jpeg', 'downloadLink': '', 'directLink': ''}
+
+        srcset = GoogleDriveImageSerializer(image).data['thumbnailSrcset']
+
+        self.assertEqual(srcset.split(', ')[0], '/api/google-drive/image/photo/?thumbnail=true&size=200 200w')
+        self.assertTrue(srcset.endswith('size=1600 1600w'))
+
+
+class DriveThumbnailSourceTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.drive = FakeDriveService()
+        self.drive.add('photo', 'photo.jpg', thumbnailLink='https://lh3.example.com/abc=s220')
+        self.drive.contents['photo'] = make_jpeg((2400, 1600))
+        self.drive.thumbnails['photo'] = make_jpeg((1600, 1067))
+
+    def get_thumbnail(self):
+        with mock.patch('clients.views.get_google_drive_service', return_value=self.drive):
+            return self.client.get('/api/google-drive/image/photo/?thumbnail=true&size=400')
+
+    def test_thumbnails_are_rendered_from_drive_rendition(self):
+        response = self.get_thumbnail()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('get_thumbnail', self.drive.calls)
+        self.assertNotIn('get_file_content', self.drive.calls)
+        with Image.open(BytesIO(response.content)) as thumbnail:
+            self.assertEqual(thumbnail.size, (400, 267))
+
+    def test_falls_back_to_original_without_drive_thumbnail(self):
+        del self.drive.thumbnails['photo']
+
+        response = self.get_thumbnail()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.drive.calls.count('get_file_content'), 1)
+
+    @override_settings(THUMBNAIL_SOURCE='original')
+    def test_original_source_skips_drive_thumbnail(self):
+        self.get_thumbnail()
+
+        self.assertNotIn('get_thumbnail', self.drive.calls)
+        self.assertEqual(self.drive.calls.count('get_file_content'), 1)
+
+    def test_service_refreshes_expired_thumbnail_link(self):
+        drive_service = google_drive.GoogleDriveService(api_key='test-key')
+        http = HttpMockSequence([
+            ({'status': '403', 'content-type': 'text/html'}, b'expired'),
+            ({'status': '200'}, b'{"id": "photo", "thumbnailLink": "https://lh3.example.com/new=s220"}'),
+            ({'status': '200', 'content-type': 'image/jpeg'}, b'jpeg'),
+        ])
+        drive_service._local.service = build_from_document(google_drive.get_discovery_document(), http=http)
+        drive_service._local.http = http
+
+        with mock.patch.object(http, 'request', wraps=http.request) as request:
+            content = drive_service.get_thumbnail('photo', 1600, 'https://lh3.example.com/old=s220')
+
+        self.assertEqual(content, b'jpeg')
+        self.assertEqual(request.call_args_list[0].args[0], 'https://lh3.example.com/old=s1600')
+        self.assertEqual(request.call_args_list[2].args[0], 'https://lh3.example.com/new=s1600')
+
+
+class ThumbnailPipelineTests(TestCase):
+    def test_jpeg_is_decoded_at_reduced_resolution(self):
+        image = prepare_image(make_jpeg((6000, 4000)), 800)
+
+        # 1/4 DCT scale is the smallest one still covering 800 px
+        self.assertEqual(image.size, (1500, 1000))
+        self.assertEqual(image.mode, 'RGB')
+
+    def test_other_formats_are_box_reduced(self):
+        buffer = BytesIO()
+        Image.new('RGBA', (3000, 1000), (0, 0, 255, 0)).save(buffer, 'PNG')
+
+        image = prepare_image(buffer.getvalue(), 400)
+
+        self.assertEqual(image.size, (429, 143))
+        # Transparent areas are flattened onto white
+        self.assertEqual(image.getpixel((0, 0)), (255, 255, 255))
+
+    def test_exif_orientation_is_applied(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees clockwise
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 900)).save(buffer, 'JPEG', exif=exif)
+
+        image = prepare_image(buffer.getvalue(), 1600)
+
+        self.assertEqual(image.size, (900, 1200))
+
+    def test_variants_keep_the_prepared_aspect_ratio(self):
+        image = prepare_image(make_jpeg((2400, 1600)), 1600)
+
+        sizes = {size: variant.size for size, variant in render_variants(image, [200, 800, 1600])}
+
+        self.assertEqual(sizes, {1600: (1600, 1067), 800: (800, 533), 200: (200, 133)})
+
+
+class ZipStreamTests(MediaRootTestCase):
+    def write_file(self, name, content):
+        path = Path(self.media_root) / name
+        path.write_bytes(content)
+        return str(path)
+
+    def build(self, archive):
+        data = b''.join(archive)
+        return data, zipfile.ZipFile(BytesIO(data))
+
+    def test_entries_are_stored_or_deflated_by_format(self):
+        archive = ZipStream(chunk_size=7)
+        archive.add_file(self.write_file('photo.jpg', make_jpeg()))
+        archive.add_file(self.write_file('notes.txt', b'hello ' * 1000))
+
+        data, zip_file = self.build(archive)
+
+        self.assertIsNone(zip_file.testzip())
+        self.assertEqual(zip_file.getinfo('photo.jpg').compress_type, zipfile.ZIP_STORED)
+        self.assertEqual(zip_file.getinfo('notes.txt').compress_type, zipfile.ZIP_DEFLATED)
+        self.assertEqual(zip_file.read('notes.txt'), b'hello ' * 1000)
+        self.assertIsNone(archive.content_length())
+
+    def test_content_length_of_stored_archive_is_exact(self):
+        archive = ZipStream()
+        for index in range(3):
+            archive.add_file(self.write_file(f'{index}.jpg', make_jpeg()), 'photo.jpg')
+
+        data, zip_file = self.build(archive)
+
+        self.assertEqual(archive.content_length(), len(data))
+        self.assertEqual(zip_file.namelist(), ['photo.jpg', 'photo (1).jpg', 'photo (2).jpg'])
+
+    def test_zip64_records_are_written_past_the_limits(self):
+        with mock.patch.multiple(zip_stream, ZIP64_LIMIT=100, ZIP64_COUNT_LIMIT=2):
+            archive = ZipStream()
+            for index in range(3):
+                archive.add_stream(f'{index}.jpg', lambda index=index: [bytes([index]) * 150], size=150)
+            data, zip_file = self.build(archive)
+            self.assertEqual(archive.content_length(), len(data))
+
+        self.assertIsNone(zip_file.testzip())
+        self.assertEqual([info.file_size for info in zip_file.infolist()], [150, 150, 150])
+        self.assertEqual(zip_file.read('2.jpg'), b'\x02' * 150)
+
+    @override_settings(ALBUM_ARCHIVE_PREBUILD=False)
+    def test_download_album_streams_archive(self):
+        album = ClientAlbum.objects.create(title='Wedding Day')
+        for name in ('a.jpg', 'b.jpg'):
+            AlbumImage.objects.create(album=album, image=ContentFile(make_jpeg(), name=name))
+
+        link = self.client.post('/api/download-album/', {'album_id': str(album.id), 'pin': album.pin}).json()
+        response = self.client.get(link['url'])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('album_Wedding_Day.zip', response['Content-Disposition'])
+        data = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(data))
+        self.assertEqual(len(zipfile.ZipFile(BytesIO(data)).namelist()), 2)
+
+
+class ClientAlbumApiTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        for index in range(3):
+            album = ClientAlbum.objects.create(title=f'Album {index}')
+            for name in ('cover.jpg', 'other.jpg')[:index]:
+                AlbumImage.objects.create(album=album, image=ContentFile(make_jpeg((10, 10)), name=name))
+
+    def test_list_returns_summaries_in_constant_queries(self):
+        # One count query and one page query, however many albums and images
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/albums/', {'page_size': 2})
+
+        data = response.json()
+        self.assertEqual(data['count'], 3)
+        self.assertIsNotNone(data['next'])
+        self.assertEqual([album['image_count'] for album in data['results']], [2, 1])
+        self.assertNotIn('images', data['results'][0])
+        self.assertTrue(data['results'][0]['cover_image'].startswith('http://testserver/media/client_albums/cover'))
+
+    def test_album_without_images_has_no_cover(self):
+        response = self.client.get('/api/albums/', {'page': 2, 'page_size': 2})
+
+        self.assertEqual(response.json()['results'][0]['cover_image'], None)
+
+    def test_detail_prefetches_images(self):
+        album = ClientAlbum.objects.get(title='Album 2')
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/albums/{album.id}/')
+
+        self.assertEqual(len(response.json()['images']), 2)
+
+
+class ImageDerivativeTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.album = ClientAlbum.objects.create(title='School')
+
+    def add_image(self, size=(3000, 2000), name='photo.jpg'):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = AlbumImage.objects.create(album=self.album, image=ContentFile(make_jpeg(size), name=name))
+        image.refresh_from_db()
+        return image
+
+    def open_derivative(self, image, derivative, fmt):
+        return Image.open(image.image.storage.open(image.derivatives[derivative][fmt]))
+
+    def test_upload_renders_derivatives_once_saved(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            image = AlbumImage.objects.create(album=self.album, image=ContentFile(make_jpeg((3000, 2000)), name='photo.jpg'))
+        self.assertEqual(image.derivatives, {})
+        self.assertEqual(image.thumbnail_url, image.image.url)
+
+        for callback in callbacks:
+            callback()
+        image.refresh_from_db()
+
+        self.assertEqual(
+            {name: (entry['width'], entry['height']) for name, entry in image.derivatives.items()},
+            {'thumbnail': (400, 267), 'medium': (1200, 800), 'large': (2048, 1365)},
+        )
+        thumbnail = self.open_derivative(image, 'thumbnail', 'jpeg')
+        self.assertEqual(thumbnail.size, (400, 267))
+        self.assertTrue(thumbnail.info.get('progressive'))
+        self.assertEqual(self.open_derivative(image, 'medium', 'webp').format, 'WEBP')
+
+    def test_small_originals_are_not_upscaled(self):
+        image = self.add_image((300, 200))
+
+        self.assertEqual({(entry['width'], entry['height']) for entry in image.derivatives.values()}, {(300, 200)})
+
+    def test_replacing_image_replaces_derivatives(self):
+        image = self.add_image()
+        old_names = [entry['jpeg'] for entry in image.derivatives.values()]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.image = ContentFile(make_jpeg((800, 600)), name='other.jpg')
+            image.save()
+        image.refresh_from_db()
+
+        self.assertEqual(image.derivatives['large']['width'], 800)
+        self.assertFalse(any(image.image.storage.exists(name) for name in old_names))
+
+    def test_renditions_of_an_image_replaced_meanwhile_are_discarded(self):
+        image = self.add_image((800, 600))
+        rendered = {'thumbnail': {'width': 1, 'height': 1, 'jpeg': 'client_albums/derivatives/x.jpg'}}
+
+        def replace_while_rendering(field_file):
+            AlbumImage.objects.filter(pk=image.pk).update(image='client_albums/other.jpg')
+            return rendered
+
+        with mock.patch('backend.derivatives.ThreadPoolExecutor') as executor, \
+                mock.patch('backend.derivatives.generate_derivatives', side_effect=replace_while_rendering), \
+                mock.patch('backend.derivatives.delete_derivatives') as delete:
+            # Render on this thread, which shares the test database connection
+            executor.return_value.__enter__.return_value.map.side_effect = map
+            updated = render_derivatives(AlbumImage, [image.pk])
+
+        self.assertEqual(updated, 0)
+        self.assertEqual(AlbumImage.objects.get(pk=image.pk).derivatives, image.derivatives)
+        delete.assert_called_once_with(image.image.storage, rendered)
+
+    def test_deleting_image_deletes_derivatives(self):
+        image = self.add_image((800, 600))
+        names = [entry[fmt] for entry in image.derivatives.values() for fmt in ('webp', 'jpeg')]
+        self.assertTrue(all(image.image.storage.exists(name) for name in names))
+
+        with mock.patch('clients.signals.schedule_archive_build'), self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+
+        self.assertFalse(any(image.image.storage.exists(name) for name in names))
+
+    def test_bulk_ingest_renders_derivatives_once_committed(self):
+        upload = SimpleUploadedFile('ana.jpg', make_jpeg((1000, 1000)), content_type='image/jpeg')
+
+        with mock.patch('clients.ingest.schedule_archive_build'), self.captureOnCommitCallbacks(execute=True):
+            ingest_album_uploads(self.album, [upload])
+
+        self.assertEqual(self.album.images.get().derivatives['thumbnail']['width'], 400)
+
+    def test_api_links_derivatives(self):
+        image = self.add_image((800, 600))
+
+        data = AlbumImageSerializer(image, context={'request': RequestFactory().get('/')}).data
+
+        self.assertEqual(data['derivatives']['thumbnail']['width'], 400)
+        self.assertRegex(data['derivatives']['thumbnail']['webp'], r'^http://testserver/media/client_albums/derivatives/.+\.webp$')
+        self.assertTrue(data['image'].endswith('.jpg'))
+
+    def test_backfill_command_renders_missing_derivatives(self):
+        with override_settings(IMAGE_DERIVATIVES_ON_UPLOAD=False):
+            image = self.add_image((800, 600))
+        self.assertEqual(image.derivatives, {})
+        self.assertEqual(image.thumbnail_url, image.image.url)
+
+        call_command('generate_image_derivatives', stdout=StringIO())
+
+        image.refresh_from_db()
+        self.assertEqual(image.derivatives['medium']['width'], 800)
+        self.assertNotEqual(image.thumbnail_url, image.image.url)
+
+
+class ClientAlbumAdminTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+
+    def add_album(self, images):
+        album = ClientAlbum.objects.create(title=f'Album {ClientAlbum.objects.count()}')
+        for index in range(images):
+            AlbumImage.objects.create(album=album, image=ContentFile(make_jpeg((10, 10)), name=f'{index}.jpg'))
+        return album
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/clients/clientalbum/', {'o': '-3'})
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_changelist_query_count_does_not_grow_with_albums(self):
+        self.add_album(1)
+        baseline, _ = self.changelist_queries()
+        for images in (2, 3, 0):
+            self.add_album(images)
+
+        queries, response = self.changelist_queries()
+
+        self.assertEqual(queries, baseline)
+        # Sorted by image count, largest album first
+        self.assertEqual(response.context['cl'].result_list[0].image_total, 3)
+
+    def test_image_size_is_recorded_on_upload(self):
+        content = make_jpeg((10, 10))
+        album = self.add_album(0)
+
+        image = AlbumImage.objects.create(album=album, image=ContentFile(content, name='a.jpg'))
+
+        self.assertEqual(image.size, len(content))
+
+
+class QueryPlanTests(MediaRootTestCase):
+    """Hot lookups must be answered from an index, never a full table scan."""
+
+    def assertUsesIndex(self, queryset, index_name=None):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest(f"No query plan checks for {connection.vendor}")
+        if connection.vendor == 'postgresql':
+            # Tiny test tables would otherwise always be scanned
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+        # Walking an index in order ("SCAN table USING INDEX") is fine, reading the table is not
+        full_scan = rf'SCAN {queryset.model._meta.db_table}(?! USING)' if connection.vendor == 'sqlite' else r'Seq Scan'
+        self.assertNotRegex(plan, full_scan)
+        if index_name:
+            self.assertIn(index_name, plan)
+        return plan
+
+    def test_pin_verification_uses_primary_key(self):
+        album = ClientAlbum.objects.create(title='School')
+
+        self.assertUsesIndex(ClientAlbum.objects.filter(id=album.id, pin=album.pin))
+
+    def test_title_probes_use_title_index(self):
+        self.assertUsesIndex(ClientAlbum.objects.filter(title='School 2'), 'clients_album_title')
+
+    def test_album_images_are_read_in_index_order(self):
+        album = ClientAlbum.objects.create(title='School')
+
+        plan = self.assertUsesIndex(album.images.all(), 'clients_albumimage_listing')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_album_list_is_read_in_index_order(self):
+        plan = self.assertUsesIndex(ClientAlbum.objects.order_by('-created_at', 'id')[:24], 'clients_album_created')
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_drive_folder_lookup_uses_folder_index(self):
+        self.assertUsesIndex(
+            GoogleDriveAlbum.objects.filter(folder_id=FOLDER_ID).order_by('created_at')[:1],
+            'clients_drivealbum_folder',
+        )
+
+
+class BulkIngestTests(MediaRootTestCase):
+    def upload(self, name):
+        return SimpleUploadedFile(name, make_jpeg((10, 10)), content_type='image/jpeg')
+
+    def test_titles_are_resolved_in_one_query(self):
+        for title in ('Ana', 'Ana 2', 'Mihai'):
+            ClientAlbum.objects.create(title=title)
+
+        with self.assertNumQueries(1):
+            titles = resolve_unique_titles(['Ana', 'Mihai', 'Ioana'])
+
+        self.assertEqual(titles, {'Ana': 'Ana 3', 'Mihai': 'Mihai 2', 'Ioana': 'Ioana'})
+
+    def test_long_title_sequences_are_probed_in_growing_windows(self):
+        ClientAlbum.objects.bulk_create(
+            [ClientAlbum(title='Ana')] + [ClientAlbum(title=f'Ana {counter}') for counter in range(2, 10)]
+            + [ClientAlbum(title='Ana 2 2')]
+        )
+
+        # Ana .. Ana 4, then Ana 5 .. Ana 12
+        with self.assertNumQueries(2):
+            titles = resolve_unique_titles(['Ana', 'Ana 2', 'Mihai'])
+
+        self.assertEqual(titles, {'Ana': 'Ana 10', 'Ana 2': 'Ana 2 3', 'Mihai': 'Mihai'})
+
+    def test_titles_are_looked_up_by_exact_match(self):
+        with CaptureQueriesContext(connection) as queries:
+            resolve_unique_titles(['Ana'])
+
+        self.assertNotIn('LIKE', queries[0]['sql'])
+        self.assertIn('"title" IN', queries[0]['sql'])
+
+    def test_grouped_uploads_are_stored_in_bulk(self):
+        ClientAlbum.objects.create(title='Ana')
+        groups = {
+            'Ana': [self.upload('ana (1).jpg'), self.upload('ana (2).jpg')],
+            'Mihai': [self.upload('mihai.jpg')],
+        }
+
+        # Title lookup, then album and image INSERTs inside a savepoint
+        with self.assertNumQueries(5):
+            report = ingest_grouped_uploads(groups, workers=4)
+
+        self.assertEqual([album.title for album in report.albums_created], ['Ana 2', 'Mihai'])
+        self.assertEqual(report.images, 3)
+        self.assertEqual(set(report.timings), {'titles', 'files', 'database'})
+        album = ClientAlbum.objects.get(title='Ana 2')
+        self.assertTrue(album.qr_code.storage.exists(album.qr_code.name))
+        images = list(album.images.all())
+        self.assertEqual([image.filename for image in images], ['ana_1.jpg', 'ana_2.jpg'])
+        self.assertTrue(all(image.size and os.path.exists(image.image.path) for image in images))
+
+    def test_new_images_refresh_album_archive(self):
+        album = ClientAlbum.objects.create(title='School')
+
+        with mock.patch('clients.ingest.schedule_archive_build') as schedule, \
+                self.captureOnCommitCallbacks(execute=True):
+            ingest_album_uploads(album, [self.upload('a.jpg')])
+
+        schedule.assert_called_once_with(album.id)
+
+    def test_stored_files_are_removed_when_insert_fails(self):
+        album = ClientAlbum.objects.create(title='School')
+
+        with mock.patch.object(AlbumImage.objects, 'bulk_create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                ingest_album_uploads(album, [self.upload('a.jpg')])
+
+        # Neither the original nor its derivatives are left behind
+        self.assertEqual([path for path in Path(self.media_root, 'client_albums').rglob('*') if path.is_file()], [])
+
+
+class ChunkedUploadTests(MediaRootTestCase):
+    url = '/admin/clients/clientalbum/uploads/'
+
+    def setUp(self):
+        super().setUp()
+        upload_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, upload_dir, ignore_errors=True)
+        upload_override = override_settings(CHUNKED_UPLOAD_DIR=Path(upload_dir))
+        upload_override.enable()
+        self.addCleanup(upload_override.disable)
+        user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.client.force_login(user)
+        self.contents = {'ana (1).jpg': make_jpeg((40, 40)), 'ana (2).jpg': make_jpeg((30, 30)), 'mihai.jpg': make_jpeg((20, 20))}
+
+    def start(self, chunk_size=256, **data):
+        files = [{'name': name, 'size': len(content)} for name, content in self.contents.items()]
+        with override_settings(CHUNKED_UPLOAD_CHUNK_SIZE=chunk_size):
+            response = self.client.post(self.url, json.dumps({'files': files, **data}), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    def put_chunk(self, batch, file, index, body=None):
+        if body is None:
+            start = index * batch['chunk_size']
+            body = self.contents[file['name']][start:start + batch['chunk_size']]
+        return self.client.put(
+            f"{self.url}{batch['id']}/files/{file['id']}/chunks/{index}/", body, content_type='application/octet-stream'
+        )
+
+    def put_all_chunks(self, batch):
+        for file in batch['files']:
+            # Out of order, as parallel uploads may deliver them
+            for index in reversed(range(file['total_chunks'])):
+                self.assertEqual(self.put_chunk(batch, file, index).status_code, 200)
+
+    def run_completion(self, batch_id):
+        # What the background thread does, minus closing the test's connection
+        try:
+            complete_upload_batch(UploadBatch.objects.get(pk=batch_id))
+        except Exception:
+            pass
+
+    def complete(self, batch):
+        url = f"{self.url}{batch['id']}/complete/"
+        with mock.patch('clients.ingest.schedule_archive_build'), \
+                mock.patch('clients.uploads.start_background_completion', side_effect=self.run_completion), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url)
+        if response.status_code != 202:
+            return response
+        # Processed in the background; the next call returns the result
+        return self.client.post(url)
+
+    def test_chunks_are_assembled_into_albums(self):
+        batch = self.start(school='Scoala 8')
+        self.put_all_chunks(batch)
+
+        response = self.complete(batch)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['albums_created'], ['Ana (Scoala 8)', 'Mihai (Scoala 8)'])
+        self.assertEqual(response.json()['redirect'], '/admin/clients/clientalbum/')
+        images = AlbumImage.objects.filter(album__title='Ana (Scoala 8)')
+        self.assertEqual(sorted(image.size for image in images), sorted([len(self.contents['ana (1).jpg']), len(self.contents['ana (2).jpg'])]))
+        for image in images:
+            with image.image.open('rb') as stored:
+                self.assertIn(stored.read(), self.contents.values())
+        self.assertFalse(get_batch_dir(batch['id']).exists())
+
+    def test_upload_into_album(self):
+        album = ClientAlbum.objects.create(title='School')
+        batch = self.start(album=str(album.id))
+        self.put_all_chunks(batch)
+
+        response = self.complete(batch)
+
+        self.assertEqual(response.json()['redirect'], f'/admin/clients/clientalbum/{album.id}/change/')
+        self.assertEqual(album.images.count(), 3)
+        self.assertEqual(ClientAlbum.objects.count(), 1)
+
+    def test_status_lists_received_chunks_to_resume(self):
+        batch = self.start()
+        file = batch['files'][0]
+        self.assertGreater(file['total_chunks'], 2)
+        self.put_chunk(batch, file, 1)
+
+        status = self.client.get(f"{self.url}{batch['id']}/").json()
+
+        self.assertEqual(status['files'][0]['received'], [1])
+        self.assertEqual(status['files'][1]['received'], [])
+        self.assertEqual(self.complete(batch).status_code, 400)
+        self.assertEqual(AlbumImage.objects.count(), 0)
+
+    def test_chunk_of_wrong_length_is_rejected(self):
+        batch = self.start()
+        file = batch['files'][0]
+
+        self.assertEqual(self.put_chunk(batch, file, 0, b'short').status_code, 400)
+        self.assertEqual(self.put_chunk(batch, file, 0, b'x' * 257).status_code, 400)
+        self.assertEqual(self.put_chunk(batch, file, file['total_chunks']).status_code, 400)
+
+        self.assertEqual(self.client.get(f"{self.url}{batch['id']}/").json()['files'][0]['received'], [])
+
+    def test_completing_twice_ingests_once(self):
+        batch = self.start()
+        self.put_all_chunks(batch)
+        first = self.complete(batch).json()
+
+        second = self.complete(batch).json()
+
+        self.assertEqual(first, second)
+        self.assertEqual(AlbumImage.objects.count(), 3)
+
+    def test_completion_is_queued_for_the_background(self):
+        batch = self.start()
+        self.put_all_chunks(batch)
+
+        with mock.patch('clients.uploads.start_background_completion') as start, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"{self.url}{batch['id']}/complete/")
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['state'], 'processing')
+        start.assert_called_once_with(UploadBatch.objects.get().pk)
+        self.assertEqual(AlbumImage.objects.count(), 0)
+        file = batch['files'][0]
+        self.assertEqual(self.put_chunk(batch, file, 0).status_code, 400)
+        self.assertEqual(self.client.get(f"{self.url}{batch['id']}/").json()['state'], 'processing')
+
+    def test_failed_ingest_can_be_retried(self):
+        batch = self.start()
+        self.put_all_chunks(batch)
+
+        with mock.patch('clients.uploads.open_uploaded_file', side_effect=OSError('Disk full')), \
+                mock.patch('clients.uploads.start_background_completion', side_effect=self.run_completion), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{self.url}{batch['id']}/complete/")
+        status = self.client.get(f"{self.url}{batch['id']}/").json()
+        self.assertEqual((status['state'], status['error']), ('failed', 'Disk full'))
+
+        response = self.complete(batch)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AlbumImage.objects.count(), 3)
+
+    def test_interrupted_processing_can_be_completed_again(self):
+        batch = self.start()
+        self.put_all_chunks(batch)
+        # The worker dies before its background thread runs
+        with mock.patch('clients.uploads.start_background_completion'), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{self.url}{batch['id']}/complete/")
+        self.assertEqual(self.client.get(f"{self.url}{batch['id']}/").json()['state'], 'processing')
+
+        UploadBatch.objects.update(processing_started_at=timezone.now() - timedelta(hours=2))
+        status = self.client.get(f"{self.url}{batch['id']}/").json()
+        self.assertEqual(status['state'], 'failed')
+        self.assertTrue(status['error'])
+
+        response = self.complete(batch)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AlbumImage.objects.count(), 3)
+
+    def test_timed_out_processing_is_claimed_again_on_completion(self):
+        batch = self.start()
+        self.put_all_chunks(batch)
+        UploadBatch.objects.update(state=UploadBatch.PROCESSING, processing_started_at=timezone.now())
+        with mock.patch('clients.uploads.start_background_completion') as start, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f"{self.url}{batch['id']}/complete/")
+        start.assert_not_called()
+
+        UploadBatch.objects.update(processing_started_at=timezone.now() - timedelta(hours=2))
+        response = self.complete(batch)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AlbumImage.objects.count(), 3)
+
+    def test_batches_are_not_capped_by_multipart_file_limit(self):
+        self.contents = {f'ana ({index}).jpg': b'x' for index in range(600)}
+
+        with override_settings(DATA_UPLOAD_MAX_NUMBER_FILES=500, CHUNKED_UPLOAD_MAX_FILES=1000):
+            batch = self.start()
+        self.assertEqual(len(batch['files']), 600)
+
+        with override_settings(CHUNKED_UPLOAD_MAX_FILES=100):
+            files = [{'name': 'a.jpg', 'size': 1}] * 101
+            response = self.client.post(self.url, json.dumps({'files': files}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_batches_are_deleted(self):
+        batch = self.start()
+        self.put_chunk(batch, batch['files'][0], 0)
+        UploadBatch.objects.update(created_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(delete_stale_upload_batches(), 1)
+
+        self.assertFalse(UploadBatch.objects.exists())
+        self.assertFalse(get_batch_dir(batch['id']).exists())
+
+    def test_batches_being_processed_are_not_deleted(self):
+        batch = self.start()
+        self.put_chunk(batch, batch['files'][0], 0)
+        UploadBatch.objects.update(
+            created_at=timezone.now() - timedelta(days=2),
+            state=UploadBatch.PROCESSING, processing_started_at=timezone.now(),
+        )
+
+        self.assertEqual(delete_stale_upload_batches(), 0)
+        self.assertTrue(get_batch_dir(batch['id']).exists())
+
+        UploadBatch.objects.update(processing_started_at=timezone.now() - timedelta(hours=2))
+        self.assertEqual(delete_stale_upload_batches(), 1)
+
+
+class AlbumArchiveTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.album = ClientAlbum.objects.create(title='School')
+        for name in ('a.jpg', 'b.jpg'):
+            self.add_image(name)
+
+    def add_image(self, name):
+        return AlbumImage.objects.create(album=self.album, image=ContentFile(make_jpeg(), name=name))
+
+    def get_link(self, pin=None):
+        response = self.client.post('/api/download-album/', {'album_id': str(self.album.id), 'pin': pin or self.album.pin})
+        self.assertEqual(response.status_code, 200)
+        return response.json()['url']
+
+    def download(self, **headers):
+        return self.client.get(self.get_link(), headers=headers)
+
+    def test_first_download_schedules_build(self):
+        with mock.patch('clients.views.schedule_archive_build') as schedule:
+            response = self.download()
+
+        self.assertTrue(response.streaming)
+        schedule.assert_called_once_with(self.album.id, delay=0)
+
+    def test_prebuilt_archive_is_served_with_ranges(self):
+        archive_path = build_album_archive(self.album)
+        data = archive_path.read_bytes()
+
+        response = self.download()
+        self.assertEqual(b''.join(response.streaming_content), data)
+        self.assertEqual(response['ETag'], f'"{get_album_version(self.album)}"')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+        response = self.download(Range='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 100-199/{len(data)}')
+        self.assertEqual(b''.join(response.streaming_content), data[100:200])
+
+        # Resuming a download of an older version restarts it
+        response = self.download(Range='bytes=100-199', If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), data)
+
+        response = self.download(If_None_Match=f'"{get_album_version(self.album)}"')
+        self.assertEqual(response.status_code, 304)
+
+    def test_download_links_need_the_pin_and_expire(self):
+        self.assertEqual(
+            self.client.post('/api/download-album/', {'album_id': str(self.album.id), 'pin': 'wrong'}).status_code, 400
+        )
+        url = self.get_link()
+        self.assertNotIn(self.album.pin, url)
+
+        self.assertEqual(self.client.get(url.replace('/download-album/', '/download-album/x')).status_code, 403)
+        with override_settings(ALBUM_DOWNLOAD_LINK_TTL=-1):
+            self.assertEqual(self.client.get(url).status_code, 403)
+        # Changing the PIN revokes the links handed out for the old one
+        ClientAlbum.objects.filter(pk=self.album.pk).update(pin='1234' if self.album.pin != '1234' else '4321')
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_archives_are_kept_out_of_public_media(self):
+        archive_path = build_album_archive(self.album)
+
+        self.assertFalse(archive_path.resolve().is_relative_to(Path(self.media_root).resolve()))
+        response = self.client.get('/api/download-album/', {'album_id': str(self.album.id), 'pin': self.album.pin})
+        self.assertEqual(response.status_code, 405)
+
+    def test_image_changes_invalidate_archive(self):
+        old_path = build_album_archive(self.album)
+
+        with mock.patch('clients.signals.schedule_archive_build') as schedule:
+            with self.captureOnCommitCallbacks(execute=True):
+                image = self.add_image('c.jpg')
+
+        self.assertFalse(old_path.exists())
+        schedule.assert_called_once_with(self.album.id)
+        new_path = build_album_archive(self.album)
+        self.assertNotEqual(new_path, old_path)
+        self.assertEqual(len(zipfile.ZipFile(new_path).namelist()), 3)
+
+        with mock.patch('clients.signals.schedule_archive_build'):
+            with self.captureOnCommitCallbacks(execute=True):
+                image.delete()
+        self.assertFalse(get_archive_path(self.album.id, get_album_version(self.album)).exists())
+        self.assertEqual(list(get_archive_dir(self.album.id).glob('*.zip')), [])
+
+
+class DriveAlbumDownloadTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.album = GoogleDriveAlbum.objects.create(
+            title='School Trip',
+            folder_link=f'https://drive.google.com/drive/folders/{FOLDER_ID}',
+        )
+        self.drive = FakeDriveService()
+        for index in range(6):
+            self.drive.add(f'photo{index}', f'{index}.jpg', size=str(10 + index))
+            self.drive.contents[f'photo{index}'] = bytes([index]) * (10 + index)
+
+    def download(self):
+        with mock.patch('clients.views.get_google_drive_service', return_value=self.drive):
+            return self.client.get(f'/api/drive-albums/{self.album.id}/download/')
+
+    def test_album_is_streamed_in_order_with_known_length(self):
+        response = self.download()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('album_School_Trip.zip', response['Content-Disposition'])
+        data = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(data))
+        zip_file = zipfile.ZipFile(BytesIO(data))
+        self.assertEqual(zip_file.namelist(), [f'{index}.jpg' for index in range(6)])
+        self.assertEqual(zip_file.read('5.jpg'), b'\x05' * 15)
+
+    def test_prefetcher_bounds_concurrency_and_keeps_order(self):
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def fetch(item):
+            with lock:
+                running.append(item)
+                peak.append(len(running))
+            time.sleep(0.02 * (5 - item))
+            with lock:
+                running.remove(item)
+            return item
+
+        prefetcher = OrderedPrefetcher(list(range(6)), fetch, workers=3)
+        results = [prefetcher.get(index) for index in range(6)]
+        prefetcher.close()
+
+        self.assertEqual(results, list(range(6)))
+        self.assertLessEqual(max(peak), 3)
+
+
+    def test_closing_prefetcher_does_not_wait_for_downloads(self):
+        release = threading.Event()
+        buffers = []
+
+        def fetch(item):
+            release.wait(5)
+            buffers.append(BytesIO(b'x'))
+            return buffers[-1]
+
+        prefetcher = OrderedPrefetcher(list(range(6)), fetch, workers=2)
+        prefetcher._futures[0] = prefetcher._pool.submit(fetch, 0)
+        prefetcher._futures[1] = prefetcher._pool.submit(fetch, 1)
+        prefetcher._futures[2] = prefetcher._pool.submit(fetch, 2)
+        started = time.monotonic()
+        prefetcher.close()
+
+        self.assertLess(time.monotonic() - started, 1)
+        release.set()
+        prefetcher._pool.shutdown(wait=True)
+        # The queued download was cancelled, the buffers of the running ones released
+        self.assertEqual(len(buffers), 2)
+        self.assertTrue(all(buffer.closed for buffer in buffers))
+
+class AsyncDriveViewTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = bytes(range(10))
+        self.requests = []
+        self.drive = AsyncGoogleDriveService(
+            google_drive.GoogleDriveService(api_key='test-key'), transport=httpx.MockTransport(self.handle)
+        )
+        self.factory = AsyncRequestFactory()
+
+    def handle(self, request):
+        """Answer like the Drive v3 files endpoint for a single 10-byte file."""
+        self.requests.append(request)
+        if request.url.path == '/drive/v3/files':
+            token = request.url.params.get('pageToken')
+            files = [{'id': f'photo{token or 0}', 'name': 'a.jpg', 'mimeType': 'image/jpeg'}]
+            return httpx.Response(200, json={'files': files, **({} if token else {'nextPageToken': '1'})})
+        if request.url.params.get('alt') == 'media':
+            byte_range = request.headers.get('Range')
+            if byte_range:
+                start, end = (int(value) for value in byte_range[len('bytes='):].split('-'))
+                return httpx.Response(206, content=self.content[start:end + 1])
+            return httpx.Response(200, content=self.content)
+        return httpx.Response(200, json={
+            'id': 'photo', 'name': 'photo.jpg', 'mimeType': 'image/jpeg', 'size': '10',
+            'md5Checksum': 'abc', 'modifiedTime': '2025-01-01T10:00:00.000Z',
+        })
+
+    async def call(self, view, *args, path='/', **headers):
+        with mock.patch('clients.async_views.get_async_google_drive_service', return_value=self.drive):
+            return await view(self.factory.get(path, headers=headers), *args)
+
+    async def test_proxy_streams_ranges_from_drive(self):
+        response = await self.call(async_views.proxy_google_drive_image, 'photo', Range='bytes=2-5')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join([chunk async for chunk in response.streaming_content]), self.content[2:6])
+        self.assertEqual(self.requests[-1].url.params['key'], 'test-key')
+
+    async def test_proxy_renders_thumbnails_off_the_event_loop(self):
+        self.content = make_jpeg()
+
+        response = await self.call(async_views.proxy_google_drive_image, 'photo', path='/?thumbnail=true&size=400')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertTrue(get_thumbnail_path('photo', 400).exists())
+
+    async def test_proxy_answers_revalidation_without_download(self):
+        response = await self.call(async_views.proxy_google_drive_image, 'photo', If_None_Match='"abc"')
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(self.requests), 1)
+
+    async def test_listing_follows_pages(self):
+        response = await self.call(async_views.list_google_drive_images, path='/?folder_id=unknown')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([image['id'] for image in json.loads(response.content)['images']], ['photo0', 'photo1'])
+
+    async def test_album_detail_is_served_from_fresh_mirror(self):
+        album = await GoogleDriveAlbum.objects.acreate(
+            title='School', folder_link=f'https://drive.google.com/drive/folders/{FOLDER_ID}',
+        )
+        await GoogleDriveAlbum.objects.filter(pk=album.pk).aupdate(synced_at=timezone.now())
+        await DriveFile.objects.acreate(album=album, file_id='photo', name='a.jpg', mime_type='image/jpeg')
+
+        response = await self.call(async_views.drive_album_detail, str(album.pk))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([image['id'] for image in json.loads(response.content)['images']], ['photo'])
+        self.assertEqual(self.requests, [])
+
+    async def test_album_detail_pages(self):
+        album = await GoogleDriveAlbum.objects.acreate(
+            title='School', folder_link=f'https://drive.google.com/drive/folders/{FOLDER_ID}',
+        )
+        await GoogleDriveAlbum.objects.filter(pk=album.pk).aupdate(synced_at=timezone.now())
+        for name in ('a.jpg', 'b.jpg'):
+            await DriveFile.objects.acreate(album=album, file_id=name, name=name, mime_type='image/jpeg')
+
+        response = await self.call(async_views.drive_album_detail, str(album.pk), path='/?page_size=1')
+
+        data = json.loads(response.content)
+        self.assertEqual([image['id'] for image in data['images']], ['a.jpg'])
+        self.assertEqual(data['count'], 2)
+        self.assertTrue(data['next_cursor'])
+
+    def test_clients_are_closed_with_their_event_loop(self):
+        async def get_client():
+            return await self.drive.get_client()
+
+        first = asyncio.run(get_client())
+        second = async_to_sync(get_client)()
+
+        self.assertIsNot(first, second)
+        self.assertTrue(first.is_closed)
+        self.assertTrue(second.is_closed)
+
+    async def test_client_can_be_closed_explicitly(self):
+        client = await self.drive.get_client()
+
+        await self.drive.aclose()
+
+        self.assertTrue(client.is_closed)
+        self.assertIsNot(await self.drive.get_client(), client)
+
+
+def batch_response(parts):
+    """Encode a Drive batch response with one JSON part per (request id, status, body)."""
+    boundary = 'batch_boundary'
+    body = ''.join(
+        f'--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-x + {request_id}>\r\n\r\n'
+        f'HTTP/1.1 {status_code} OK\r\nContent-Type: application/json\r\n\r\n{json.dumps(data)}\r\n'
+        for request_id, status_code, data in parts
+    ) + f'--{boundary}--'
+    return {'status': '200', 'content-type': f'multipart/mixed; boundary={boundary}'}, body.encode()
+
+
+class DriveMetadataBatchTests(MediaRootTestCase):
+    def setUp(self):
+        super().setUp()
+        self.drive_service = google_drive.GoogleDriveService(api_key='test-key')
+
+    def use_http(self, *responses):
+        http = HttpMockSequence(list(responses))
+        self.drive_service._local.service = build_from_document(google_drive.get_discovery_document(), http=http)
+        return http
+
+    def test_metadata_of_many_files_is_fetched_in_one_batch(self):
+        google_drive.cache_file_metadata([{'id': 'cached', 'name': 'c.jpg', 'size': '1'}])
+        http = self.use_http(batch_response([
+            ('a', 200, {'id': 'a', 'name': 'a.jpg'}),
+            ('b', 404, {'error': {'code': 404, 'message': 'not found'}}),
+        ]))
+
+        with mock.patch.object(http, 'request', wraps=http.request) as request:
+            metadata = self.drive_service.get_files_metadata(['a', 'b', 'cached'])
+
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(metadata['a']['name'], 'a.jpg')
+        self.assertIsNone(metadata['b'])
+        self.assertEqual(metadata['cached']['name'], 'c.jpg')
+        # Batched lookups fill the cache for the proxy
+        self.assertEqual(self.drive_service.get_file_metadata('a')['name'], 'a.jpg')
+
+    def test_folder_pages_are_fetched_in_batches(self):
+        self.use_http(
+            batch_response([
+                ('f1', 200, {'files': [{'id': 'a'}], 'nextPageToken': 'next'}),
+                ('f2', 200, {'files': [{'id': 'b'}]}),
+            ]),
+            batch_response([('f1', 200, {'files': [{'id': 'c'}]})]),
+        )
+
+        listing = self.drive_service.list_files_in_folders(['f1', 'f2'])
+
+        self.assertEqual({folder: [file['id'] for file in files] for folder, files in listing.items()},
+                         {'f1': ['a', 'c'], 'f2': ['b']})
+
+    def test_batched_requests_each_take_a_rate_limiter_token(self):
+        folder_ids = [f'f{index}' for index in range(150)]
+        self.use_http(
+            batch_response([(folder_id, 200, {'files': []}) for folder_id in folder_ids[:BATCH_LIMIT]]),
+            batch_response([(folder_id, 200, {'files': []}) for folder_id in folder_ids[BATCH_LIMIT:]]),
+            batch_response([('a', 200, {'id': 'a'}), ('b', 200, {'id': 'b'})]),
+        )
+
+        with mock.patch.object(self.drive_service.rate_limiter, 'acquire') as acquire:
+            self.drive_service.list_files_in_folders(folder_ids)
+            self.drive_service.get_files_metadata(['a', 'b'], use_cache=False)
+
+        self.assertEqual(sum(call.args[0] for call in acquire.call_args_list), 152)
+
+    def test_rate_limiter_charges_batches_of_more_than_the_burst(self):
+        limiter = google_drive.RateLimiter(rate=100, burst=10)
+
+        started = time.monotonic()
+        limiter.acquire(10)
+        limiter.acquire(20)
+        limiter.acquire()
+
+        # The bucket starts full: 20 further tokens at 100 per second
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+
+    def test_listing_feeds_the_metadata_cache(self):
+        self.use_http(({'status': '200'}, json.dumps({'files': [
+            {'id': 'photo', 'name': 'photo.jpg', 'mimeType': 'image/jpeg', 'md5Checksum': 'abc'},
+        ]}).encode()))
+
+        self.drive_service.get_image_files(FOLDER_ID)
+
+        # No HTTP response left: a metadata request would fail the test
+        self.assertEqual(self.drive_service.get_file_metadata('photo')['md5Checksum'], 'abc')
+
+    def test_walk_lists_subfolders_once_down_to_max_depth(self):
+        folder = {'mimeType': FOLDER_MIME_TYPE}
+        tree = {
+            FOLDER_ID: [{'id': 'root.jpg', 'name': 'root.jpg', 'mimeType': 'image/jpeg'},
+                        {'id': 'f1', 'name': 'Ceremony', **folder}],
+            'f1': [{'id': 'f2', 'name': 'Day 1', **folder},
+                   {'id': FOLDER_ID, 'name': 'Loop', **folder}],
+            'f2': [{'id': 'deep.jpg', 'name': 'deep.jpg', 'mimeType': 'image/jpeg'},
+                   {'id': 'f3', 'name': 'Too deep', **folder}],
+        }
+        listed = []
+
+        def list_files_in_folders(folder_ids, include_folders=False):
+            listed.append(sorted(folder_ids))
+            return {
+                folder_id: [file for file in tree.get(folder_id, []) if include_folders or file['mimeType'] != FOLDER_MIME_TYPE]
+                for folder_id in folder_ids
+            }
+
+        with mock.patch.object(self.drive_service, 'list_files_in_folders', side_effect=list_files_in_folders):
+            images, folders = self.drive_service.walk_folder(FOLDER_ID, max_depth=2, workers=3)
+
+        # One batch per depth level
+        self.assertEqual(listed, [[FOLDER_ID], ['f1'], ['f2']])
+        self.assertEqual(folders, {FOLDER_ID: '', 'f1': 'Ceremony', 'f2': 'Ceremony/Day 1'})
+        self.assertEqual(
+            [(image['id'], image['folderPath'], image['parentId']) for image in images],
+            [('root.jpg', '', FOLDER_ID), ('deep.jpg', 'Ceremony/Day 1', 'f2')],
+        )
+
+    def test_walk_lists_a_level_of_many_folders_in_batches(self):
+        folder = {'mimeType': FOLDER_MIME_TYPE}
+        subfolders = [{'id': f'f{index}', 'name': f'Class {index}', **folder} for index in range(150)]
+        listed = []
+
+        def list_files_in_folders(folder_ids, include_folders=False):
+            listed.append(len(folder_ids))
+            return {folder_id: subfolders if folder_id == FOLDER_ID else [] for folder_id in folder_ids}
+
+        with mock.patch.object(self.drive_service, 'list_files_in_folders', side_effect=list_files_in_folders):
+            _, folders = self.drive_service.walk_folder(FOLDER_ID, max_depth=1)
+
+        self.assertEqual(len(folders), 151)
+        self.assertEqual(sorted(listed), [1, 50, 100])
+
+    def test_rate_limiter_spaces_requests_beyond_the_burst(self):
+        limiter = google_drive.RateLimiter(rate=50, burst=1)
+
+        started = time.monotonic()
+        for _ in range(3):
+            limiter.acquire()
+
+        self.assertGreaterEqual(time.monotonic() - started, 0.035)
+
+    @override_settings(GOOGLE_DRIVE_METADATA_TTL=0)
+    def test_cache_can_be_disabled(self):
+        google_drive.cache_file_metadata([{'id': 'photo'}])
+
+        self.assertIsNone(google_drive.get_cached_file_metadata('photo'))
@@ -0,0 +1,142 @@
+"""
+Background pre-warming of Google Drive album thumbnails.
+
+Renders every missing thumbnail of an album ahead of time so the first
+client opening the album does not pay the generation latency.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Optional
+from django.conf import settings
+from django.db import close_old_connections
+from googleapiclient.errors import HttpError
+from backend.google_drive import GoogleDriveService, get_google_drive_service
+from backend.thumbnail_utils import (
+    get_or_create_thumbnail, get_thumbnail_formats, get_thumbnail_path, get_thumbnail_sizes,
+    get_thumbnail_source_loader,
+)
+from .drive_sync import get_album_images
+from .models import GoogleDriveAlbum
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Albums currently being warmed by a background thread of this process
+_running = set()
+_running_lock = threading.Lock()
+
+
+def warm_album_thumbnails(
+    album: GoogleDriveAlbum,
+    drive_service: Optional[GoogleDriveService] = None,
+    workers: Optional[int] = None,
+    progress: Optional[Callable[[Dict], None]] = None,
+) -> Dict:
+    """
+    Generate all missing thumbnails of a Drive album with a bounded thread pool.
+
+    Every enabled format and size is rendered, each source image is downloaded at most once.
+
+    Args:
+        album: The album to warm
+        drive_service: Drive service to download originals with (defaults to the shared one)
+        workers: Number of concurrent downloads/renders (defaults to GOOGLE_DRIVE_PREWARM_WORKERS)
+        progress: Called with the current stats after every processed image
+
+    Returns:
+        Dictionary with total, cached, generated, failed, elapsed and rate (thumbnails/s)
+    """
+    drive_service = drive_service or get_google_drive_service()
+    if not drive_service:
+        raise ValueError("Google Drive service is not configured")
+    workers = workers or getattr(settings, 'GOOGLE_DRIVE_PREWARM_WORKERS', 4)
+
+    formats = get_thumbnail_formats()
+    sizes = get_thumbnail_sizes()
+    images = get_album_images(album, drive_service)
+    missing = [
+        image for image in images
+        if not all(get_thumbnail_path(image['id'], size, fmt).exists() for fmt in formats for size in sizes)
+    ]
+
+    stats = {
+        'total': len(images),
+        'cached': len(images) - len(missing),
+        'generated': 0,
+        'failed': 0,
+        'elapsed': 0.0,
+        'rate': 0.0,
+    }
+    started = time.monotonic()
+
+    # Mirrored thumbnail links expire after a few hours: refresh them with one
+    # batch request per BATCH_LIMIT images instead of a metadata request per image
+    fresh = {}
+    if missing:
+        try:
+            fresh = drive_service.get_files_metadata([image['id'] for image in missing], use_cache=False)
+        except HttpError as e:
+            logger.warning(f"Could not refresh thumbnail links of album {album.id}: {str(e)}")
+
+    def warm(image):
+        thumbnail_link = (fresh.get(image['id']) or {}).get('thumbnailLink') or image.get('thumbnailLink')
+        load_content = get_thumbnail_source_loader(drive_service, image['id'], thumbnail_link)
+        thumbnail_paths = [get_or_create_thumbnail(image['id'], load_content, fmt=fmt, sizes=sizes) for fmt in formats]
+        return all(thumbnail_paths)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(warm, image): image['id'] for image in missing}
+        for future in as_completed(futures):
+            try:
+                warmed = future.result()
+            except Exception as e:
+                logger.error(f"Error warming thumbnail {futures[future]}: {str(e)}")
+                warmed = False
+
+            stats['generated' if warmed else 'failed'] += 1
+            stats['elapsed'] = time.monotonic() - started
+            stats['rate'] = stats['generated'] / stats['elapsed'] if stats['elapsed'] else 0.0
+            if progress:
+                progress(stats)
+
+    stats['elapsed'] = time.monotonic() - started
+    logger.info(
+        f"Warmed thumbnails of album {album.id}: {stats['generated']} generated, "
+        f"{stats['cached']} cached, {stats['failed']} failed in {stats['elapsed']:.1f}s"
+    )
+    return stats
+
+
+def _warm_in_background(album_id):
+    try:
+        album = GoogleDriveAlbum.objects.filter(pk=album_id).first()
+        if album and album.folder_id:
+            warm_album_thumbnails(album)
+    except Exception as e:
+        logger.error(f"Error warming thumbnails of album {album_id}: {str(e)}")
+    finally:
+        with _running_lock:
+            _running.discard(album_id)
+        close_old_connections()
+
+
+def start_background_warmup(album_id) -> bool:
+    """
+    Warm the thumbnails of an album in a background thread.
+
+    Returns:
+        False if Drive is not configured or the album is already being warmed
+    """
+    if not get_google_drive_service():
+        return False
+
+    with _running_lock:
+        if album_id in _running:
+            return False
+        _running.add(album_id)
+
+    thread = threading.Thread(target=_warm_in_background, args=(album_id,), daemon=True)
+    thread.start()
+    return True
@@ -0,0 +1,431 @@
+"""
+Chunked, resumable uploads for the admin image upload forms.
+
+The upload forms used to post every selected image in one multipart
+request, held in memory up to 100 MB and lost entirely if the connection
+dropped. Instead the browser now registers the files of an UploadBatch,
+sends each file in fixed-size chunks (several at once), and asks for the
+batch to be completed once every chunk arrived. Chunks are streamed to
+CHUNKED_UPLOAD_DIR/<batch id>/<file id>/<index>.part, so an interrupted
+upload resumes by re-sending only the chunks the server does not have yet.
+Completing a batch queues it for a background thread, which streams the
+chunks of every file into storage through the bulk ingest; the browser
+polls the batch state meanwhile. A batch still processing after
+CHUNKED_UPLOAD_PROCESSING_TIMEOUT lost its thread (e.g. to a worker
+restart) and is marked as failed, so it can be completed again.
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from backend.locks import single_flight
+from .ingest import group_uploads_by_name, ingest_album_uploads, ingest_grouped_uploads
+from .models import ClientAlbum, UploadBatch, UploadBatchFile
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the request at a time while streaming a chunk to disk
+STREAM_BLOCK_SIZE = 64 * 1024
+
+
+class UploadError(ValueError):
+    """Raised for a batch, file or chunk the client should not have sent."""
+
+
+def get_upload_dir() -> Path:
+    """Get the directory holding the chunks of unfinished uploads."""
+    return Path(getattr(settings, 'CHUNKED_UPLOAD_DIR', Path(settings.BASE_DIR) / 'tmp' / 'uploads'))
+
+
+def get_batch_dir(batch_id) -> Path:
+    return get_upload_dir() / str(batch_id)
+
+
+def get_chunk_path(upload_file: UploadBatchFile, index: int) -> Path:
+    return get_batch_dir(upload_file.batch_id) / str(upload_file.id) / f"{index}.part"
+
+
+def get_chunk_length(upload_file: UploadBatchFile, index: int) -> int:
+    """
+    Get the length a chunk of a file must have.
+
+    Raises:
+        UploadError: If the file has no chunk with that index
+    """
+    if not 0 <= index < upload_file.total_chunks:
+        raise UploadError(f"Chunk {index} is out of range, {upload_file.name} has {upload_file.total_chunks} chunk(s)")
+    chunk_size = upload_file.batch.chunk_size
+    return min(chunk_size, upload_file.size - index * chunk_size)
+
+
+def create_upload_batch(files: Iterable[Dict], album: Optional[ClientAlbum] = None,
+                        school: str = '', chunk_size: Optional[int] = None) -> UploadBatch:
+    """
+    Register the files of a new upload.
+
+    Args:
+        files: Dictionaries with the 'name' and 'size' (in bytes) of every file
+        album: Album receiving the images, or None to create albums from the file names
+        school: Appended to the names of the created albums
+        chunk_size: Chunk size in bytes (defaults to CHUNKED_UPLOAD_CHUNK_SIZE)
+
+    Returns:
+        The created UploadBatch
+
+    Raises:
+        UploadError: If no files are given, too many, or one has no name or a bad size
+    """
+    files = list(files)
+    if not files:
+        raise UploadError("No files to upload")
+    # Not DATA_UPLOAD_MAX_NUMBER_FILES: every chunk is a request of its own
+    max_files = getattr(settings, 'CHUNKED_UPLOAD_MAX_FILES', 5000)
+    if max_files and len(files) > max_files:
+        raise UploadError(f"At most {max_files} files can be uploaded at once")
+
+    upload_files = []
+    for file in files:
+        try:
+            name = os.path.basename(str(file['name']).replace('\\', '/'))
+            size = int(file['size'])
+        except (KeyError, TypeError, ValueError):
+            raise UploadError("Every file needs a name and a size")
+        if not name or size < 0:
+            raise UploadError(f"Invalid file {name or '(no name)'} of size {size}")
+        upload_files.append(UploadBatchFile(name=name[:255], size=size))
+
+    delete_stale_upload_batches()
+
+    batch = UploadBatch.objects.create(
+        album=album,
+        school=school,
+        chunk_size=chunk_size or getattr(settings, 'CHUNKED_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024),
+    )
+    for upload_file in upload_files:
+        upload_file.batch = batch
+    UploadBatchFile.objects.bulk_create(upload_files)
+    return batch
+
+
+def write_chunk(upload_file: UploadBatchFile, index: int, stream) -> int:
+    """
+    Stream a chunk of a file to disk.
+
+    The chunk is written to a temporary file and moved into place once
+    complete, so an interrupted request never leaves a partial chunk behind
+    and chunks of one batch can be written concurrently. Sending a chunk
+    again replaces it.
+
+    Args:
+        upload_file: The file the chunk belongs to
+        index: Zero-based index of the chunk
+        stream: File-like object (e.g. the request) to read the chunk from
+
+    Returns:
+        Number of bytes written
+
+    Raises:
+        UploadError: If the batch is completed, the index is out of range
+                     or the chunk does not have the expected length
+    """
+    if upload_file.batch.state in (UploadBatch.PROCESSING, UploadBatch.COMPLETED):
+        raise UploadError(f"The upload is already {upload_file.batch.state}")
+    expected = get_chunk_length(upload_file, index)
+    chunk_path = get_chunk_path(upload_file, index)
+    chunk_path.parent.mkdir(parents=True, exist_ok=True)
+
+    received = 0
+    fd, temp_path = tempfile.mkstemp(dir=chunk_path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as temp_file:
+            # Read one byte past the expected length to notice oversized chunks
+            while received <= expected:
+                block = stream.read(min(STREAM_BLOCK_SIZE, expected + 1 - received))
+                if not block:
+                    break
+                temp_file.write(block)
+                received += len(block)
+        if received != expected:
+            raise UploadError(f"Chunk {index} of {upload_file.name} should be {expected} bytes")
+        os.replace(temp_path, chunk_path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    return received
+
+
+def get_received_chunks(upload_file: UploadBatchFile) -> List[int]:
+    """Get the sorted indexes of the chunks of a file stored so far."""
+    file_dir = get_chunk_path(upload_file, 0).parent
+    if not file_dir.exists():
+        return []
+    return sorted(int(path.stem) for path in file_dir.glob('*.part') if path.stem.isdigit())
+
+
+def get_processing_cutoff():
+    """Get the start time before which a batch still processing is considered interrupted."""
+    timeout = getattr(settings, 'CHUNKED_UPLOAD_PROCESSING_TIMEOUT', 60 * 60)
+    return timezone.now() - timedelta(seconds=timeout)
+
+
+def _interrupted():
+    """Filter matching batches whose ingest thread is gone."""
+    return Q(state=UploadBatch.PROCESSING) & (
+        Q(processing_started_at__lt=get_processing_cutoff()) | Q(processing_started_at__isnull=True)
+    )
+
+
+def fail_interrupted_batch(batch: UploadBatch) -> bool:
+    """
+    Mark a batch as failed if it has been processing for longer than
+    CHUNKED_UPLOAD_PROCESSING_TIMEOUT, so clients stop waiting and retry.
+
+    Returns:
+        True if the batch was marked as failed
+    """
+    if batch.state != UploadBatch.PROCESSING:
+        return False
+    error = 'Processing the upload was interrupted, complete it again'
+    if not UploadBatch.objects.filter(_interrupted(), pk=batch.pk).update(state=UploadBatch.FAILED, error=error):
+        return False
+    logger.warning(f"Upload {batch.id} was interrupted while processing")
+    batch.state = UploadBatch.FAILED
+    batch.error = error
+    return True
+
+
+def get_upload_status(batch: UploadBatch) -> Dict:
+    """
+    Describe a batch and the chunks received so far, for clients resuming
+    an upload or waiting for it to be processed.
+
+    Returns:
+        Dictionary with the batch id, chunk size, state, error and result,
+        and the id, name, size, chunk count and received chunks of every file
+    """
+    fail_interrupted_batch(batch)
+    return {
+        'id': str(batch.id),
+        'chunk_size': batch.chunk_size,
+        'state': batch.state,
+        'completed': batch.completed_at is not None,
+        'error': batch.error,
+        'result': batch.result,
+        'files': [
+            {
+                'id': upload_file.id,
+                'name': upload_file.name,
+                'size': upload_file.size,
+                'total_chunks': upload_file.total_chunks,
+                'received': [] if batch.completed_at else get_received_chunks(upload_file),
+            }
+            for upload_file in batch.files.all()
+        ],
+    }
+
+
+class ChunkReader(io.RawIOBase):
+    """Read the chunks of an uploaded file one after the other, as if they were a single file."""
+
+    def __init__(self, paths: List[Path]):
+        self.paths = paths
+        self._index = 0
+        self._current = None
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # Storage backends rewind before reading; that is all we support
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Chunked files can only be rewound")
+        if self._current:
+            self._current.close()
+        self._index = 0
+        self._current = None
+        return 0
+
+    def readinto(self, buffer):
+        while self._index < len(self.paths):
+            if self._current is None:
+                self._current = open(self.paths[self._index], 'rb')
+            read = self._current.readinto(buffer)
+            if read:
+                return read
+            self._current.close()
+            self._current = None
+            self._index += 1
+        return 0
+
+    def close(self):
+        if self._current:
+            self._current.close()
+            self._current = None
+        super().close()
+
+
+def _check_chunks(upload_file: UploadBatchFile):
+    missing = upload_file.total_chunks - len(get_received_chunks(upload_file))
+    if missing:
+        raise UploadError(f"{upload_file.name} is missing {missing} chunk(s)")
+
+
+def open_uploaded_file(upload_file: UploadBatchFile) -> File:
+    """
+    Open the received chunks of a file as a single File, without copying them.
+
+    Raises:
+        UploadError: If chunks are missing
+    """
+    _check_chunks(upload_file)
+    paths = [get_chunk_path(upload_file, index) for index in range(upload_file.total_chunks)]
+    file = File(ChunkReader(paths), name=upload_file.name)
+    file.size = upload_file.size
+    return file
+
+
+def start_upload_batch_completion(batch: UploadBatch) -> bool:
+    """
+    Queue the ingest of a batch whose chunks all arrived, to run in the background once committed.
+
+    The ingest of a large batch (storage writes, QR codes, derivatives)
+    takes far longer than a request should, so clients poll
+    get_upload_status until the batch is completed or failed.
+
+    A batch whose processing was interrupted (see fail_interrupted_batch)
+    is claimed again.
+
+    Returns:
+        False if the batch is already being processed or completed
+
+    Raises:
+        UploadError: If chunks of any file are missing
+    """
+    for upload_file in batch.files.all():
+        _check_chunks(upload_file)
+    now = timezone.now()
+    started = UploadBatch.objects.filter(
+        Q(state__in=[UploadBatch.UPLOADING, UploadBatch.FAILED]) | _interrupted(), pk=batch.pk
+    ).update(state=UploadBatch.PROCESSING, error='', processing_started_at=now)
+    if not started:
+        return False
+    batch.state = UploadBatch.PROCESSING
+    batch.error = ''
+    batch.processing_started_at = now
+    batch_id = batch.pk
+    transaction.on_commit(lambda: start_background_completion(batch_id))
+    return True
+
+
+def _complete_in_background(batch_id):
+    try:
+        batch = UploadBatch.objects.filter(pk=batch_id).first()
+        if batch:
+            complete_upload_batch(batch)
+    except Exception as e:
+        logger.error(f"Error completing upload {batch_id}: {str(e)}")
+    finally:
+        close_old_connections()
+
+
+def start_background_completion(batch_id):
+    """Run complete_upload_batch for a batch in a background thread."""
+    thread = threading.Thread(target=_complete_in_background, args=(batch_id,), daemon=True)
+    thread.start()
+
+
+def complete_upload_batch(batch: UploadBatch, workers: Optional[int] = None) -> Dict:
+    """
+    Ingest the files of a batch whose chunks all arrived.
+
+    The chunks of each file are streamed into storage one after the other,
+    without assembling a copy first. Completing a batch twice returns the
+    stored result instead of ingesting again. A failed ingest marks the
+    batch as failed and keeps its chunks, so it can be retried.
+
+    Args:
+        batch: The upload batch
+        workers: Concurrent storage writes (defaults to ALBUM_UPLOAD_WORKERS)
+
+    Returns:
+        Dictionary with the number of stored images, the titles of the
+        created albums and the ingest timings
+
+    Raises:
+        UploadError: If chunks of any file are missing
+    """
+    lock_path = get_upload_dir() / '.locks' / f"{batch.id}.lock"
+    with single_flight(f"upload:{batch.id}", lock_path):
+        batch.refresh_from_db()
+        if batch.completed_at:
+            return batch.result
+
+        files = []
+        try:
+            # Open every file first, so a missing chunk is reported before any work
+            files = [open_uploaded_file(upload_file) for upload_file in batch.files.all()]
+            if batch.album_id:
+                report = ingest_album_uploads(batch.album, files, workers)
+            else:
+                report = ingest_grouped_uploads(group_uploads_by_name(files, batch.school), workers)
+        except Exception as e:
+            UploadBatch.objects.filter(pk=batch.pk).update(state=UploadBatch.FAILED, error=str(e))
+            raise
+        finally:
+            for file in files:
+                file.close()
+
+        batch.result = {
+            'images': report.images,
+            'albums_created': [album.title for album in report.albums_created],
+            'timings': report.format_timings(),
+        }
+        batch.state = UploadBatch.COMPLETED
+        batch.error = ''
+        batch.completed_at = timezone.now()
+        batch.save(update_fields=['result', 'state', 'error', 'completed_at'])
+
+    shutil.rmtree(get_batch_dir(batch.id), ignore_errors=True)
+    logger.info(f"Completed upload {batch.id}: {batch.result['images']} image(s)")
+    return batch.result
+
+
+def delete_stale_upload_batches() -> int:
+    """
+    Delete batches older than CHUNKED_UPLOAD_EXPIRY seconds together with their chunks.
+
+    Batches being processed are kept until their processing times out, so
+    their chunks are not removed while they are read.
+
+    Returns:
+        Number of deleted batches
+    """
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'CHUNKED_UPLOAD_EXPIRY', 24 * 60 * 60))
+    stale = UploadBatch.objects.filter(created_at__lt=cutoff).exclude(
+        state=UploadBatch.PROCESSING, processing_started_at__gte=get_processing_cutoff()
+    )
+    stale_ids = list(stale.values_list('id', flat=True))
+    if not stale_ids:
+        return 0
+    for batch_id in stale_ids:
+        shutil.rmtree(get_batch_dir(batch_id), ignore_errors=True)
+    UploadBatch.objects.filter(id__in=stale_ids).delete()
+    logger.info(f"Deleted {len(stale_ids)} stale upload batch(es)")
+    return len(stale_ids)
@@ -1,22 +1,70 @@
-import zipfile
 import os
 import re
-from io import BytesIO
-from django.http import HttpResponse
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.db.models import Count, OuterRef, Subquery
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag, urlencode
+from googleapiclient.errors import HttpError
 from rest_framework import viewsets, status, views
 from rest_framework.response import Response
-from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny
-from .models import ClientAlbum, GoogleDriveAlbum
-from backend.serializers import ClientAlbumSerializer, GoogleDriveAlbumSerializer
+from .models import AlbumImage, ClientAlbum, GoogleDriveAlbum
+from backend.serializers import (
+    ClientAlbumSerializer, ClientAlbumSummarySerializer, GoogleDriveAlbumSerializer, GoogleDriveImageSerializer,
+)
 from backend.google_drive import get_google_drive_service
+from backend.http_utils import if_range_matches, parse_range_header
+from backend.thumbnail_utils import (
+    get_cached_thumbnail, get_or_create_thumbnail, get_thumbnail_mime_type, get_thumbnail_source_loader,
+    nearest_thumbnail_size, negotiate_thumbnail_format,
+)
+from backend.zip_stream import ZipStream
+from .archives import get_album_version, get_archive_path, schedule_archive_build
+from .drive_archive import build_drive_album_archive, iter_drive_album_archive
+from .drive_sync import decode_cursor, get_album_images, get_album_images_page
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Images per page of a paginated Drive album, unless page_size says otherwise
+DRIVE_ALBUM_PAGE_SIZE = 100
+DRIVE_ALBUM_MAX_PAGE_SIZE = 500
+
+# Signing salt of album download links
+ALBUM_DOWNLOAD_SALT = 'clients.album-download'
+
+class ClientAlbumPagination(PageNumberPagination):
+    page_size = 24
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 class ClientAlbumViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = ClientAlbum.objects.all()
     serializer_class = ClientAlbumSerializer
+    pagination_class = ClientAlbumPagination
+
+    def get_queryset(self):
+        if self.action == 'list':
+            # Counts and covers are computed by the list query itself
+            cover = AlbumImage.objects.filter(album=OuterRef('pk')).order_by('created_at', 'id').values('image')[:1]
+            return ClientAlbum.objects.annotate(
+                image_count=Count('images'),
+                cover_image_name=Subquery(cover),
+            ).order_by('-created_at', 'id')
+        return ClientAlbum.objects.prefetch_related('images')
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return ClientAlbumSummarySerializer
+        return ClientAlbumSerializer
 
 @api_view(['POST'])
 @authentication_classes([])  # <--- This tells Django: "Don't check for cookies/users here"
@@ -37,47 +85,8 @@ def verify_pin(request):
     except ClientAlbum.DoesNotExist:
         return Response({'error': 'Invalid PIN for this album'}, status=status.HTTP_400_BAD_REQUEST)
 
-@api_view(['POST'])
-@authentication_classes([])
-@permission_classes([AllowAny])
-def download_album(request):
-    """Download all images from an album as a ZIP file"""
-    pin = request.data.get('pin')
-    album_id = request.data.get('album_id')
-    
-    if not pin:
-        return Response({'error': 'PIN is required'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    if not album_id:
-        return Response({'error': 'Album ID is required'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    try:
-        # Refresh album from database to ensure we have latest data
-        album = ClientAlbum.objects.get(id=album_id, pin=pin)
-        # Refresh from database to ensure we have the latest title
-        album.refresh_from_db()
-    except ClientAlbum.DoesNotExist:
-        return Response({'error': 'Invalid PIN for this album'}, status=status.HTTP_400_BAD_REQUEST)
-    
-    # Get all images for this album
-    images = album.images.all()
-    
-    if not images.exists():
-        return Response({'error': 'No images in this album'}, status=status.HTTP_404_NOT_FOUND)
-    
-    # Create a ZIP file in memory
-    zip_buffer = BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for image in images:
-            if image.image and os.path.exists(image.image.path):
-                # Get the filename
-                filename = image.filename
-                # Add the image to the ZIP file
-                zip_file.write(image.image.path, filename)
-    
-    # Prepare the response with album name in filename
-    zip_buffer.seek(0)
-    
+def _attachment_disposition(album):
+    """Build the Content-Disposition of an album ZIP, named after the album title."""
     # Get album title - access directly from the model instance
     album_title = album.title
     
@@ -107,12 +116,228 @@ def download_album(request):
         # If no title, fallback to UUID
         filename = f"album_{album.id}.zip"
     
-    response = HttpResponse(zip_buffer.read(), content_type='application/zip')
     # Use filename* format for better browser compatibility with special characters
-    response['Content-Disposition'] = f'attachment; filename="{filename}"; filename*=UTF-8\'\'{filename}'
+    return f'attachment; filename="{filename}"; filename*=UTF-8\'\'{filename}'
+
+
+def _read_file_range(file, length, chunk_size=1024 * 1024):
+    """Yield length bytes of an open file from its current position, then close it."""
+    with file:
+        while length > 0:
+            chunk = file.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _archive_response(request, archive_path, etag):
+    """Serve a prebuilt album archive, answering revalidations and Range requests."""
+    stat = archive_path.stat()
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    headers = HttpResponse()
+    headers['ETag'] = etag
+    headers['Last-Modified'] = http_date(last_modified)
+    headers['Accept-Ranges'] = 'bytes'
+    conditional_response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=headers
+    )
+    if conditional_response is not headers:
+        return conditional_response
+    
+    byte_range = None
+    if if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+    
+    archive_file = open(archive_path, 'rb')
+    if byte_range:
+        start, end = byte_range
+        archive_file.seek(start)
+        response = StreamingHttpResponse(
+            _read_file_range(archive_file, end - start + 1),
+            content_type='application/zip',
+            status=status.HTTP_206_PARTIAL_CONTENT
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    else:
+        response = FileResponse(archive_file, content_type='application/zip')
+    for header, value in headers.items():
+        if header != 'Content-Type':
+            response[header] = value
     return response
 
 
+def _pin_fingerprint(album):
+    """Keyed hash of an album PIN, so changing the PIN revokes the download links handed out for it."""
+    return salted_hmac(ALBUM_DOWNLOAD_SALT, album.pin).hexdigest()[:16]
+
+
+def get_album_download_token(album):
+    """Sign a token granting the download of an album's ZIP for ALBUM_DOWNLOAD_LINK_TTL seconds."""
+    return signing.dumps({'album': str(album.id), 'pin': _pin_fingerprint(album)}, salt=ALBUM_DOWNLOAD_SALT)
+
+
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def download_album(request):
+    """
+    Check an album PIN and hand out a short-lived link to download the album as a ZIP file.
+    
+    The album ID and PIN are read from the POST body, never the query
+    string, which would leak the PIN into access logs and browser history.
+    The link is a signed GET URL, so browsers and download managers can
+    resume an interrupted download with Range requests.
+    """
+    pin = request.data.get('pin')
+    album_id = request.data.get('album_id')
+    
+    if not pin:
+        return Response({'error': 'PIN is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not album_id:
+        return Response({'error': 'Album ID is required'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        album = ClientAlbum.objects.get(id=album_id, pin=pin)
+    except (ClientAlbum.DoesNotExist, ValidationError):
+        return Response({'error': 'Invalid PIN for this album'}, status=status.HTTP_400_BAD_REQUEST)
+    
+    if not album.images.exists():
+        return Response({'error': 'No images in this album'}, status=status.HTTP_404_NOT_FOUND)
+    
+    url = request.build_absolute_uri(reverse('download-album-archive', args=[get_album_download_token(album)]))
+    return Response({'url': url, 'expires_in': getattr(settings, 'ALBUM_DOWNLOAD_LINK_TTL', 3600)})
+
+
+@api_view(['GET'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def download_album_archive(request, token):
+    """
+    Download all images from an album as a ZIP file, through a link from download_album.
+    
+    Prebuilt archives are served from disk with Range support; otherwise
+    the archive is streamed while it is being built.
+    """
+    try:
+        data = signing.loads(
+            token, salt=ALBUM_DOWNLOAD_SALT, max_age=getattr(settings, 'ALBUM_DOWNLOAD_LINK_TTL', 3600)
+        )
+        album = ClientAlbum.objects.get(id=data['album'])
+    except (signing.BadSignature, ClientAlbum.DoesNotExist, ValidationError, KeyError, TypeError):
+        album = None
+    if album is None or not constant_time_compare(str(data.get('pin')), _pin_fingerprint(album)):
+        return Response({'error': 'This download link is invalid or has expired'}, status=status.HTTP_403_FORBIDDEN)
+    
+    # Get all images for this album
+    images = album.images.all()
+    
+    if not images.exists():
+        return Response({'error': 'No images in this album'}, status=status.HTTP_404_NOT_FOUND)
+    
+    version = get_album_version(album)
+    archive_path = get_archive_path(album.id, version)
+    if archive_path.exists():
+        response = _archive_response(request, archive_path, quote_etag(version))
+    else:
+        # Stream the ZIP file while reading the images from disk
+        archive = ZipStream()
+        for image in images:
+            if image.image and os.path.exists(image.image.path):
+                # Add the image to the ZIP file under its filename
+                archive.add_file(image.image.path, image.filename)
+        
+        response = StreamingHttpResponse(archive, content_type='application/zip')
+        # Known up front when every entry is stored, which lets clients show progress
+        content_length = archive.content_length()
+        if content_length is not None:
+            response['Content-Length'] = str(content_length)
+        
+        # Build the archive for the next downloads
+        if getattr(settings, 'ALBUM_ARCHIVE_PREBUILD', True):
+            schedule_archive_build(album.id, delay=0)
+    
+    response['Content-Disposition'] = _attachment_disposition(album)
+    return response
+
+
+def _drive_page_params(query_params):
+    """
+    Read the pagination parameters of the Drive album endpoint.
+    
+    Returns:
+        Tuple of (page_size, position after which the page starts, page number),
+        or None if the whole album is requested
+    
+    Raises:
+        ValueError: If a parameter is invalid
+    """
+    if not any(param in query_params for param in ('page_size', 'cursor', 'page')):
+        return None
+    
+    page_size = query_params.get('page_size', str(DRIVE_ALBUM_PAGE_SIZE))
+    page = query_params.get('page', '1')
+    if not page_size.isdigit() or int(page_size) < 1:
+        raise ValueError("page_size must be a positive integer")
+    if not page.isdigit() or int(page) < 1:
+        raise ValueError("page must be a positive integer")
+    cursor = query_params.get('cursor')
+    after = decode_cursor(cursor) if cursor else None
+    return min(int(page_size), DRIVE_ALBUM_MAX_PAGE_SIZE), after, int(page)
+
+
+def _drive_album_request(instance, query_params, drive_configured):
+    """
+    Validate a Drive album request.
+    
+    Returns:
+        Tuple of (page parameters as returned by _drive_page_params, error),
+        where error is the (body, status) to answer with instead, or None
+    """
+    if not instance.folder_id:
+        return None, ({'error': 'No folder ID configured for this album'}, status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        page_params = _drive_page_params(query_params)
+    except ValueError as e:
+        return None, ({'error': str(e)}, status.HTTP_400_BAD_REQUEST)
+    
+    if not drive_configured and not instance.synced_at:
+        return None, (
+            {'error': 'Google Drive service is not configured. Please check your environment variables.'},
+            status.HTTP_503_SERVICE_UNAVAILABLE
+        )
+    return page_params, None
+
+
+def _drive_album_data(request, instance, images, page_params, count=None, next_cursor=None):
+    """Serialize a Drive album with its images (or one page of them)."""
+    data = GoogleDriveAlbumSerializer(instance, context={'request': request}).data
+    data['images'] = GoogleDriveImageSerializer(images, many=True, context={'request': request}).data
+    data['count'] = count if page_params else len(images)
+    if page_params:
+        data.update(_drive_page_links(request, page_params[0], next_cursor))
+    return data
+
+
+def _drive_page_links(request, page_size, next_cursor):
+    """Build the pagination fields added to a paginated Drive album response."""
+    next_url = None
+    if next_cursor:
+        next_url = request.build_absolute_uri(
+            f"{request.path}?{urlencode({'page_size': page_size, 'cursor': next_cursor})}"
+        )
+    return {'page_size': page_size, 'next_cursor': next_cursor, 'next': next_url}
+
+
 class GoogleDriveAlbumViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for Google Drive Albums"""
     queryset = GoogleDriveAlbum.objects.all()
@@ -121,7 +346,44 @@ class GoogleDriveAlbumViewSet(viewsets.ReadOnlyModelViewSet):
     authentication_classes = []
     
     def retrieve(self, request, *args, **kwargs):
-        """Retrieve album and fetch images from Google Drive"""
+        """
+        Retrieve album and fetch images from Google Drive.
+        
+        The whole album is returned unless page_size, page or cursor is given;
+        then only that page is returned, with the total count and the cursor
+        of the next page.
+        """
+        instance = self.get_object()
+        
+        # Get Google Drive service
+        drive_service = get_google_drive_service()
+        
+        page_params, error = _drive_album_request(instance, request.query_params, drive_service is not None)
+        if error:
+            return Response(*error)
+        
+        try:
+            # Serve images from the local mirror, pulling only Drive deltas
+            if page_params:
+                page_size, after, page = page_params
+                images, count, next_cursor = get_album_images_page(
+                    instance, drive_service, page_size, after=after, page=page
+                )
+                return Response(_drive_album_data(request, instance, images, page_params, count, next_cursor))
+            
+            images = get_album_images(instance, drive_service)
+            return Response(_drive_album_data(request, instance, images, page_params))
+        
+        except Exception as e:
+            logger.error(f"Error fetching images from Google Drive for album {instance.id}: {str(e)}")
+            return Response(
+                {'error': f'Failed to fetch images from Google Drive: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, *args, **kwargs):
+        """Download all images of the album as a ZIP file, streamed while the originals are fetched"""
         instance = self.get_object()
         
         if not instance.folder_id:
@@ -130,9 +392,7 @@ class GoogleDriveAlbumViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get Google Drive service
         drive_service = get_google_drive_service()
-        
         if not drive_service:
             return Response(
                 {'error': 'Google Drive service is not configured. Please check your environment variables.'},
@@ -140,26 +400,137 @@ class GoogleDriveAlbumViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         try:
-            # Fetch images from Google Drive
-            images = drive_service.get_image_files(instance.folder_id)
-            
-            # Serialize the album
-            serializer = self.get_serializer(instance)
-            data = serializer.data
-            
-            # Add images from Google Drive
-            from backend.serializers import GoogleDriveImageSerializer
-            image_serializer = GoogleDriveImageSerializer(images, many=True, context={'request': request})
-            data['images'] = image_serializer.data
-            
-            return Response(data)
-        
+            archive, prefetcher = build_drive_album_archive(instance, drive_service)
         except Exception as e:
             logger.error(f"Error fetching images from Google Drive for album {instance.id}: {str(e)}")
             return Response(
                 {'error': f'Failed to fetch images from Google Drive: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+        
+        if not len(archive):
+            return Response({'error': 'No images in this album'}, status=status.HTTP_404_NOT_FOUND)
+        
+        response = StreamingHttpResponse(
+            iter_drive_album_archive(archive, prefetcher), content_type='application/zip'
+        )
+        content_length = archive.content_length()
+        if content_length is not None:
+            response['Content-Length'] = str(content_length)
+        response['Content-Disposition'] = _attachment_disposition(instance)
+        return response
+
+
+def _drive_validators(file_metadata):
+    """Build the ETag and Last-Modified timestamp of a Drive file from its metadata."""
+    md5_checksum = file_metadata.get('md5Checksum')
+    etag = quote_etag(md5_checksum) if md5_checksum else None
+    
+    last_modified = None
+    if file_metadata.get('modifiedTime'):
+        modified_time = parse_datetime(file_metadata['modifiedTime'])
+        if modified_time:
+            last_modified = int(modified_time.timestamp())
+    return etag, last_modified
+
+
+def _thumbnail_response(request, thumbnail_path, content_type):
+    """Serve a cached thumbnail, answering revalidations with 304."""
+    last_modified = int(thumbnail_path.stat().st_mtime)
+    response = HttpResponse(content_type=content_type)
+    response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = 'public, max-age=86400'  # Cache for 24 hours
+    # The format depends on the Accept header
+    response['Vary'] = 'Accept'
+    conditional_response = get_conditional_response(request, last_modified=last_modified, response=response)
+    if conditional_response is not response:
+        return conditional_response
+    
+    with open(thumbnail_path, 'rb') as f:
+        response.content = f.read()
+    return response
+
+
+def _stream_drive_file(file_id, first_chunk, chunks):
+    """Yield the chunks of a Drive file, logging failures that happen mid-stream."""
+    yield first_chunk
+    try:
+        yield from chunks
+    except Exception as e:
+        # Headers are already sent, the client sees a truncated download
+        logger.error(f"Error streaming Google Drive image {file_id}: {str(e)}")
+
+
+def _thumbnail_params(request):
+    """
+    Read the thumbnail parameters of a Drive image proxy request.
+    
+    Returns:
+        Tuple of (variant size, format, MIME type), or None if the full image is requested
+    """
+    if request.GET.get('thumbnail', 'false').lower() != 'true':
+        return None
+    requested_size = request.GET.get('size', '')
+    thumbnail_size = nearest_thumbnail_size(int(requested_size) if requested_size.isdigit() else None)
+    thumbnail_format = negotiate_thumbnail_format(request.META.get('HTTP_ACCEPT'))
+    return thumbnail_size, thumbnail_format, get_thumbnail_mime_type(thumbnail_format)
+
+
+def _drive_file_preconditions(request, file_metadata):
+    """
+    Evaluate the conditional and Range headers of a Drive image request against its metadata.
+    
+    Returns:
+        Tuple of (response to send instead of the file, e.g. 304 or 416, or
+        None; response holding the validator and cache headers; file size or
+        None if unknown; inclusive byte range to send or None)
+    """
+    # Answer revalidations from the Drive validators without downloading
+    etag, last_modified = _drive_validators(file_metadata)
+    headers = HttpResponse()
+    if etag:
+        headers['ETag'] = etag
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified)
+    headers['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
+    conditional_response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified, response=headers
+    )
+    if conditional_response is not headers:
+        return conditional_response, headers, None, None
+    
+    # Resolve the requested byte range, if any
+    size = int(file_metadata['size']) if file_metadata.get('size') else None
+    byte_range = None
+    if size is not None and if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range_header(request.META.get('HTTP_RANGE'), size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response['Content-Range'] = f'bytes */{size}'
+            return response, headers, size, None
+    return None, headers, size, byte_range
+
+
+def _drive_file_response(file_metadata, streaming_content, headers, size, byte_range):
+    """Build the streaming response of a Drive image, or of a byte range of it."""
+    response = StreamingHttpResponse(
+        streaming_content,
+        content_type=file_metadata.get('mimeType', 'application/octet-stream'),
+        status=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK
+    )
+    for header, value in headers.items():
+        if header != 'Content-Type':
+            response[header] = value
+    if byte_range:
+        response['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{size}'
+        response['Content-Length'] = str(byte_range[1] - byte_range[0] + 1)
+    elif size is not None:
+        response['Content-Length'] = str(size)
+    if size is not None:
+        response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = f'inline; filename="{file_metadata.get("name", "image")}"'
+    return response
 
 
 @api_view(['GET'])
@@ -169,13 +540,10 @@ def proxy_google_drive_image(request, file_id):
     """
     Proxy endpoint to serve Google Drive images through the backend.
     This allows authenticated access to images using service account credentials.
-    Supports ?thumbnail=true query parameter for thumbnail generation.
+    Supports ?thumbnail=true query parameter for thumbnail generation, with an
+    optional ?size=<pixels> to pick a responsive variant; the thumbnail format
+    (AVIF, WebP or JPEG) is negotiated from the Accept header.
     """
-    from backend.google_drive import get_google_drive_service
-    from backend.thumbnail_utils import get_or_create_thumbnail, get_thumbnail_path
-    from django.conf import settings
-    from pathlib import Path
-    
     drive_service = get_google_drive_service()
     
     if not drive_service:
@@ -185,18 +553,15 @@ def proxy_google_drive_image(request, file_id):
         )
     
     # Check if thumbnail is requested
-    is_thumbnail = request.query_params.get('thumbnail', 'false').lower() == 'true'
+    thumbnail = _thumbnail_params(request)
     
     try:
         # If thumbnail requested, try to serve cached thumbnail first
-        if is_thumbnail:
-            thumbnail_path = get_thumbnail_path(file_id)
-            if thumbnail_path.exists():
-                with open(thumbnail_path, 'rb') as f:
-                    thumbnail_content = f.read()
-                response = HttpResponse(thumbnail_content, content_type='image/jpeg')
-                response['Cache-Control'] = 'public, max-age=86400'  # Cache for 24 hours
-                return response
+        if thumbnail:
+            thumbnail_size, thumbnail_format, thumbnail_mime_type = thumbnail
+            thumbnail_path = get_cached_thumbnail(file_id, thumbnail_size, thumbnail_format)
+            if thumbnail_path:
+                return _thumbnail_response(request, thumbnail_path, thumbnail_mime_type)
         
         # Get file metadata to determine content type
         file_metadata = drive_service.get_file_metadata(file_id)
@@ -206,34 +571,42 @@ def proxy_google_drive_image(request, file_id):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get file content
-        file_content = drive_service.get_file_content(file_id)
-        if not file_content:
-            return Response(
-                {'error': 'Failed to retrieve file content'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        # If thumbnail requested, generate it from Drive's resized rendition
+        # (or the original); concurrent requests for the same file share a
+        # single download
+        if thumbnail:
+            thumbnail_path = get_or_create_thumbnail(
+                file_id,
+                get_thumbnail_source_loader(drive_service, file_id, file_metadata.get('thumbnailLink')),
+                size=thumbnail_size, fmt=thumbnail_format
             )
-        
-        # If thumbnail requested, generate it
-        if is_thumbnail:
-            thumbnail_path = get_or_create_thumbnail(file_id, file_content)
             if thumbnail_path and thumbnail_path.exists():
-                with open(thumbnail_path, 'rb') as f:
-                    thumbnail_content = f.read()
-                response = HttpResponse(thumbnail_content, content_type='image/jpeg')
-                response['Cache-Control'] = 'public, max-age=86400'  # Cache for 24 hours
-                return response
+                return _thumbnail_response(request, thumbnail_path, thumbnail_mime_type)
             # Fall through to full image if thumbnail generation fails
         
-        # Determine content type
-        mime_type = file_metadata.get('mimeType', 'application/octet-stream')
+        early_response, headers, size, byte_range = _drive_file_preconditions(request, file_metadata)
+        if early_response:
+            return early_response
         
-        # Create response with file content
-        response = HttpResponse(file_content, content_type=mime_type)
-        response['Content-Disposition'] = f'inline; filename="{file_metadata.get("name", "image")}"'
-        response['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
+        # Fetch the first chunk before answering, so Drive errors still
+        # produce a proper error response instead of a truncated 200
+        if byte_range:
+            chunks = drive_service.iter_file_content(file_id, start=byte_range[0], end=byte_range[1])
+        else:
+            chunks = drive_service.iter_file_content(file_id)
+        try:
+            first_chunk = next(chunks, b'')
+        except HttpError as e:
+            logger.error(f"Error getting file content {file_id}: {str(e)}")
+            return Response(
+                {'error': 'Failed to retrieve file content'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
         
-        return response
+        # Stream the file to the client chunk by chunk
+        return _drive_file_response(
+            file_metadata, _stream_drive_file(file_id, first_chunk, chunks), headers, size, byte_range
+        )
     
     except Exception as e:
         logger.error(f"Error proxying Google Drive image {file_id}: {str(e)}")
@@ -4,13 +4,18 @@ import { useEffect, useState, use } from 'react';
 import { fetchAlbum, verifyPin, downloadAlbum } from '@/lib/api';
 import Lightbox from '@/components/Lightbox';
 import ProgressBar from '@/components/ProgressBar';
+import { derivativeSrc, derivativeSrcSet, ImageDerivatives } from '@/lib/images';
 
 interface AlbumImage {
     id: number;
     image: string;
+    derivatives?: ImageDerivatives;
     created_at: string;
 }
 
+// Rendered width of a grid column (1 to 4 columns)
+const GRID_SIZES = '(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw';
+
 interface ClientAlbum {
     id: string;
     title: string;
@@ -223,13 +228,18 @@ export default function AlbumPage({ params }: { params: Promise<{ id: string }>
                                         }}
                                     >
                                         <div className="relative w-full" style={{ height: `${imageHeight}px` }}>
-                                            <img
-                                                src={img.image}
-                                                alt={`Fotografie din ${album.title}`}
-                                                className="w-full h-full object-cover transition-transform duration-700 ease-out group-hover:scale-110"
-                                                loading="lazy"
-                                                decoding="async"
-                                            />
+                                            <picture>
+                                                <source type="image/webp" srcSet={derivativeSrcSet(img.derivatives, 'webp')} sizes={GRID_SIZES} />
+                                                <img
+                                                    src={derivativeSrc(img.derivatives, 'medium', img.image)}
+                                                    srcSet={derivativeSrcSet(img.derivatives, 'jpeg')}
+                                                    sizes={GRID_SIZES}
+                                                    alt={`Fotografie din ${album.title}`}
+                                                    className="w-full h-full object-cover transition-transform duration-700 ease-out group-hover:scale-110"
+                                                    loading="lazy"
+                                                    decoding="async"
+                                                />
+                                            </picture>
                                             
                                             {/* Gradient overlay on hover */}
                                             <div className="absolute inset-0 bg-gradient-to-t from-black/80 via-black/20 to-transparent opacity-0 group-hover:opacity-100 transition-opacity duration-500" />
@@ -14,8 +14,10 @@ interface GoogleDriveImage {
     thumbnailLink?: string;
     downloadLink: string;
     directLink: string;
+    folderPath?: string;
     proxyLink?: string;
     thumbnailProxyLink?: string;
+    thumbnailSrcset?: string;
 }
 
 interface GoogleDriveAlbum {
@@ -25,12 +27,21 @@ interface GoogleDriveAlbum {
     folder_link: string;
     created_at: string;
     images: GoogleDriveImage[];
+    count: number;
+    next_cursor?: string | null;
 }
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api';
 
-async function fetchDriveAlbum(id: string): Promise<GoogleDriveAlbum> {
-    const res = await fetch(`${API_URL}/drive-albums/${id}/`, { cache: 'no-store' });
+// Images requested per page, so the first photos show before the whole album is loaded
+const PAGE_SIZE = 60;
+
+async function fetchDriveAlbum(id: string, cursor?: string): Promise<GoogleDriveAlbum> {
+    const query = new URLSearchParams({ page_size: String(PAGE_SIZE) });
+    if (cursor) {
+        query.set('cursor', cursor);
+    }
+    const res = await fetch(`${API_URL}/drive-albums/${id}/?${query}`, { cache: 'no-store' });
     if (!res.ok) {
         const error = await res.json().catch(() => ({ error: 'Failed to fetch album' }));
         throw new Error(error.error || 'Failed to fetch album');
@@ -47,19 +58,38 @@ export default function DriveAlbumPage({ params }: { params: Promise<{ id: strin
     const [lightboxIndex, setLightboxIndex] = useState(0);
 
     useEffect(() => {
+        let cancelled = false;
+        let firstPageLoaded = false;
+
         const loadAlbum = async () => {
             try {
                 const data = await fetchDriveAlbum(id);
+                if (cancelled) return;
                 setAlbum(data);
+                setLoading(false);
+                firstPageLoaded = true;
+
+                // Append the remaining pages while the first ones are displayed
+                let cursor = data.next_cursor;
+                while (cursor && !cancelled) {
+                    const page = await fetchDriveAlbum(id, cursor);
+                    if (cancelled) return;
+                    setAlbum((current) => current && { ...current, images: [...current.images, ...page.images] });
+                    cursor = page.next_cursor;
+                }
             } catch (err: any) {
                 console.error(err);
-                setError(err.message || 'Eroare la încărcarea albumului');
+                // Keep the photos already shown if a later page fails
+                if (!cancelled && !firstPageLoaded) setError(err.message || 'Eroare la încărcarea albumului');
             } finally {
-                setLoading(false);
+                if (!cancelled) setLoading(false);
             }
         };
 
         loadAlbum();
+        return () => {
+            cancelled = true;
+        };
     }, [id]);
 
     const openLightbox = (index: number) => {
@@ -122,20 +152,33 @@ export default function DriveAlbumPage({ params }: { params: Promise<{ id: strin
                         {album.title}
                     </h1>
                     <div className="flex items-center justify-between flex-wrap gap-4">
-                        <p className="text-black/60 text-sm">{album.images.length} Fotografii</p>
-                        {album.folder_link && (
-                            <a
-                                href={album.folder_link}
-                                target="_blank"
-                                rel="noopener noreferrer"
-                                className="btn-primary inline-flex items-center gap-2"
-                            >
-                                <svg className="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
-                                    <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M10 6H6a2 2 0 00-2 2v10a2 2 0 002 2h10a2 2 0 002-2v-4M14 4h6m0 0v6m0-6L10 14" />
-                                </svg>
-                                Vezi pozele în Google Drive
-                            </a>
-                        )}
+                        <p className="text-black/60 text-sm">{album.count ?? album.images.length} Fotografii</p>
+                        <div className="flex items-center flex-wrap gap-4">
+                            {album.images.length > 0 && (
+                                <a
+                                    href={`${API_URL}/drive-albums/${album.id}/download/`}
+                                    className="btn-primary inline-flex items-center gap-2"
+                                >
+                                    <svg className="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                                        <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M4 16v1a3 3 0 003 3h10a3 3 0 003-3v-1m-4-4l-4 4m0 0l-4-4m4 4V4" />
+                                    </svg>
+                                    Descarcă toate pozele
+                                </a>
+                            )}
+                            {album.folder_link && (
+                                <a
+                                    href={album.folder_link}
+                                    target="_blank"
+                                    rel="noopener noreferrer"
+                                    className="btn-primary inline-flex items-center gap-2"
+                                >
+                                    <svg className="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24">
+                                        <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M10 6H6a2 2 0 00-2 2v10a2 2 0 002 2h10a2 2 0 002-2v-4M14 4h6m0 0v6m0-6L10 14" />
+                                    </svg>
+                                    Vezi pozele în Google Drive
+                                </a>
+                            )}
+                        </div>
                     </div>
                 </div>
             </section>
@@ -163,6 +206,8 @@ export default function DriveAlbumPage({ params }: { params: Promise<{ id: strin
                                         <div className="relative w-full" style={{ height: `${imageHeight}px` }}>
                                             <img
                                                 src={img.thumbnailProxyLink || img.proxyLink || img.directLink}
+                                                srcSet={img.thumbnailSrcset}
+                                                sizes="(min-width: 1280px) 25vw, (min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw"
                                                 alt={img.name}
                                                 className="w-full h-full object-cover transition-transform duration-700 ease-out group-hover:scale-110"
                                                 loading="lazy"
@@ -179,7 +224,11 @@ export default function DriveAlbumPage({ params }: { params: Promise<{ id: strin
                                                 onError={(e) => {
                                                     // Fallback chain: thumbnail -> proxy -> direct -> Google thumbnail
                                                     const imgElement = e.target as HTMLImageElement;
-                                                    if (img.thumbnailProxyLink && imgElement.src === img.thumbnailProxyLink) {
+                                                    if (imgElement.srcset) {
+                                                        // Drop the responsive variants and retry with the plain thumbnail chain
+                                                        imgElement.removeAttribute('srcset');
+                                                        imgElement.src = img.thumbnailProxyLink || img.proxyLink || img.directLink;
+                                                    } else if (img.thumbnailProxyLink && imgElement.src === img.thumbnailProxyLink) {
                                                         imgElement.src = img.proxyLink || img.directLink;
                                                     } else if (img.proxyLink && imgElement.src === img.proxyLink) {
                                                         imgElement.src = img.directLink;
@@ -1,5 +1,5 @@
 import type { Metadata } from 'next';
-import { fetchPortfolio, fetchCategories } from '@/lib/api';
+import { fetchPortfolio, fetchPortfolioFeed, fetchCategories } from '@/lib/api';
 import PortfolioMasonry from '@/components/PortfolioMasonry';
 import ScrollReveal from '@/components/ScrollReveal';
 import { generateMetadata as generateSEOMetadata, extractFirstImage, SITE_URL } from '@/lib/seo';
@@ -63,14 +63,14 @@ export default async function PortfolioPage({
     const { category } = await searchParams;
 
     const [portfolioData, categoriesData] = await Promise.all([
-        fetchPortfolio(category).catch(() => ({ results: [], next: null })),
+        fetchPortfolioFeed(category).catch(() => ({ results: [], next: null })),
         fetchCategories().catch(() => []),
     ]);
 
     // Handle paginated response
     const portfolio: PortfolioImage[] = portfolioData.results || portfolioData || [];
     const categories: Category[] = categoriesData || [];
-    const hasNextPage = portfolioData.next !== null && portfolioData.next !== undefined;
+    const nextUrl: string | null = portfolioData.next ?? null;
 
     return (
         <div className="min-h-screen bg-white">
@@ -127,7 +127,7 @@ export default async function PortfolioPage({
                     initialItems={portfolio} 
                     category={category}
                     categories={categories}
-                    hasNextPage={hasNextPage}
+                    nextUrl={nextUrl}
                 />
             ) : (
                 <section className="py-32 px-8 lg:px-16">
@@ -3,11 +3,13 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
 import Lightbox from 'yet-another-react-lightbox';
 import 'yet-another-react-lightbox/styles.css';
+import { derivativeSrc, derivativeSrcSet, ImageDerivatives } from '@/lib/images';
 
 interface PortfolioItem {
     id: number;
     title: string;
     image: string;
+    derivatives?: ImageDerivatives;
     description?: string | null;
     category?: {
         name: string;
@@ -19,16 +21,18 @@ interface PortfolioMasonryProps {
     initialItems: PortfolioItem[];
     category?: string;
     categories: Array<{ id: number; name: string; slug: string }>;
-    hasNextPage?: boolean; // Add this to track if there are more pages
+    nextUrl?: string | null; // Cursor URL of the next page, null on the last page
 }
 
 const API_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000/api';
+// Rendered width of a grid column (1 to 3 columns)
+const GRID_SIZES = '(min-width: 1024px) 33vw, (min-width: 768px) 50vw, 100vw';
 
-export default function PortfolioMasonry({ initialItems, category, categories, hasNextPage: initialHasNext }: PortfolioMasonryProps) {
+export default function PortfolioMasonry({ initialItems, category, categories, nextUrl: initialNextUrl }: PortfolioMasonryProps) {
     const [items, setItems] = useState<PortfolioItem[]>(initialItems);
     const [loading, setLoading] = useState(false);
-    const [hasMore, setHasMore] = useState(initialHasNext ?? true);
-    const [page, setPage] = useState(1);
+    const [nextUrl, setNextUrl] = useState<string | null>(initialNextUrl ?? null);
+    const hasMore = nextUrl !== null;
     const [lightboxOpen, setLightboxOpen] = useState(false);
     const [lightboxIndex, setLightboxIndex] = useState(0);
     const [error, setError] = useState<string | null>(null);
@@ -36,17 +40,14 @@ export default function PortfolioMasonry({ initialItems, category, categories, h
 
     // Fetch more items
     const fetchMoreItems = useCallback(async () => {
-        if (loading || !hasMore) return;
+        if (loading || !nextUrl) return;
 
         setLoading(true);
         setError(null); // Clear previous errors
         try {
-            const nextPage = page + 1;
-            // Build URL consistently with api.ts format
-            const params = new URLSearchParams();
-            if (category) params.append('category', category);
-            params.append('page', nextPage.toString());
-            const url = `${API_URL}/portfolio/?${params.toString()}`;
+            // Keep the query of the cursor URL (category, cursor) but resolve it against
+            // the public API URL, as the first page may have been fetched server-side
+            const url = `${API_URL}/portfolio/${new URL(nextUrl).search}`;
             
             // Debug: log the URL being fetched (only in development)
             if (process.env.NODE_ENV === 'development') {
@@ -77,23 +78,19 @@ export default function PortfolioMasonry({ initialItems, category, categories, h
             const data = await res.json();
             const newItems = data.results || [];
             
-            if (newItems.length === 0 || !data.next) {
-                setHasMore(false);
-            } else {
-                setItems(prev => [...prev, ...newItems]);
-                setPage(nextPage);
-            }
+            setItems(prev => [...prev, ...newItems]);
+            setNextUrl(newItems.length > 0 ? data.next ?? null : null);
         } catch (error) {
             console.error('Error fetching more items:', error);
             const errorMessage = error instanceof Error ? error.message : 'Unknown error occurred';
             setError(errorMessage);
             
-            // Handle "Invalid page" error - means we've reached the end
+            // Handle "Invalid cursor" error - the feed cannot be continued
             if (error instanceof Error) {
-                const isInvalidPage = error.message.includes('Invalid page');
-                if (isInvalidPage) {
-                    setHasMore(false);
-                    return; // Don't show error for invalid page, just stop loading
+                const isInvalidCursor = error.message.includes('Invalid cursor');
+                if (isInvalidCursor) {
+                    setNextUrl(null);
+                    return; // Don't show error for invalid cursor, just stop loading
                 }
                 
                 // Check if it's a network error or server error
@@ -102,23 +99,22 @@ export default function PortfolioMasonry({ initialItems, category, categories, h
                 
                 // Don't disable hasMore for network/server errors - user can retry by scrolling
                 if (!isNetworkError && !isServerError) {
-                    setHasMore(false);
+                    setNextUrl(null);
                 }
             } else {
-                setHasMore(false);
+                setNextUrl(null);
             }
         } finally {
             setLoading(false);
         }
-    }, [page, category, loading, hasMore]);
+    }, [nextUrl, loading]);
 
     // Reset when category changes
     useEffect(() => {
         setItems(initialItems);
-        setPage(1);
-        setHasMore(initialHasNext ?? true);
+        setNextUrl(initialNextUrl ?? null);
         setError(null); // Clear error when category changes
-    }, [category, initialItems, initialHasNext]);
+    }, [category, initialItems, initialNextUrl]);
 
     // Intersection Observer for infinite scroll
     useEffect(() => {
@@ -145,7 +141,7 @@ export default function PortfolioMasonry({ initialItems, category, categories, h
 
     // Prepare lightbox slides
     const lightboxSlides = items.map(item => ({
-        src: item.image,
+        src: derivativeSrc(item.derivatives, 'large', item.image),
         alt: item.title,
     }));
 
@@ -180,14 +176,19 @@ export default function PortfolioMasonry({ initialItems, category, categories, h
                             }}
                         >
                             <div className="relative w-full" style={{ height: `${imageHeight}px` }}>
-                                <img
-                                    src={item.image}
-                                    alt={item.title}
-                                    className="w-full h-full object-cover transition-transform duration-700 ease-out group-hover:scale-110"
-                                    loading="lazy"
-                                    decoding="async"
-                                    style={{ imageRendering: 'auto' }}
-                                />
+                                <picture>
+                                    <source type="image/webp" srcSet={derivativeSrcSet(item.derivatives, 'webp')} sizes={GRID_SIZES} />
+                                    <img
+                                        src={derivativeSrc(item.derivatives, 'medium', item.image)}
+                                        srcSet={derivativeSrcSet(item.derivatives, 'jpeg')}
+                                        sizes={GRID_SIZES}
+                                        alt={item.title}
+                                        className="w-full h-full object-cover transition-transform duration-700 ease-out group-hover:scale-110"
+                                        loading="lazy"
+                                        decoding="async"
+                                        style={{ imageRendering: 'auto' }}
+                                    />
+                                </picture>
                                 
                                 {/* Gradient overlay for better text readability */}
                                 <div className="absolute inset-0 bg-gradient-to-t from-black/80 via-black/20 to-transparent opacity-0 group-hover:opacity-100 transition-opacity duration-500" />
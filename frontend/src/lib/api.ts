@@ -11,6 +11,16 @@ export async function fetchPortfolio(category?: string, page?: number) {
     return res.json();
 }
 
+// Cursor-paginated feed for infinite scroll: follow `next` to load more
+export async function fetchPortfolioFeed(category?: string) {
+    const params = new URLSearchParams({ pagination: 'cursor' });
+    if (category) params.append('category', category);
+
+    const res = await fetch(`${API_URL}/portfolio/?${params.toString()}`, { cache: 'no-store' });
+    if (!res.ok) throw new Error('Failed to fetch portfolio');
+    return res.json();
+}
+
 export async function fetchCategories() {
     const res = await fetch(`${API_URL}/categories/`, { cache: 'no-store' });
     if (!res.ok) throw new Error('Failed to fetch categories');
@@ -64,38 +74,13 @@ export async function downloadAlbum(id: string, pin: string) {
         throw new Error(errorMessage);
     }
     
-    // Extract filename from Content-Disposition header
-    const contentDisposition = res.headers.get('Content-Disposition');
-    let filename = `album_${id}.zip`; // fallback
-    
-    if (contentDisposition) {
-        // Try multiple patterns to extract filename
-        // Pattern 1: filename="value" (quoted)
-        let match = contentDisposition.match(/filename="([^"]+)"/i);
-        if (match && match[1]) {
-            filename = match[1];
-        } else {
-            // Pattern 2: filename*=UTF-8''value (RFC 5987)
-            match = contentDisposition.match(/filename\*=UTF-8''([^;\r\n]+)/i);
-            if (match && match[1]) {
-                filename = decodeURIComponent(match[1]);
-            } else {
-                // Pattern 3: filename=value (unquoted)
-                match = contentDisposition.match(/filename=([^;\r\n"']+)/i);
-                if (match && match[1]) {
-                    filename = match[1].trim();
-                }
-            }
-        }
-    }
-    
-    const blob = await res.blob();
-    const url = window.URL.createObjectURL(blob);
+    // The server answers with a short-lived signed link: let the browser
+    // download it natively (named by Content-Disposition), so an
+    // interrupted download can be resumed instead of restarting
+    const { url } = await res.json();
     const a = document.createElement('a');
     a.href = url;
-    a.download = filename;
     document.body.appendChild(a);
     a.click();
-    window.URL.revokeObjectURL(url);
     document.body.removeChild(a);
 }
\ No newline at end of file
@@ -0,0 +1,39 @@
+/**
+ * Helpers for the web-optimized renditions (derivatives) the API returns
+ * next to the original of album and portfolio images.
+ */
+
+export interface ImageDerivative {
+    width: number;
+    height: number;
+    webp?: string;
+    jpeg?: string;
+}
+
+export type ImageDerivatives = Record<string, ImageDerivative>;
+
+/**
+ * URL of one rendition, or of the original while the image has no derivatives.
+ */
+export function derivativeSrc(
+    derivatives: ImageDerivatives | undefined,
+    name: string,
+    fallback: string,
+    format: 'webp' | 'jpeg' = 'jpeg'
+): string {
+    return derivatives?.[name]?.[format] || fallback;
+}
+
+/**
+ * srcset listing every rendition in one format, smallest first.
+ */
+export function derivativeSrcSet(
+    derivatives: ImageDerivatives | undefined,
+    format: 'webp' | 'jpeg'
+): string | undefined {
+    const entries = Object.values(derivatives || {})
+        .filter((derivative) => derivative[format])
+        .sort((a, b) => a.width - b.width);
+    if (!entries.length) return undefined;
+    return entries.map((derivative) => `${derivative[format]} ${derivative.width}w`).join(', ');
+}
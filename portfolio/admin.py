@@ -1,5 +1,21 @@
 from django.contrib import admin
+from django.utils.html import format_html
 from .models import Category, PortfolioImage
 
 admin.site.register(Category)
-admin.site.register(PortfolioImage)
+
+
+@admin.register(PortfolioImage)
+class PortfolioImageAdmin(admin.ModelAdmin):
+    list_display = ('thumbnail', 'title', 'category', 'created_at')
+    list_filter = ('category',)
+    list_select_related = ('category',)
+
+    def thumbnail(self, obj):
+        if obj.image:
+            return format_html(
+                '<img src="{}" loading="lazy" decoding="async" style="width: 50px; height: 50px; object-fit: cover;" />',
+                obj.thumbnail_url
+            )
+        return "No image"
+    thumbnail.short_description = "Thumbnail"
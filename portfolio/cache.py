@@ -0,0 +1,61 @@
+"""
+Response cache of the public portfolio API.
+
+Cached responses are keyed by URL and by a version number stored in the
+cache itself. Any portfolio change bumps the version, which orphans every
+cached page at once; orphaned entries simply expire.
+
+The version is seeded from the clock rather than a constant, so a version
+key evicted by the cache backend never comes back as a version older
+responses are still cached under.
+"""
+
+import hashlib
+import time
+from typing import Dict, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import urlencode
+
+VERSION_KEY = 'portfolio:version'
+
+
+def _initial_version() -> int:
+    """Version to start from when none is stored: microseconds since the epoch, above any earlier version."""
+    return time.time_ns() // 1000
+
+
+def get_cache_version() -> int:
+    """Get the current portfolio cache version."""
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        initial = _initial_version()
+        cache.add(VERSION_KEY, initial, timeout=None)
+        version = cache.get(VERSION_KEY, initial)
+    return version
+
+
+def bump_cache_version():
+    """Invalidate every cached portfolio response."""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Not set yet (or evicted): a fresh version orphans whatever is cached
+        cache.add(VERSION_KEY, _initial_version(), timeout=None)
+
+
+def get_response_cache_key(request, params: Optional[Dict] = None) -> str:
+    """
+    Cache key of a response, covering the host, the path and the given query parameters.
+
+    Only the parameters that change the response are passed, normalised, so
+    unknown parameters cannot create a cache entry per request.
+    """
+    query = urlencode(sorted((params or {}).items()), doseq=True)
+    url = f"{request.build_absolute_uri(request.path)}?{query}"
+    url_hash = hashlib.md5(url.encode('utf-8')).hexdigest()
+    return f"portfolio:response:{get_cache_version()}:{url_hash}"
+
+
+def get_cache_timeout() -> int:
+    return getattr(settings, 'PORTFOLIO_CACHE_TIMEOUT', 300)
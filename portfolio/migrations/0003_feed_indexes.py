@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-17 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0002_portfolioimage_description'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='portfolioimage',
+            index=models.Index(fields=['-created_at', '-id'], name='portfolio_feed'),
+        ),
+        migrations.AddIndex(
+            model_name='portfolioimage',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='portfolio_category_feed'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portfolio', '0003_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='portfolioimage',
+            name='derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False, help_text='Web-optimized renditions of the image (see backend.derivatives)'),
+        ),
+    ]
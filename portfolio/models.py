@@ -1,4 +1,6 @@
 from django.db import models
+from backend.derivatives import get_derivative_url, reset_derivatives, schedule_derivatives
+from .cache import bump_cache_version
 
 class Category(models.Model):
     name = models.CharField(max_length=100)
@@ -15,7 +17,26 @@ class PortfolioImage(models.Model):
     image = models.ImageField(upload_to='portfolio/')
     category = models.ForeignKey(Category, related_name='images', on_delete=models.CASCADE)
     description = models.TextField(blank=True, null=True, help_text="Short emotional description or moment")
+    derivatives = models.JSONField(default=dict, blank=True, editable=False, help_text="Web-optimized renditions of the image (see backend.derivatives)")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Newest-first feed, overall and per category, for both pagination modes
+            models.Index(fields=['-created_at', '-id'], name='portfolio_feed'),
+            models.Index(fields=['category', '-created_at', '-id'], name='portfolio_category_feed'),
+        ]
+
+    def save(self, *args, **kwargs):
+        render = reset_derivatives(self)
+        super().save(*args, **kwargs)
+        if render:
+            schedule_derivatives(PortfolioImage, [self.pk], on_rendered=bump_cache_version)
+
     def __str__(self):
         return self.title
+
+    @property
+    def thumbnail_url(self):
+        """URL of the small rendition of the image, for previews"""
+        return get_derivative_url(self.image, self.derivatives)
@@ -0,0 +1,23 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from backend.derivatives import delete_derivatives
+from .cache import bump_cache_version
+from .models import Category, PortfolioImage
+
+
+@receiver(post_save, sender=PortfolioImage)
+@receiver(post_delete, sender=PortfolioImage)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_portfolio_cache(sender, instance, **kwargs):
+    """Drop the cached portfolio and category responses once the change is committed"""
+    transaction.on_commit(bump_cache_version)
+
+
+@receiver(post_delete, sender=PortfolioImage)
+def delete_portfolio_image_derivatives(sender, instance, **kwargs):
+    """Remove the renditions of a deleted image once the deletion is committed"""
+    storage, derivatives = instance.image.storage, instance.derivatives
+    if derivatives:
+        transaction.on_commit(lambda: delete_derivatives(storage, derivatives))
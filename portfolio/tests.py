@@ -1,3 +1,168 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from unittest import mock
+from django.test import TestCase, override_settings
+from PIL import Image
+from backend.derivatives import render_derivatives
+from .cache import VERSION_KEY
+from .models import Category, PortfolioImage
 
-# Create your tests here.
+
+def make_jpeg():
+    buffer = BytesIO()
+    Image.new('RGB', (10, 10), (40, 80, 200)).save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name='photo.jpg')
+
+
+class PortfolioApiTestCase(TestCase):
+    """Run every test against a throwaway MEDIA_ROOT and an empty cache."""
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_override = override_settings(MEDIA_ROOT=media_root)
+        media_override.enable()
+        self.addCleanup(media_override.disable)
+        # Render derivatives inline instead of in a thread closing the test's connection
+        derivatives_patch = mock.patch('backend.derivatives.start_background_derivatives', side_effect=render_derivatives)
+        derivatives_patch.start()
+        self.addCleanup(derivatives_patch.stop)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        self.weddings = Category.objects.create(name='Weddings', slug='weddings')
+        self.portraits = Category.objects.create(name='Portraits', slug='portraits')
+        for index in range(3):
+            self.add_image(f'Wedding {index}', self.weddings)
+        self.add_image('Portrait', self.portraits)
+
+    def add_image(self, title, category):
+        return PortfolioImage.objects.create(title=title, category=category, image=make_jpeg())
+
+
+class PortfolioCacheTests(PortfolioApiTestCase):
+    def test_list_is_served_from_cache(self):
+        with self.assertNumQueries(2):
+            first = self.client.get('/api/portfolio/', {'category': 'weddings'})
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/portfolio/', {'category': 'weddings'})
+
+        self.assertEqual(first.json(), second.json())
+        self.assertEqual(first.json()['count'], 3)
+
+    def test_pages_and_categories_are_cached_separately(self):
+        self.client.get('/api/portfolio/', {'category': 'weddings'})
+
+        response = self.client.get('/api/portfolio/', {'category': 'portraits'})
+
+        self.assertEqual([image['title'] for image in response.json()['results']], ['Portrait'])
+
+    def test_changes_invalidate_cached_responses(self):
+        self.client.get('/api/portfolio/')
+        self.client.get('/api/categories/')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_image('New', self.portraits)
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Events', slug='events')
+
+        self.assertEqual(self.client.get('/api/portfolio/').json()['count'], 5)
+        self.assertEqual(len(self.client.get('/api/categories/').json()), 3)
+
+    def test_unknown_query_parameters_share_the_cache_entry(self):
+        self.client.get('/api/portfolio/', {'category': 'weddings', 'page_size': 3})
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/portfolio/', {'page_size': '3', 'category': 'weddings', 'utm_source': 'x'})
+
+        self.assertEqual(response.json()['count'], 3)
+
+    def test_out_of_range_page_sizes_share_the_cache_entry(self):
+        self.client.get('/api/portfolio/', {'page_size': 100})
+
+        with self.assertNumQueries(0):
+            self.client.get('/api/portfolio/', {'page_size': 5000})
+
+    def test_evicted_version_does_not_revive_older_responses(self):
+        self.client.get('/api/portfolio/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_image('New', self.portraits)
+        # The backend drops the version key, e.g. under memory pressure
+        cache.delete(VERSION_KEY)
+
+        self.assertEqual(self.client.get('/api/portfolio/').json()['count'], 5)
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.client.get('/api/portfolio/999/').status_code, 404)
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/portfolio/999/')
+
+
+class PortfolioCursorPaginationTests(PortfolioApiTestCase):
+    def test_cursor_pages_cover_the_feed_without_counting(self):
+        with self.assertNumQueries(1):
+            data = self.client.get('/api/portfolio/', {'pagination': 'cursor', 'page_size': 3}).json()
+        self.assertNotIn('count', data)
+        titles = [image['title'] for image in data['results']]
+
+        data = self.client.get(data['next']).json()
+        titles += [image['title'] for image in data['results']]
+
+        self.assertEqual(titles, ['Portrait', 'Wedding 2', 'Wedding 1', 'Wedding 0'])
+        self.assertIsNone(data['next'])
+
+    def test_cursor_pages_keep_the_category_filter(self):
+        data = self.client.get('/api/portfolio/', {'pagination': 'cursor', 'category': 'weddings', 'page_size': 2}).json()
+        data = self.client.get(data['next']).json()
+
+        self.assertEqual([image['title'] for image in data['results']], ['Wedding 0'])
+
+    def test_page_numbers_remain_the_default(self):
+        data = self.client.get('/api/portfolio/', {'page': 2, 'page_size': 3}).json()
+
+        self.assertEqual(data['count'], 4)
+        self.assertEqual([image['title'] for image in data['results']], ['Wedding 0'])
+
+
+class PortfolioDerivativeTests(PortfolioApiTestCase):
+    def test_responses_link_image_derivatives_once_rendered(self):
+        image = self.client.get('/api/portfolio/', {'category': 'portraits'}).json()['results'][0]
+        self.assertEqual(image['derivatives'], {})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_image('Portrait 2', self.portraits)
+
+        # Rendering updates rows without signals, so it invalidates the cache itself
+        image = self.client.get('/api/portfolio/', {'category': 'portraits'}).json()['results'][0]
+        self.assertEqual(image['title'], 'Portrait 2')
+        self.assertEqual(set(image['derivatives']), {'thumbnail', 'medium', 'large'})
+        self.assertTrue(image['derivatives']['thumbnail']['jpeg'].startswith('http://testserver/media/portfolio/derivatives/'))
+
+    def test_deleting_image_deletes_derivatives(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            image = self.add_image('Portrait 2', self.portraits)
+        image.refresh_from_db()
+        names = [entry[fmt] for entry in image.derivatives.values() for fmt in ('webp', 'jpeg')]
+        self.assertEqual(len(names), 6)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            image.delete()
+
+        self.assertFalse(any(image.image.storage.exists(name) for name in names))
+
+    def test_backfill_command_invalidates_cached_responses(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.add_image('Portrait 2', self.portraits)
+        old = self.client.get('/api/portfolio/', {'category': 'portraits'}).json()['results'][0]['derivatives']
+
+        call_command('generate_image_derivatives', '--force', stdout=StringIO())
+
+        new = self.client.get('/api/portfolio/', {'category': 'portraits'}).json()['results'][0]['derivatives']
+        self.assertNotEqual(new['thumbnail']['jpeg'], old['thumbnail']['jpeg'])
@@ -1,5 +1,8 @@
+from django.core.cache import cache
 from rest_framework import viewsets
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from .cache import get_cache_timeout, get_response_cache_key
 from .models import PortfolioImage, Category
 from backend.serializers import PortfolioImageSerializer, CategorySerializer
 
@@ -8,17 +11,74 @@ class StandardResultsSetPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class PortfolioCursorPagination(CursorPagination):
+    """Keyset pagination for infinite scroll: no count query, and deep pages cost the same as the first."""
+    page_size = 12
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+class CachedResponseMixin:
+    """
+    Serve list and detail responses from the cache.
+
+    Entries are keyed by the URL and the query parameters listed in
+    cache_query_params, so every page, page size and category filter is
+    cached separately, and dropped on portfolio changes.
+    """
+
+    # Query parameters that change the response; any other is left out of the cache key
+    cache_query_params = ('format',)
+
+    def get_cache_params(self, request):
+        """Query parameters of the cache key, with the page size normalised by the paginator."""
+        params = {
+            name: request.query_params.getlist(name)
+            for name in self.cache_query_params if name in request.query_params
+        }
+        if 'page_size' in params and getattr(self, 'paginator', None) is not None:
+            params['page_size'] = self.paginator.get_page_size(request)
+        return params
+
+    def _cached_response(self, request, respond):
+        key = get_response_cache_key(request, self.get_cache_params(request))
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = respond()
+        if response.status_code == 200:
+            cache.set(key, response.data, get_cache_timeout())
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
+
+class CategoryViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
 
-class PortfolioViewSet(viewsets.ReadOnlyModelViewSet):
+class PortfolioViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     queryset = PortfolioImage.objects.all()
     serializer_class = PortfolioImageSerializer
     pagination_class = StandardResultsSetPagination
+    cache_query_params = ('format', 'category', 'page', 'page_size', 'pagination', 'cursor')
+
+    @property
+    def paginator(self):
+        """Page numbers by default, cursors with ?pagination=cursor (or once a cursor is given)"""
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            if params.get('pagination') == 'cursor' or 'cursor' in params:
+                self._paginator = PortfolioCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def get_queryset(self):
-        queryset = PortfolioImage.objects.all().order_by('-created_at')
+        queryset = PortfolioImage.objects.select_related('category').order_by('-created_at', '-id')
         category = self.request.query_params.get('category')
         if category:
             queryset = queryset.filter(category__slug=category)
@@ -0,0 +1,234 @@
+/*
+ * Chunked, resumable uploads for the admin image upload forms.
+ *
+ * Instead of posting every image in one multipart request, the form
+ * registers the selected files with the server, sends them in chunks
+ * (several at once) and asks the server to complete the upload, polling it
+ * while the images are stored in the background. The id of
+ * the upload is kept in localStorage, so submitting the same files again
+ * after a failure only sends the chunks the server has not received yet.
+ *
+ * The form needs data-chunked-upload-url (the upload batch endpoint) and,
+ * to add images to an existing album, data-album. Browsers without fetch
+ * fall back to the regular multipart post.
+ */
+(function () {
+    'use strict';
+
+    const PARALLEL_CHUNKS = 4;
+    const MAX_ATTEMPTS = 5;
+    // Milliseconds between checks of an upload being processed
+    const POLL_INTERVAL = 2000;
+
+    function sleep(ms) {
+        return new Promise((resolve) => setTimeout(resolve, ms));
+    }
+
+    async function requestJson(url, options) {
+        const response = await fetch(url, { credentials: 'same-origin', ...options });
+        let data = {};
+        try {
+            data = await response.json();
+        } catch (e) {
+            // Not JSON (e.g. a proxy error page)
+        }
+        if (!response.ok) {
+            const error = new Error(data.error || `HTTP ${response.status}`);
+            error.status = response.status;
+            throw error;
+        }
+        return data;
+    }
+
+    function ChunkedUpload(form) {
+        this.form = form;
+        this.url = form.dataset.chunkedUploadUrl;
+        this.album = form.dataset.album || null;
+        this.fileInput = form.querySelector('input[type="file"]');
+        this.schoolInput = form.querySelector('input[name="scoala"]');
+        this.submitButton = form.querySelector('input[type="submit"]');
+        this.csrfToken = form.querySelector('input[name="csrfmiddlewaretoken"]').value;
+        form.addEventListener('submit', (event) => this.onSubmit(event));
+    }
+
+    ChunkedUpload.prototype.headers = function (extra) {
+        return { 'X-CSRFToken': this.csrfToken, ...extra };
+    };
+
+    ChunkedUpload.prototype.storageKey = function (files, school) {
+        const signature = files.map((file) => `${file.name}:${file.size}:${file.lastModified}`).join('|');
+        return `chunkedUpload:${this.album || ''}:${school}:${signature}`;
+    };
+
+    ChunkedUpload.prototype.showProgress = function (text, value) {
+        if (!this.progress) {
+            const wrapper = document.createElement('div');
+            wrapper.style.marginTop = '20px';
+            this.progressBar = document.createElement('progress');
+            this.progressBar.max = 1;
+            this.progressBar.style.width = '100%';
+            this.progressText = document.createElement('p');
+            this.progressText.className = 'help';
+            wrapper.appendChild(this.progressBar);
+            wrapper.appendChild(this.progressText);
+            this.form.appendChild(wrapper);
+            this.progress = wrapper;
+        }
+        this.progressText.textContent = text;
+        if (value === undefined) {
+            this.progressBar.removeAttribute('value');
+        } else {
+            this.progressBar.value = value;
+        }
+    };
+
+    ChunkedUpload.prototype.onSubmit = function (event) {
+        const files = Array.from(this.fileInput.files || []);
+        if (!files.length || !window.fetch || !window.Blob || !Blob.prototype.slice) {
+            // Let the browser post the form (or the form validation complain)
+            return;
+        }
+        event.preventDefault();
+        if (this.running) {
+            return;
+        }
+        this.running = true;
+        this.submitButton.disabled = true;
+        this.upload(files)
+            .then((result) => {
+                window.location.href = result.redirect;
+            })
+            .catch((error) => {
+                this.showProgress(`Upload failed: ${error.message}. Submit again to resume where it stopped.`, 0);
+                this.running = false;
+                this.submitButton.disabled = false;
+            });
+    };
+
+    ChunkedUpload.prototype.getBatch = async function (files, school, key) {
+        const batchId = window.localStorage.getItem(key);
+        if (batchId) {
+            try {
+                const batch = await requestJson(`${this.url}${batchId}/`, { headers: this.headers() });
+                if (batch.files.length === files.length) {
+                    return batch;
+                }
+            } catch (error) {
+                if (error.status !== 404) {
+                    throw error;
+                }
+            }
+            window.localStorage.removeItem(key);
+        }
+
+        const batch = await requestJson(this.url, {
+            method: 'POST',
+            headers: this.headers({ 'Content-Type': 'application/json' }),
+            body: JSON.stringify({
+                album: this.album,
+                school: school,
+                files: files.map((file) => ({ name: file.name, size: file.size })),
+            }),
+        });
+        window.localStorage.setItem(key, batch.id);
+        return batch;
+    };
+
+    ChunkedUpload.prototype.sendChunk = async function (batch, file, fileInfo, index) {
+        const start = index * batch.chunk_size;
+        const body = file.slice(start, Math.min(start + batch.chunk_size, file.size));
+        const url = `${this.url}${batch.id}/files/${fileInfo.id}/chunks/${index}/`;
+        for (let attempt = 1; ; attempt++) {
+            try {
+                await requestJson(url, {
+                    method: 'PUT',
+                    headers: this.headers({ 'Content-Type': 'application/octet-stream' }),
+                    body: body,
+                });
+                return body.size;
+            } catch (error) {
+                // Rejected chunks (4xx) will not succeed on retry
+                if (attempt >= MAX_ATTEMPTS || (error.status >= 400 && error.status < 500)) {
+                    throw error;
+                }
+                await sleep(500 * 2 ** attempt);
+            }
+        }
+    };
+
+    ChunkedUpload.prototype.upload = async function (files) {
+        const school = this.schoolInput ? this.schoolInput.value.trim() : '';
+        const key = this.storageKey(files, school);
+        this.showProgress('Preparing upload…');
+        const batch = await this.getBatch(files, school, key);
+        if (batch.state === 'processing' || batch.state === 'completed') {
+            // Every chunk already arrived in an earlier attempt
+            this.showProgress(`Saving ${files.length} image(s)…`);
+            const result = await this.complete(batch);
+            window.localStorage.removeItem(key);
+            return result;
+        }
+
+        const totalBytes = files.reduce((total, file) => total + file.size, 0) || 1;
+        let sentBytes = 0;
+        const queue = [];
+        batch.files.forEach((fileInfo, fileIndex) => {
+            const received = new Set(fileInfo.received);
+            for (let index = 0; index < fileInfo.total_chunks; index++) {
+                const chunkBytes = Math.min(batch.chunk_size, fileInfo.size - index * batch.chunk_size);
+                if (received.has(index)) {
+                    sentBytes += chunkBytes;
+                } else {
+                    queue.push({ file: files[fileIndex], fileInfo: fileInfo, index: index });
+                }
+            }
+        });
+
+        const report = () => {
+            const megabytes = (bytes) => (bytes / 1024 / 1024).toFixed(1);
+            this.showProgress(
+                `Uploaded ${megabytes(sentBytes)} of ${megabytes(totalBytes)} MB`,
+                sentBytes / totalBytes
+            );
+        };
+        report();
+
+        const worker = async () => {
+            while (queue.length) {
+                const task = queue.shift();
+                sentBytes += await this.sendChunk(batch, task.file, task.fileInfo, task.index);
+                report();
+            }
+        };
+        await Promise.all(Array.from({ length: PARALLEL_CHUNKS }, worker));
+
+        this.showProgress(`Saving ${files.length} image(s)…`);
+        const result = await this.complete(batch);
+        window.localStorage.removeItem(key);
+        return result;
+    };
+
+    ChunkedUpload.prototype.complete = async function (batch) {
+        const completeUrl = `${this.url}${batch.id}/complete/`;
+        const options = { method: 'POST', headers: this.headers() };
+        let status = await requestJson(completeUrl, options);
+        // The images are stored in the background: wait for the batch to leave processing
+        while (!status.redirect) {
+            if (status.state === 'failed') {
+                throw new Error(status.error || 'Saving the images failed');
+            }
+            if (status.state === 'completed') {
+                // Fetch the result (and the admin message) of the completed batch
+                status = await requestJson(completeUrl, options);
+                continue;
+            }
+            await sleep(POLL_INTERVAL);
+            status = await requestJson(`${this.url}${batch.id}/`, { headers: this.headers() });
+        }
+        return status;
+    };
+
+    document.addEventListener('DOMContentLoaded', () => {
+        document.querySelectorAll('form[data-chunked-upload-url]').forEach((form) => new ChunkedUpload(form));
+    });
+})();